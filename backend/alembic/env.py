@@ -17,8 +17,14 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
-# load database url from App settings
-db_url = get_settings().database_url
+# load database url from App settings; ``-x shard=name`` migrates a tenant shard
+shard = context.get_x_argument(as_dictionary=True).get("shard")
+if shard:
+    from app.db.shards import url as shard_url  # noqa: E402
+
+    db_url = shard_url(shard)
+else:
+    db_url = get_settings().database_url
 print(f"\n[ALEMBIC] Using database URL: {db_url}\n")
 config.set_main_option("sqlalchemy.url", db_url)
 
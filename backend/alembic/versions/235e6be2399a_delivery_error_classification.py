@@ -0,0 +1,30 @@
+"""delivery error classification
+
+Revision ID: 235e6be2399a
+Revises: 5e35511f74c0
+Create Date: 2026-10-19 15:54:53.146133
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '235e6be2399a'
+down_revision: Union[str, None] = '5e35511f74c0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("deliveries", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("error", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("deliveries", schema=None) as batch_op:
+        batch_op.drop_column("error")
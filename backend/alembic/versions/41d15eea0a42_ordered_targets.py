@@ -0,0 +1,59 @@
+"""ordered targets
+
+Revision ID: 41d15eea0a42
+Revises: 758573aafcda
+Create Date: 2026-10-19 16:32:33.182012
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '41d15eea0a42'
+down_revision: Union[str, None] = '758573aafcda'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("targets", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("ordered", sa.Boolean(), server_default=sa.false(), nullable=False)
+        )
+        batch_op.add_column(sa.Column("order_key", sa.String(), nullable=True))
+
+    op.create_table(
+        "ordered_deliveries",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("tenant_id", sa.Integer(), nullable=True),
+        sa.Column("target_id", sa.Integer(), nullable=True),
+        sa.Column("lane", sa.String(), nullable=False),
+        sa.Column("event_id", sa.Integer(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("due_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["event_id"], ["events.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["target_id"], ["targets.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["tenant_id"], ["tenants.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("ordered_deliveries", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_ordered_delivery_lane", ["target_id", "lane", "id"], unique=False
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("ordered_deliveries", schema=None) as batch_op:
+        batch_op.drop_index("ix_ordered_delivery_lane")
+
+    op.drop_table("ordered_deliveries")
+
+    with op.batch_alter_table("targets", schema=None) as batch_op:
+        batch_op.drop_column("order_key")
+        batch_op.drop_column("ordered")
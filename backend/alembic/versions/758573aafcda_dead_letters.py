@@ -0,0 +1,67 @@
+"""dead letters
+
+Revision ID: 758573aafcda
+Revises: bb828977bfd1
+Create Date: 2026-10-19 16:24:04.481171
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '758573aafcda'
+down_revision: Union[str, None] = 'bb828977bfd1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("replay_jobs", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column("source", sa.String(), server_default="events", nullable=False)
+        )
+
+    op.create_table(
+        "dead_letters",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("tenant_id", sa.Integer(), nullable=True),
+        sa.Column("event_id", sa.Integer(), nullable=True),
+        sa.Column("target_id", sa.Integer(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("status", sa.Integer(), nullable=False),
+        sa.Column("reason", sa.String(), nullable=False),
+        sa.Column("response", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("redriven_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("redrive_job_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["event_id"], ["events.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["redrive_job_id"], ["replay_jobs.id"], ondelete="SET NULL"
+        ),
+        sa.ForeignKeyConstraint(["target_id"], ["targets.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["tenant_id"], ["tenants.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("dead_letters", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_dead_letter_tenant", ["tenant_id", "created_at"], unique=False
+        )
+        batch_op.create_index(
+            "ix_dead_letter_target", ["target_id", "created_at"], unique=False
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("dead_letters", schema=None) as batch_op:
+        batch_op.drop_index("ix_dead_letter_target")
+        batch_op.drop_index("ix_dead_letter_tenant")
+
+    op.drop_table("dead_letters")
+
+    with op.batch_alter_table("replay_jobs", schema=None) as batch_op:
+        batch_op.drop_column("source")
@@ -0,0 +1,66 @@
+"""compressed payloads
+
+Revision ID: 97bce7ee789c
+Revises: d6cd5df69e69
+Create Date: 2026-10-19 15:37:40.542780
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '97bce7ee789c'
+down_revision: Union[str, None] = 'd6cd5df69e69'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "compression_dictionaries",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("tenant_id", sa.Integer(), nullable=True),
+        sa.Column("event_type", sa.String(), nullable=True),
+        sa.Column("zstd_dict_id", sa.Integer(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("sample_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["tenant_id"], ["tenants.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("compression_dictionaries", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_compression_dictionary_scope",
+            ["tenant_id", "event_type"],
+            unique=False,
+        )
+
+    with op.batch_alter_table("events", schema=None) as batch_op:
+        batch_op.alter_column("payload", existing_type=sa.JSON(), nullable=True)
+        batch_op.add_column(sa.Column("payload_zstd", sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column("dictionary_id", sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            "fk_events_dictionary_id",
+            "compression_dictionaries",
+            ["dictionary_id"],
+            ["id"],
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Compressed rows have no JSON payload; they cannot be downgraded as-is.
+    with op.batch_alter_table("events", schema=None) as batch_op:
+        batch_op.drop_constraint("fk_events_dictionary_id", type_="foreignkey")
+        batch_op.drop_column("dictionary_id")
+        batch_op.drop_column("payload_zstd")
+        batch_op.alter_column("payload", existing_type=sa.JSON(), nullable=False)
+
+    with op.batch_alter_table("compression_dictionaries", schema=None) as batch_op:
+        batch_op.drop_index("ix_compression_dictionary_scope")
+
+    op.drop_table("compression_dictionaries")
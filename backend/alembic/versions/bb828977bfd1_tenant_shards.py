@@ -0,0 +1,38 @@
+"""tenant shards
+
+Revision ID: bb828977bfd1
+Revises: 235e6be2399a
+Create Date: 2026-10-19 16:04:49.144265
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bb828977bfd1'
+down_revision: Union[str, None] = '235e6be2399a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("tenants", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "shard", sa.String(), server_default="default", nullable=False
+            )
+        )
+        batch_op.add_column(
+            sa.Column("moving", sa.Boolean(), server_default=sa.false(), nullable=False)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("tenants", schema=None) as batch_op:
+        batch_op.drop_column("moving")
+        batch_op.drop_column("shard")
@@ -0,0 +1,40 @@
+"""target routing filters
+
+Revision ID: d68da940ef1f
+Revises: ef479f2077e8
+Create Date: 2026-10-19 15:31:52.893073
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd68da940ef1f'
+down_revision: Union[str, None] = 'ef479f2077e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("tenants", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "routing_version", sa.Integer(), server_default="1", nullable=False
+            )
+        )
+
+    with op.batch_alter_table("targets", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("filters", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("targets", schema=None) as batch_op:
+        batch_op.drop_column("filters")
+
+    with op.batch_alter_table("tenants", schema=None) as batch_op:
+        batch_op.drop_column("routing_version")
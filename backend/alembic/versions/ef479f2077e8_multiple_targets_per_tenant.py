@@ -0,0 +1,50 @@
+"""multiple targets per tenant
+
+Revision ID: ef479f2077e8
+Revises: f35670a58128
+Create Date: 2026-10-19 15:28:49.137651
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ef479f2077e8'
+down_revision: Union[str, None] = 'f35670a58128'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table("targets", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("name", sa.String(), nullable=True))
+        batch_op.create_unique_constraint("uq_target_tenant_url", ["tenant_id", "url"])
+
+    with op.batch_alter_table("deliveries", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("target_id", sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            "fk_deliveries_target_id",
+            "targets",
+            ["target_id"],
+            ["id"],
+            ondelete="CASCADE",
+        )
+        batch_op.create_index(
+            "ix_delivery_event_target", ["event_id", "target_id"], unique=False
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("deliveries", schema=None) as batch_op:
+        batch_op.drop_index("ix_delivery_event_target")
+        batch_op.drop_constraint("fk_deliveries_target_id", type_="foreignkey")
+        batch_op.drop_column("target_id")
+
+    with op.batch_alter_table("targets", schema=None) as batch_op:
+        batch_op.drop_constraint("uq_target_tenant_url", type_="unique")
+        batch_op.drop_column("name")
@@ -1,5 +1,21 @@
+import os
+import time
+from datetime import datetime
+
+from app.core import lanes, metrics, tracing
 from app.core.config import get_settings
+from app.core.logging import configure_logging
 from celery import Celery
+from celery.worker.control import control_command
+from celery.signals import (
+    before_task_publish,
+    setup_logging,
+    task_prerun,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_ready,
+)
 
 settings = get_settings()
 
@@ -12,5 +28,133 @@ celery = Celery(
 # Import tasks
 celery.conf.imports = ["app.tasks"]
 
-# Set task routes
-celery.conf.task_routes = {"app.tasks.forward_event": {"queue": "deliveries"}}
+# Deliveries are routed to a lane and tenant shard when they are enqueued;
+# these are only the fallbacks.
+celery.conf.task_routes = {
+    "app.tasks.forward_event": {"queue": f"{lanes.LIVE}.0"},
+    "app.tasks.drain_lane": {"queue": f"{lanes.LIVE}.0"},
+    "app.tasks.schedule_replay": {"queue": f"{lanes.REPLAY}.0"},
+}
+# Drain lanes in the order each worker lists them and take turns between a
+# lane's shards (see app.core.lanes); take one task at a time so a worker
+# never hoards another lane's work.
+celery.conf.broker_transport_options = {
+    "queue_order_strategy": "app.core.lanes:LaneCycle"
+}
+celery.conf.worker_prefetch_multiplier = 1
+
+
+@setup_logging.connect
+def use_structured_logging(**kwargs):
+    """Replace Celery's own logging setup with the shared JSON pipeline."""
+    configure_logging()
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    """Record the publish time so workers and scrapers can derive queue wait."""
+    if headers is not None:
+        headers[metrics.ENQUEUED_AT_HEADER] = time.time()
+
+
+def queue_wait_seconds(request) -> float | None:
+    """Seconds a task spent in the broker after it became due."""
+    enqueued_at = getattr(request, metrics.ENQUEUED_AT_HEADER, None)
+    if enqueued_at is None:
+        return None
+    # Retries are published with an ETA; the wait only starts once it is due.
+    ready_at = float(enqueued_at)
+    eta = request.eta
+    if eta:
+        if isinstance(eta, str):
+            eta = datetime.fromisoformat(eta)
+        ready_at = max(ready_at, eta.timestamp())
+    return max(0.0, time.time() - ready_at)
+
+
+@task_prerun.connect
+def observe_queue_wait(task=None, **kwargs):
+    wait = queue_wait_seconds(task.request)
+    if wait is None:
+        return
+    queue = (task.request.delivery_info or {}).get("routing_key") or "unknown"
+    metrics.TASK_QUEUE_WAIT_SECONDS.labels(queue).observe(wait)
+
+
+@worker_init.connect
+def start_tracing(**kwargs):
+    tracing.configure_tracing("webhook-worker")
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    from prometheus_client import start_http_server
+
+    start_http_server(settings.worker_metrics_port, registry=metrics.registry())
+
+
+@worker_ready.connect
+def start_delivery_flusher(**kwargs):
+    # In the main process, after the pool has forked.
+    if settings.delivery_batch_writes:
+        from app.services.delivery_log import start_flusher
+
+        start_flusher()
+
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    from app.core.warmup import warm_up_worker
+
+    warm_up_worker()
+
+
+@worker_process_init.connect
+def install_profiler(**kwargs):
+    # A signal handler only; nothing runs until a profile is asked for.
+    from app.core.profiling import install_signal_handler
+
+    install_signal_handler()
+
+
+@control_command(
+    args=[("kind", str), ("seconds", float), ("interval", float), ("top", int)],
+    signature="[kind=cpu] [seconds=10] [interval=0.005] [top=50]",
+)
+def profile(state, kind="cpu", seconds=10.0, interval=0.005, top=50):
+    """Profile this worker and its pool processes in the background.
+
+    Replies with the Redis key the folded output is stored under; see
+    ``app.core.profiling``.
+    """
+    from app.core.profiling import KINDS, start_worker_profile
+
+    if kind not in KINDS or kind == "tasks":
+        return {"error": f"Unsupported profile kind {kind!r} for workers"}
+    pool = state.consumer.pool
+    pids = list(pool.info.get("processes", [])) if pool is not None else []
+    key = start_worker_profile(
+        state.hostname,
+        pids,
+        kind=kind,
+        seconds=float(seconds),
+        interval=float(interval),
+        top=int(top),
+    )
+    return {"ok": key}
+
+
+@worker_process_shutdown.connect
+def flush_worker_process_logs(**kwargs):
+    # Pool processes leave through os._exit, which skips atexit.
+    from app.core.logging import stop_logging
+
+    stop_logging()
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,203 @@
+"""Admission control for ingest: shed load before the service collapses.
+
+A sampler in each API process reads four cheap signals every
+``admission_sample_interval`` seconds:
+
+- DB pool wait: the longest connection checkout since the last sample, or the
+  age of the oldest checkout still waiting;
+- queue depth: tasks waiting in the live and retry lanes;
+- S3 upload backlog: ``put_object`` calls in flight;
+- event-loop lag: how late the sampler's own sleep wakes up, smoothed over
+  recent samples so one stall does not read as overload.
+
+Each is divided by its ``admission_*`` threshold, and the largest ratio is
+the *load*. Below 1 everything is admitted. From 1 each tenant is held to a
+token bucket of ``admission_tenant_rate`` requests per second, scaled by its
+weight in ``tenant_weights`` and divided by the load, so the heaviest
+senders are turned away first with a 429. Once the load has stayed at or
+above ``admission_shed_load`` for ``admission_shed_samples`` samples in a
+row, every webhook gets a 503. Both carry ``Retry-After``, and the provider's
+retries absorb the overload.
+"""
+
+import asyncio
+import itertools
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from app.core import lanes, metrics
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+LAG_SMOOTHING = 0.3  # weight of the newest loop-lag sample in the average
+
+
+class _Waits:
+    """Connection checkouts in progress and the longest one since the last read."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = itertools.count()
+        self._started: dict[int, float] = {}
+        self._longest = 0.0
+
+    @contextmanager
+    def waiting(self):
+        key, start = next(self._keys), time.monotonic()
+        with self._lock:
+            self._started[key] = start
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            with self._lock:
+                del self._started[key]
+                self._longest = max(self._longest, elapsed)
+
+    def read(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            oldest = now - min(self._started.values(), default=now)
+            longest, self._longest = max(self._longest, oldest), 0.0
+        return longest
+
+
+class _InFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+
+    @contextmanager
+    def tracking(self):
+        with self._lock:
+            self.count += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.count -= 1
+
+
+POOL_WAITS = _Waits()
+S3_UPLOADS = _InFlight()
+
+
+@dataclass
+class Rejection:
+    status_code: int
+    retry_after: int
+    reason: str
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+
+
+class Controller:
+    def __init__(self):
+        self.signals: dict[str, float] = {}
+        self.load = 0.0
+        self.high_samples = 0  # consecutive samples at or above the shed load
+        self._buckets: dict[int, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def update(self, **signals: float) -> None:
+        settings = get_settings()
+        thresholds = {
+            "pool_wait_ms": settings.admission_pool_wait_ms,
+            "queue_depth": settings.admission_queue_depth,
+            "s3_inflight": settings.admission_s3_inflight,
+            "loop_lag_ms": settings.admission_loop_lag_ms,
+        }
+        self.signals.update(signals)
+        loads = {
+            name: self.signals.get(name, 0.0) / limit
+            for name, limit in thresholds.items()
+            if limit > 0
+        }
+        for name, value in loads.items():
+            metrics.ADMISSION_LOAD.labels(name).set(value)
+        self.load = max(loads.values(), default=0.0)
+        if self.load >= settings.admission_shed_load:
+            self.high_samples += 1
+        else:
+            self.high_samples = 0
+        if self.load < 1 and self._buckets:
+            # Buckets only matter under load; start afresh next time.
+            with self._lock:
+                self._buckets.clear()
+
+    def overloaded(self) -> Rejection | None:
+        """A 503 for every webhook while the load stays above ``admission_shed_load``."""
+        settings = get_settings()
+        if self.high_samples < settings.admission_shed_samples:
+            return None
+        metrics.ADMISSION_REJECTED_TOTAL.labels("overload").inc()
+        retry_after = math.ceil(settings.admission_retry_after * self.load)
+        return Rejection(503, retry_after, "overload")
+
+    def admit(self, tenant_id: int) -> Rejection | None:
+        """A 429 when the tenant is over its share of a loaded service."""
+        if self.load < 1:
+            return None
+        settings = get_settings()
+        weight = lanes.weight(tenant_id)
+        rate = settings.admission_tenant_rate * weight / self.load
+        burst = settings.admission_tenant_burst * weight
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(tenant_id)
+            if bucket is None:
+                bucket = self._buckets[tenant_id] = _Bucket(burst, now)
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return None
+            wait = (1 - bucket.tokens) / rate
+        metrics.ADMISSION_REJECTED_TOTAL.labels("tenant").inc()
+        return Rejection(429, max(1, math.ceil(wait)), "tenant")
+
+
+controller = Controller()
+
+
+async def _queue_depth(redis_conn) -> int:
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        for lane in (lanes.LIVE, lanes.RETRY):
+            for queue in lanes.queues(lane):
+                pipe.llen(queue)
+        return sum(await pipe.execute())
+
+
+async def run_sampler(redis_conn) -> None:
+    """Feed ``controller`` until cancelled; runs on the API's event loop."""
+    interval = get_settings().admission_sample_interval
+    loop = asyncio.get_running_loop()
+    depth = 0
+    lag = 0.0
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        late = max(0.0, loop.time() - start - interval)
+        lag += LAG_SMOOTHING * (late - lag)
+        try:
+            depth = await asyncio.wait_for(_queue_depth(redis_conn), interval)
+        except Exception as exc:
+            # Keep the last depth rather than pretend the queues are empty.
+            logger.debug("Queue depth sample failed: %s", exc)
+        controller.update(
+            pool_wait_ms=POOL_WAITS.read() * 1000,
+            queue_depth=depth,
+            s3_inflight=S3_UPLOADS.count,
+            loop_lag_ms=lag * 1000,
+        )
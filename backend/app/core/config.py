@@ -16,16 +16,84 @@ class Settings(BaseSettings):
     aws_access_key_id: str = "test"
     aws_secret_access_key: str = "test"
     aws_endpoint_url: str | None = None
+    aws_sse_kms_key_id: str = ""  # SSE-KMS key for payloads; AES256 when empty
+    db_encryption_kms_key: str = ""  # KMS key for database encryption
     redis_url: str = "redis://webhook-redis:6379/2"
+    database_replica_url: str | None = None  # read-only endpoints use this
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 5.0
+    db_pool_recycle: int = 1800  # seconds; stay under server/proxy idle limits
+    db_pool_pre_ping: bool = True
+    db_pgbouncer: bool = False  # transaction-mode PgBouncer: no client-side pool
+    database_shards: str = ""  # extra tenant shards, "name=url,..."; see app.db.shards
+    new_tenant_shard: str = "default"  # shard that signups are placed on
+    shard_map_ttl: float = 5.0  # seconds processes cache a tenant's shard
+    shard_id_stride: int = 64  # ids on shard i are i mod this; max shard count
     allowed_origins: str = (
         "http://localhost:3000,https://app.example.com"  # Default allowed origins
     )
+    worker_metrics_port: int = 9100  # Prometheus port exposed by Celery workers
+    tracing_exporter: str = "none"  # none | otlp | file
+    tracing_otlp_endpoint: str | None = None
+    tracing_file_path: str = "traces.jsonl"
+    tracing_sample_ratio: float = 1.0
+    log_level: str = "INFO"
+    log_json: bool = True
+    log_sample_rates: str = ""  # e.g. "app.tasks=0.1,app.main=0.5"
+    debug_payload_tenant_id: int | None = None  # log raw payloads for this tenant
+    warmup_db_connections: int = 2  # connections opened before reporting ready
+    outbox_batch_size: int = 500
+    outbox_poll_interval: float = 0.2  # seconds to wait when the outbox is drained
+    outbox_retention_seconds: int = 86400  # keep published rows this long
+    ingest_rollup_flush_interval: float = 5.0  # seconds between ingest count flushes
+    ingest_mode: str = "direct"  # direct | stream (append to Redis, persist later)
+    ingest_stream: str = "ingest"
+    ingest_stream_batch_size: int = 200  # entries persisted per transaction
+    ingest_fsync_timeout: float = 1.0  # seconds to wait for the AOF fsync
+    tenant_cache_ttl: float = 30.0  # seconds stream-mode ingest caches credentials
+    admission_enabled: bool = True  # shed ingest load (see app.core.admission)
+    admission_sample_interval: float = 0.5  # seconds between signal samples
+    admission_pool_wait_ms: float = 500.0  # DB connection checkout wait
+    admission_queue_depth: int = 100000  # tasks waiting in the live and retry lanes
+    admission_s3_inflight: int = 64  # S3 uploads in flight per API process
+    admission_loop_lag_ms: float = 250.0
+    admission_shed_load: float = 2.0  # load at which every webhook gets a 503
+    admission_shed_samples: int = 3  # ...once it has held for this many samples
+    admission_tenant_rate: float = 20.0  # per-tenant webhooks/s once load reaches 1
+    admission_tenant_burst: int = 40
+    admission_retry_after: float = 5.0  # seconds, scaled by the load
+    delivery_timeout: float = 10.0  # read timeout until a target has enough samples
+    delivery_timeout_min: float = 1.0
+    delivery_timeout_max: float = 30.0
+    delivery_timeout_p99_multiple: float = 3.0
+    delivery_connect_timeout_min: float = 0.5
+    delivery_connect_timeout_max: float = 5.0
+    delivery_connect_timeout_p50_multiple: float = 4.0
+    adaptive_timeout_window: float = 600.0  # seconds of latency history per target
+    adaptive_timeout_refresh: float = 30.0  # seconds a worker caches timeouts
+    delivery_batch_writes: bool = True  # group-commit attempt rows (see delivery_log)
+    delivery_log_batch_size: int = 500
+    delivery_log_flush_interval: float = 0.5  # seconds a partial batch waits
+    delivery_shards: int = 8  # queues per delivery lane; tenants hash onto them
+    tenant_weights: str = ""  # e.g. "42=4,7=2": shards (and turns) per tenant
+    payload_compression: bool = False  # zstd-compress stored payloads
+    payload_compression_level: int = 3
+    live_queue_size: int = 100  # messages buffered per live tail before dropping
+    live_heartbeat_seconds: float = 15.0
+    replay_batch_size: int = 500  # events scheduled per replay tick at most
+    replay_window_seconds: float = 10.0  # how far ahead replays are enqueued
+    replay_max_queue_depth: int = 5000  # max-speed replays pause above this depth
+    redrive_rate: float = 10.0  # dead letters redriven per second per target
+    admin_token: str = ""  # bearer token for /admin endpoints; unset disables them
+    profile_max_seconds: float = 60.0  # longest on-demand profile
+    profile_dir: str = ""  # pool process handoff files; default: a temp dir
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        # Use S3_BUCKET if EVENTS_BUCKET is not set
-        if not self.events_bucket and self.s3_bucket:
-            self.events_bucket = self.s3_bucket
+        # Use S3_BUCKET if EVENTS_BUCKET is not set, and the dev bucket if neither is
+        if not self.events_bucket:
+            self.events_bucket = self.s3_bucket or "events-dev"
 
     model_config = {"env_file": ".env", "extra": "ignore"}
 
@@ -0,0 +1,162 @@
+"""Broker queues ("lanes") that delivery tasks are split across.
+
+Fresh webhooks, retries and replays each get their own lane, so a replay of
+a million events or a failing target's retries never sit in front of live
+traffic. Workers list their own lane first and the others after it, and drain
+their own lane before helping elsewhere. Each lane is therefore guaranteed
+the capacity of its workers, and spare capacity is never left idle:
+
+    celery -A app.celery_app worker -Q $(python -m app.core.lanes live)
+
+Every lane is further split into ``delivery_shards`` queues. Tenants are
+placed on shards by consistent hashing, and within a lane workers take one
+task from each non-empty shard in turn, so a tenant sending 100x its normal
+volume only backs up its own shard. A tenant with weight ``w`` (see
+``tenant_weights``) spreads over ``w`` shards and gets ``w`` turns.
+"""
+
+import bisect
+import hashlib
+import logging
+import sys
+from functools import lru_cache
+
+from app.core.config import get_settings
+from kombu.utils.scheduling import round_robin_cycle
+
+logger = logging.getLogger(__name__)
+
+LIVE = "deliveries.live"
+RETRY = "deliveries.retry"
+REPLAY = "deliveries.replay"
+
+# Order in which a worker helps the other lanes once its own is empty.
+ALL = (LIVE, RETRY, REPLAY)
+
+# Redis hash of tenant id -> forward_event tasks published but not started.
+BACKLOG_KEY = "deliveries:backlog"
+
+_VIRTUAL_NODES = 64
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest())
+
+
+@lru_cache
+def _ring(shards: int) -> tuple[list[int], list[int]]:
+    points = sorted(
+        (_hash(f"shard-{shard}-{node}"), shard)
+        for shard in range(shards)
+        for node in range(_VIRTUAL_NODES)
+    )
+    return [point for point, _ in points], [shard for _, shard in points]
+
+
+@lru_cache
+def _weights(spec: str) -> dict[int, int]:
+    weights = {}
+    for item in filter(None, spec.split(",")):
+        tenant_id, weight = item.split("=")
+        weights[int(tenant_id)] = max(1, int(weight))
+    return weights
+
+
+def weight(tenant_id: int) -> int:
+    """The tenant's weight from ``tenant_weights``; 1 unless configured."""
+    return _weights(get_settings().tenant_weights).get(tenant_id, 1)
+
+
+def tenant_shards(tenant_id: int) -> list[int]:
+    """The shards a tenant's deliveries are spread over, in ring order."""
+    shards = get_settings().delivery_shards
+    count = min(weight(tenant_id), shards)
+    points, owners = _ring(shards)
+    index = bisect.bisect(points, _hash(f"tenant-{tenant_id}"))
+    chosen: list[int] = []
+    while len(chosen) < count:
+        shard = owners[index % len(owners)]
+        if shard not in chosen:
+            chosen.append(shard)
+        index += 1
+    return chosen
+
+
+def queue_for(lane: str, tenant_id: int | None, event_id: int) -> str:
+    """The queue a delivery of ``event_id`` goes to within ``lane``."""
+    if tenant_id is None:
+        # Without a tenant, spread by event so no single shard takes it all.
+        shard = event_id % get_settings().delivery_shards
+    else:
+        shards = tenant_shards(tenant_id)
+        shard = shards[event_id % len(shards)]
+    return f"{lane}.{shard}"
+
+
+def queues(lane: str) -> list[str]:
+    return [f"{lane}.{shard}" for shard in range(get_settings().delivery_shards)]
+
+
+def consume_order(home: str) -> list[str]:
+    """Queues for a worker whose guaranteed lane is ``home`` ("live", ...)."""
+    lane = f"deliveries.{home}"
+    if lane not in ALL:
+        raise ValueError(f"Unknown lane {home!r}")
+    order = [lane] + [other for other in ALL if other != lane]
+    return [queue for other in order for queue in queues(other)]
+
+
+class LaneCycle(round_robin_cycle):
+    """Kombu queue order: lanes strictly in ``-Q`` order, shards round-robin.
+
+    Selected with ``broker_transport_options["queue_order_strategy"]``. After
+    a task is taken from a shard, that shard moves behind the other shards of
+    its lane, but never behind a lane listed later.
+    """
+
+    def rotate(self, last_used):
+        items = self.items
+        try:
+            index = items.index(last_used)
+        except ValueError:
+            return last_used
+        lane = last_used.rpartition(".")[0]
+        end = index
+        while end + 1 < len(items) and items[end + 1].rpartition(".")[0] == lane:
+            end += 1
+        items.insert(end, items.pop(index))
+        return last_used
+
+
+# ---------- per-tenant backlog ----------
+@lru_cache
+def _redis():
+    import redis
+
+    return redis.Redis.from_url(
+        get_settings().redis_url, socket_timeout=1, socket_connect_timeout=1
+    )
+
+
+def record_published(tenant_counts: dict[int, int]) -> None:
+    """Count tasks handed to the broker, in one round trip; never raises."""
+    if not tenant_counts:
+        return
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for tenant_id, count in tenant_counts.items():
+            pipe.hincrby(BACKLOG_KEY, tenant_id, count)
+        pipe.execute()
+    except Exception as exc:
+        logger.warning("Backlog update failed: %s", exc)
+
+
+def record_started(tenant_id: int) -> None:
+    try:
+        _redis().hincrby(BACKLOG_KEY, tenant_id, -1)
+    except Exception as exc:
+        logger.warning("Backlog update failed: %s", exc)
+
+
+if __name__ == "__main__":
+    print(",".join(consume_order(sys.argv[1] if len(sys.argv) > 1 else "live")))
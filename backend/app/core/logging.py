@@ -0,0 +1,196 @@
+"""Structured, non-blocking logging for the API and the Celery workers.
+
+Callers only pay for a level check, an optional sampling decision and a
+queue put: formatting, redaction and I/O happen on a listener thread.
+
+- Records are rendered as one JSON object per line, with ``extra`` fields
+  and the current trace/span ids.
+- INFO and DEBUG records can be sampled per logger via ``LOG_SAMPLE_RATES``
+  (``"app.tasks=0.1,app.main=0.5"``); warnings and errors are never sampled.
+- Secrets are always masked. Payloads are masked unless the record belongs to
+  ``DEBUG_PAYLOAD_TENANT_ID``, which is also exempt from sampling.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+from datetime import UTC, datetime
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+
+from app.core.config import get_settings
+from opentelemetry import trace
+
+REDACTED = "[REDACTED]"
+
+SECRET_FIELDS = frozenset(
+    {
+        "secret",
+        "signing_secret",
+        "stripe_signing_secret",
+        "stripe_signature",
+        "password",
+        "api_key",
+        "authorization",
+        "token",
+        "headers",
+    }
+)
+PAYLOAD_FIELDS = frozenset({"payload", "body", "raw", "response"})
+
+SECRET_PATTERN = re.compile(
+    r"(whsec_[A-Za-z0-9]+|sk_(?:live|test)_[A-Za-z0-9]+|Bearer\s+\S+|v1=[0-9a-f]{16,})"
+)
+
+# Attributes every LogRecord has; anything else came in through ``extra``.
+_RESERVED = frozenset(
+    vars(logging.LogRecord("", 0, "", 0, "", (), None)).keys()
+    | {"message", "asctime", "trace_id", "span_id"}
+)
+
+_listener: QueueListener | None = None
+
+
+def payload_logging_enabled(tenant_id: int | None) -> bool:
+    """Whether raw payloads may be logged for this tenant."""
+    debug_tenant = get_settings().debug_payload_tenant_id
+    return debug_tenant is not None and tenant_id == debug_tenant
+
+
+@lru_cache
+def _sample_rates() -> dict[str, float]:
+    rates = {}
+    for item in filter(None, get_settings().log_sample_rates.split(",")):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+@lru_cache(maxsize=512)
+def _sample_rate(logger_name: str) -> float:
+    rates = _sample_rates()
+    name = logger_name
+    while name:
+        if name in rates:
+            return rates[name]
+        name = name.rpartition(".")[0]
+    return 1.0
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a configured fraction of INFO and DEBUG records per logger."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if payload_logging_enabled(getattr(record, "tenant_id", None)):
+            return True
+        rate = _sample_rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class RedactionFilter(logging.Filter):
+    """Mask secrets and payloads in ``extra`` fields and in the message."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        keep_payload = payload_logging_enabled(getattr(record, "tenant_id", None))
+        for key in record.__dict__.keys() - _RESERVED:
+            if key in SECRET_FIELDS or (key in PAYLOAD_FIELDS and not keep_payload):
+                setattr(record, key, REDACTED)
+        message = record.getMessage()
+        record.msg = SECRET_PATTERN.sub(REDACTED, message)
+        record.args = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, UTC).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in ("trace_id", "span_id"):
+            if hasattr(record, key):
+                entry[key] = getattr(record, key)
+        for key in record.__dict__.keys() - _RESERVED:
+            entry[key] = getattr(record, key)
+        if record.exc_info:
+            entry["exc_info"] = SECRET_PATTERN.sub(
+                REDACTED, self.formatException(record.exc_info)
+            )
+        return json.dumps(entry, default=str)
+
+
+class AsyncQueueHandler(QueueHandler):
+    """Hand records to the listener without formatting them first.
+
+    The stock ``prepare`` renders the message so records can be pickled;
+    the queue is in-process, so that work is left to the listener thread.
+    Only the trace context, which lives in the caller's context, is captured.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        ctx = trace.get_current_span().get_span_context()
+        if ctx.is_valid:
+            record.trace_id = format(ctx.trace_id, "032x")
+            record.span_id = format(ctx.span_id, "016x")
+        return record
+
+
+def configure_logging() -> None:
+    """Route the root logger through a queue to a JSON stdout handler."""
+    global _listener
+    if _listener is not None:
+        return
+    settings = get_settings()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.addFilter(RedactionFilter())
+    if settings.log_json:
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(
+            logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        )
+
+    handler = AsyncQueueHandler(queue.SimpleQueue())
+    handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(settings.log_level.upper())
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Write out the queued records and stop this process's listener."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def _restart_in_child() -> None:
+    # Threads don't survive fork: a prefork worker child would queue records
+    # that nothing reads. Give it its own queue and listener thread; the
+    # records copied from the parent's queue are the parent's to write.
+    global _listener
+    if _listener is None:
+        return
+    fresh = queue.SimpleQueue()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, AsyncQueueHandler):
+            handler.queue = fresh
+    _listener = QueueListener(fresh, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_in_child)
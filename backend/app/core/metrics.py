@@ -0,0 +1,237 @@
+"""Prometheus metrics shared by the API and the Celery workers.
+
+Every label used here is bounded (stage names, status classes, queue names),
+never tenant ids, tokens or URLs.
+
+Celery's prefork pool runs tasks in child processes, so workers must export
+``PROMETHEUS_MULTIPROC_DIR`` for the children's samples to be visible on the
+worker's metrics port.
+"""
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from app.core.tracing import tracer
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Header stamped on every published task so queue wait and lag can be derived.
+ENQUEUED_AT_HEADER = "enqueued_at"
+
+# Sub-millisecond resolution matters for hashing and verification, while S3
+# and DB commits can take seconds under load.
+STAGE_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+INGEST_STAGE_SECONDS = Histogram(
+    "webhook_ingest_stage_seconds",
+    "Time spent in each stage of POST /in/{token}",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+
+DELIVERY_SECONDS = Histogram(
+    "webhook_delivery_seconds",
+    "Outbound delivery request latency",
+    ["outcome"],
+    buckets=STAGE_BUCKETS + (10.0,),
+)
+
+DELIVERIES_TOTAL = Counter(
+    "webhook_deliveries",
+    "Delivery attempts by outcome (status class)",
+    ["outcome"],
+)
+
+DELIVERY_RETRIES_TOTAL = Counter(
+    "webhook_delivery_retries",
+    "Delivery retries scheduled",
+)
+
+DEAD_LETTERS_TOTAL = Counter(
+    "webhook_dead_letters",
+    "Deliveries that failed every attempt, by outcome of the last one",
+    ["outcome"],
+)
+
+OUTBOX_PUBLISH_SECONDS = Histogram(
+    "outbox_publish_batch_seconds",
+    "Time to publish one outbox batch to the broker",
+    buckets=STAGE_BUCKETS,
+)
+
+OUTBOX_LAG_SECONDS = Histogram(
+    "outbox_lag_seconds",
+    "Time between staging a task in the outbox and publishing it",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 15.0, 60.0, 300.0),
+)
+
+OUTBOX_PUBLISHED_TOTAL = Counter(
+    "outbox_published",
+    "Outbox rows published to the broker",
+)
+
+TASK_QUEUE_WAIT_SECONDS = Histogram(
+    "celery_task_queue_wait_seconds",
+    "Time between publishing a task and a worker starting it",
+    ["queue"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0),
+)
+
+LIVE_DROPPED_TOTAL = Counter(
+    "live_tail_dropped_messages",
+    "Live tail messages dropped because a consumer fell behind",
+)
+
+STREAM_PERSIST_SECONDS = Histogram(
+    "ingest_stream_persist_batch_seconds",
+    "Time to persist and acknowledge one batch read from the ingest stream",
+    buckets=STAGE_BUCKETS,
+)
+
+STREAM_LAG_SECONDS = Histogram(
+    "ingest_stream_lag_seconds",
+    "Age of the oldest entry in a batch when it was persisted",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 15.0, 60.0, 300.0),
+)
+
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the SQLAlchemy pool",
+    buckets=STAGE_BUCKETS,
+)
+
+ADMISSION_LOAD = Gauge(
+    "ingest_admission_load",
+    "Admission signal as a fraction of its threshold; ingest sheds from 1",
+    ["signal"],
+    multiprocess_mode="max",
+)
+
+ADMISSION_REJECTED_TOTAL = Counter(
+    "ingest_admission_rejected",
+    "Webhooks turned away by admission control",
+    ["reason"],
+)
+
+
+def status_class(status_code: int) -> str:
+    """Map an HTTP status to a low-cardinality outcome label."""
+    if not status_code:
+        return "error"
+    return f"{status_code // 100}xx"
+
+
+@contextmanager
+def ingest_stage(name: str):
+    """Observe the duration of an ingest stage and trace it as a span."""
+    start = time.perf_counter()
+    try:
+        with tracer.start_as_current_span(f"ingest.{name}"):
+            yield
+    finally:
+        INGEST_STAGE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+class QueueCollector:
+    """Report depth and lag of Celery queues straight from the Redis broker.
+
+    Kombu pushes with LPUSH and pops from the right, so the oldest message
+    sits at index -1.
+    """
+
+    def __init__(self, redis_url: str, queues: list[str]):
+        self.redis_url = redis_url
+        self.queues = queues
+        self._client = None
+
+    def _redis(self):
+        if self._client is None:
+            import redis
+
+            self._client = redis.Redis.from_url(
+                self.redis_url, socket_timeout=1, socket_connect_timeout=1
+            )
+        return self._client
+
+    def collect(self):
+        depth = GaugeMetricFamily(
+            "celery_queue_depth", "Messages waiting in the queue", labels=["queue"]
+        )
+        lag = GaugeMetricFamily(
+            "celery_queue_lag_seconds",
+            "Age of the oldest message waiting in the queue",
+            labels=["queue"],
+        )
+        try:
+            client = self._redis()
+            for queue in self.queues:
+                depth.add_metric([queue], client.llen(queue))
+                lag.add_metric([queue], self._oldest_age(client, queue))
+        except Exception:
+            # A broker outage must not break the scrape of every other metric.
+            return
+        yield depth
+        yield lag
+
+    @staticmethod
+    def _oldest_age(client, queue: str) -> float:
+        raw = client.lindex(queue, -1)
+        if raw is None:
+            return 0.0
+        try:
+            enqueued_at = json.loads(raw)["headers"][ENQUEUED_AT_HEADER]
+        except (ValueError, KeyError, TypeError):
+            return 0.0
+        return max(0.0, time.time() - float(enqueued_at))
+
+
+_queue_collectors: list[QueueCollector] = []
+
+
+def registry() -> CollectorRegistry:
+    """Return the registry to expose, aggregating child processes if needed."""
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    for collector in _queue_collectors:
+        collected.register(collector)
+    return collected
+
+
+def register_queue_collector(redis_url: str, queues: list[str]) -> None:
+    """Expose broker queue depth and lag alongside the process metrics."""
+    collector = QueueCollector(redis_url, queues)
+    _queue_collectors.append(collector)
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        REGISTRY.register(collector)
+
+
+def render() -> tuple[bytes, str]:
+    """Serialize the current metrics in the Prometheus text format."""
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
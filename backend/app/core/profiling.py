@@ -0,0 +1,303 @@
+"""On-demand profiling of live API and worker processes.
+
+Three kinds of profile, all returned as folded stacks (one
+``frame;frame;frame value`` line per stack, root first), which
+``flamegraph.pl``, speedscope and inferno read as they are:
+
+- ``cpu``: every thread's stack sampled every ``interval`` seconds for
+  ``seconds``; the value is the number of samples.
+- ``memory``: ``tracemalloc`` runs for ``seconds``, then the ``top``
+  tracebacks holding the most memory allocated in that window; the value is
+  bytes.
+- ``tasks``: the stack of every asyncio task on the event loop; API only.
+
+Nothing runs until a profile is asked for, and ``tracemalloc`` is stopped
+again afterwards, so an idle profiler costs nothing. One profile runs per
+process at a time.
+
+API processes are profiled through ``GET /admin/profile``. Workers get the
+``profile`` remote-control command, which profiles the worker's main
+process, and its pool processes through ``SIGUSR2``, in the background
+and leaves the result in Redis for ``RESULT_TTL`` seconds:
+
+    poetry run python -m app.core.profiling --kind cpu --seconds 10 > cpu.folded
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from functools import lru_cache
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("cpu", "memory", "tasks")
+SIGNAL = signal.SIGUSR2  # asks a pool process to profile itself
+RESULT_TTL = 600  # seconds a worker's profile stays in Redis
+COLLECT_MARGIN = 5.0  # seconds pool processes get on top of the profile
+TRACEMALLOC_FRAMES = 32
+
+_busy = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """A profile is already running in this process."""
+
+
+@lru_cache
+def _redis():
+    import redis
+
+    return redis.Redis.from_url(get_settings().redis_url)
+
+
+def _short(filename: str) -> str:
+    """``app/tasks.py``, ``celery/app/task.py``, ``threading.py``."""
+    for marker in ("/site-packages/", "/lib/python"):
+        head, sep, tail = filename.rpartition(marker)
+        if sep:
+            return tail if marker == "/site-packages/" else tail.partition("/")[2]
+    head, sep, tail = filename.rpartition("/app/")
+    return "app/" + tail if sep else filename
+
+
+def _label(code) -> str:
+    # ';' separates frames and ' ' the value in the folded format.
+    qualname = getattr(code, "co_qualname", code.co_name)  # 3.11+
+    name = f"{qualname}@{_short(code.co_filename)}:{code.co_firstlineno}"
+    return name.replace(";", ":").replace(" ", "_")
+
+
+def _stack(frame) -> list[str]:
+    """Labels from the outermost frame to ``frame``."""
+    labels = []
+    while frame is not None:
+        labels.append(_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _folded(counts: Counter) -> str:
+    return "".join(f"{stack} {value}\n" for stack, value in counts.most_common())
+
+
+def cpu(seconds: float, interval: float = 0.005) -> str:
+    """Sample every other thread's stack until ``seconds`` have passed."""
+    me = threading.get_ident()
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident != me:
+                thread = names.get(ident, str(ident)).replace(" ", "_")
+                counts[";".join([thread, *_stack(frame)])] += 1
+        time.sleep(interval)
+    return _folded(counts)
+
+
+def memory(seconds: float, top: int = 50) -> str:
+    """The ``top`` tracebacks by bytes allocated, and still held, over ``seconds``."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        time.sleep(seconds)
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        if started:
+            tracemalloc.stop()
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+    counts: Counter = Counter()
+    for stat in snapshot.statistics("traceback")[:top]:
+        frames = [
+            f"{_short(frame.filename)}:{frame.lineno}".replace(" ", "_")
+            for frame in stat.traceback
+        ]
+        counts[";".join(frames)] += stat.size
+    return _folded(counts)
+
+
+def tasks() -> str:
+    """Where each task of the running event loop is suspended."""
+    counts: Counter = Counter()
+    for task in asyncio.all_tasks():
+        labels = [_label(frame.f_code) for frame in task.get_stack()]
+        counts[";".join([task.get_name().replace(" ", "_"), *labels])] += 1
+    return _folded(counts)
+
+
+def capture(kind: str, seconds: float = 10.0, interval: float = 0.005, top: int = 50):
+    """Run one profile in this process; raises ``ProfilerBusy`` if one is running."""
+    if kind not in KINDS:
+        raise ValueError(f"Unknown profile kind {kind!r}")
+    seconds = min(seconds, get_settings().profile_max_seconds)
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        if kind == "cpu":
+            return cpu(seconds, interval)
+        if kind == "memory":
+            return memory(seconds, top)
+        try:
+            return tasks()
+        except RuntimeError:
+            return ""  # no event loop in this thread
+    finally:
+        _busy.release()
+
+
+# ---------- workers ----------
+def _path(pid: int, suffix: str) -> str:
+    directory = get_settings().profile_dir or os.path.join(
+        tempfile.gettempdir(), "webhook-profiles"
+    )
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{pid}.{suffix}")
+
+
+def _profile_self(options: dict) -> None:
+    """In a pool process: run the requested profile and leave it for the parent."""
+    try:
+        output = capture(**options)
+    except Exception as exc:
+        output = f"# profile failed: {exc}\n"
+    result = _path(os.getpid(), "folded")
+    with open(result + ".tmp", "w") as fh:
+        fh.write(output)
+    os.replace(result + ".tmp", result)
+
+
+def _on_signal(signum, frame) -> None:
+    try:
+        with open(_path(os.getpid(), "request")) as fh:
+            options = json.load(fh)
+    except (OSError, ValueError):
+        return
+    threading.Thread(
+        target=_profile_self, args=(options,), name="profiler", daemon=True
+    ).start()
+
+
+def install_signal_handler() -> None:
+    """Let the worker's main process ask this pool process for a profile."""
+    signal.signal(SIGNAL, _on_signal)
+
+
+def _prefix(output: str, process: str) -> str:
+    return "".join(f"{process};{line}\n" for line in output.splitlines() if line)
+
+
+def profile_worker(pids: list[int], **options) -> str:
+    """Profile this process and its pool processes ``pids`` at the same time."""
+    asked = []
+    for pid in pids:
+        try:
+            for suffix in ("folded", "folded.tmp"):
+                if os.path.exists(_path(pid, suffix)):
+                    os.remove(_path(pid, suffix))
+            with open(_path(pid, "request"), "w") as fh:
+                json.dump(options, fh)
+            os.kill(pid, SIGNAL)
+            asked.append(pid)
+        except OSError as exc:
+            logger.warning("Could not ask pool process %s for a profile: %s", pid, exc)
+    output = _prefix(capture(**options), f"main-{os.getpid()}")
+
+    deadline = time.monotonic() + COLLECT_MARGIN
+    for pid in asked:
+        result = _path(pid, "folded")
+        while not os.path.exists(result) and time.monotonic() < deadline:
+            time.sleep(0.1)
+        try:
+            with open(result) as fh:
+                output += _prefix(fh.read(), f"pool-{pid}")
+            os.remove(result)
+        except OSError:
+            output += f"# pool process {pid} did not answer\n"
+        finally:
+            if os.path.exists(_path(pid, "request")):
+                os.remove(_path(pid, "request"))
+    return output
+
+
+def start_worker_profile(host: str, pids: list[int], **options) -> str:
+    """Profile in a background thread; returns the Redis key of the result."""
+    key = f"profile:{host}:{uuid.uuid4().hex[:12]}"
+
+    def run() -> None:
+        try:
+            output = profile_worker(pids, **options)
+        except Exception as exc:
+            logger.exception("Worker profile failed")
+            output = f"# profile failed: {exc}\n"
+        _redis().set(key, output, ex=RESULT_TTL)
+
+    threading.Thread(target=run, name="profiler", daemon=True).start()
+    return key
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Profile running Celery workers.")
+    parser.add_argument("--kind", choices=("cpu", "memory"), default="cpu")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=0.005)
+    parser.add_argument("--top", type=int, default=50)
+    parser.add_argument("--destination", action="append", help="worker hostname")
+    args = parser.parse_args(argv)
+
+    from app.celery_app import celery
+
+    options = {
+        "kind": args.kind,
+        "seconds": args.seconds,
+        "interval": args.interval,
+        "top": args.top,
+    }
+    replies = celery.control.broadcast(
+        "profile",
+        arguments=options,
+        destination=args.destination,
+        reply=True,
+        timeout=5,
+    )
+    keys = []
+    for answer in replies:
+        for host, reply in answer.items():
+            if "ok" in reply:
+                keys.append(reply["ok"])
+            else:
+                print(f"# {host}: {reply.get('error')}", file=sys.stderr)
+    if not keys:
+        sys.exit("No worker answered")
+    time.sleep(min(args.seconds, get_settings().profile_max_seconds))
+    deadline = time.monotonic() + 2 * COLLECT_MARGIN
+    for key in keys:
+        host = key.split(":")[1]
+        output = _redis().get(key)
+        while output is None and time.monotonic() < deadline:
+            time.sleep(0.5)
+            output = _redis().get(key)
+        if output is None:
+            print(f"# {host} did not finish", file=sys.stderr)
+            continue
+        sys.stdout.write(_prefix(output.decode(), host))
+
+
+if __name__ == "__main__":
+    from app.core.logging import configure_logging
+
+    configure_logging()
+    main()
@@ -0,0 +1,92 @@
+"""OpenTelemetry tracing shared by the API and the Celery workers.
+
+A trace starts at ``POST /in/{token}``, follows the ``forward_event`` message
+through Celery headers (retries are published from inside the task, so they
+stay in the same trace) and reaches the target through the ``traceparent``
+header injected into outbound httpx requests.
+"""
+
+import logging
+
+from app.core.config import get_settings
+from opentelemetry import trace
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("webhook-replay")
+
+_configured = False
+
+
+def _exporter(settings):
+    if settings.tracing_exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        # Falls back to the standard OTEL_EXPORTER_OTLP_* variables when unset.
+        return OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint)
+    if settings.tracing_exporter == "file":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        out = open(settings.tracing_file_path, "a", buffering=1)
+        return ConsoleSpanExporter(
+            out=out, formatter=lambda span: span.to_json(indent=None) + "\n"
+        )
+    raise ValueError(f"Unknown tracing exporter: {settings.tracing_exporter}")
+
+
+def configure_tracing(service_name: str) -> None:
+    """Install the tracer provider and instrument DB, S3, HTTP and Celery."""
+    global _configured
+    settings = get_settings()
+    if _configured or settings.tracing_exporter == "none":
+        return
+
+    from opentelemetry.instrumentation.botocore import BotocoreInstrumentor
+    from opentelemetry.instrumentation.celery import CeleryInstrumentor
+    from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+    from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+    from opentelemetry.instrumentation.sqlalchemy.engine import EngineTracer
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    from app.db import shards
+    from app.db.session import engine, read_engine
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(settings.tracing_sample_ratio)),
+    )
+    # The batch processor re-creates its export thread after a fork, so this
+    # is safe to call in the Celery parent before the pool starts.
+    provider.add_span_processor(BatchSpanProcessor(_exporter(settings)))
+    trace.set_tracer_provider(provider)
+
+    engine_tracer, *_ = SQLAlchemyInstrumentor().instrument(
+        engines=list({engine, read_engine})
+    )
+    # Shard engines are built on first use, after this has run.
+    shards.on_engine(
+        lambda shard_engine: EngineTracer(
+            engine_tracer.tracer, shard_engine, engine_tracer.connections_usage
+        )
+    )
+    BotocoreInstrumentor().instrument()
+    HTTPXClientInstrumentor().instrument()
+    CeleryInstrumentor().instrument()
+    _configured = True
+    logger.info(
+        "Tracing enabled for %s (exporter=%s)", service_name, settings.tracing_exporter
+    )
+
+
+def instrument_app(app) -> None:
+    """Create a server span for every API request."""
+    if get_settings().tracing_exporter == "none":
+        return
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+    FastAPIInstrumentor.instrument_app(app, excluded_urls="health,metrics")
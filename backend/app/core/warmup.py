@@ -0,0 +1,77 @@
+"""Warm connection pools before a process reports itself ready.
+
+Liveness (``/health``) is answered immediately; readiness (``/ready``) only
+once the DB pool, the Redis connections and the S3 client exist, so the first
+requests routed to a new pod don't pay for connection setup.
+"""
+
+import asyncio
+import logging
+import threading
+
+from app.core.config import get_settings
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+_ready = threading.Event()
+
+
+def is_ready() -> bool:
+    return _ready.is_set()
+
+
+def warm_database(engine, connections: int) -> None:
+    """Hold ``connections`` connections open together, then return them to the pool."""
+    if connections <= 0 or isinstance(engine.pool, NullPool):
+        return
+    opened = []
+    try:
+        for _ in range(connections):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in opened:
+            conn.close()
+
+
+def _warm_api_sync() -> None:
+    from app.db.session import engine, read_engine
+    from app.storage.s3_client import get_s3_client
+
+    connections = get_settings().warmup_db_connections
+    warm_database(engine, connections)
+    if read_engine is not engine:
+        warm_database(read_engine, connections)
+    get_s3_client()
+
+
+async def warm_up_api(redis_conn, retry_delay: float = 1.0) -> None:
+    """Warm every pool the API uses, retrying until all succeed, then mark ready."""
+    while True:
+        try:
+            await redis_conn.ping()
+            await asyncio.to_thread(_warm_api_sync)
+        except Exception as exc:
+            logger.warning("Warmup failed, retrying: %s", exc)
+            await asyncio.sleep(retry_delay)
+            continue
+        _ready.set()
+        logger.info("Warmup complete")
+        return
+
+
+def warm_up_worker() -> None:
+    """Warm the DB pool and the shared delivery HTTP client in a worker process."""
+    from app.db.session import engine
+    from app.tasks import http_client
+
+    try:
+        warm_database(engine, 1)
+        http_client()
+    except Exception as exc:
+        logger.warning("Worker warmup failed: %s", exc)
+        return
+    _ready.set()
@@ -1,13 +1,21 @@
 import secrets
+from datetime import datetime
+from typing import Iterator
 
+from app.core import lanes
 from app.db import models, schemas
+from app.services import routing
+from opentelemetry import propagate
 from passlib.hash import bcrypt
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 
-def create_tenant(db: Session, data: schemas.TenantCreate) -> models.Tenant:
+def create_tenant(
+    db: Session, data: schemas.TenantCreate, shard: str = "default"
+) -> models.Tenant:
     token = secrets.token_urlsafe(16)
-    tenant = models.Tenant(name=data.name, token=token)
+    tenant = models.Tenant(name=data.name, token=token, shard=shard)
     db.add(tenant)
     db.flush()
     db.refresh(tenant)
@@ -30,24 +38,63 @@ def verify_api_key(db: Session, raw: str):
     return None
 
 
+def _bump_routing_version(db: Session, tenant_id: int) -> None:
+    db.query(models.Tenant).filter_by(id=tenant_id).update(
+        {models.Tenant.routing_version: models.Tenant.routing_version + 1},
+        synchronize_session=False,
+    )
+
+
 def upsert_target(db: Session, tenant_id: int, data: schemas.TargetCreate):
-    target = db.query(models.Target).filter_by(tenant_id=tenant_id).first()
+    """Create a target, or update the tenant's existing target with the same URL."""
+    url = str(data.url)
+    filters = data.filters.model_dump(exclude_none=True) if data.filters else None
+    target = db.query(models.Target).filter_by(tenant_id=tenant_id, url=url).first()
     if target:
-        target.url = str(data.url)
         target.headers = data.headers
+        target.filters = filters
+        target.ordered = data.ordered
+        target.order_key = data.order_key
+        if data.name is not None:
+            target.name = data.name
     else:
         target = models.Target(
             tenant_id=tenant_id,
-            url=str(data.url),
+            name=data.name,
+            url=url,
             headers=data.headers,
+            filters=filters,
+            ordered=data.ordered,
+            order_key=data.order_key,
             provider=data.provider or "stripe",
         )
         db.add(target)
+    _bump_routing_version(db, tenant_id)
     db.flush()
     db.refresh(target)
     return target
 
 
+def list_targets(db: Session, tenant_id: int):
+    return (
+        db.query(models.Target)
+        .filter_by(tenant_id=tenant_id)
+        .order_by(models.Target.id)
+        .all()
+    )
+
+
+def delete_target(db: Session, tenant_id: int, target_id: int) -> bool:
+    deleted = (
+        db.query(models.Target)
+        .filter_by(tenant_id=tenant_id, id=target_id)
+        .delete(synchronize_session=False)
+    )
+    if deleted:
+        _bump_routing_version(db, tenant_id)
+    return bool(deleted)
+
+
 def list_events(db: Session, tenant_id: int, limit: int = 100):
     return (
         db.query(models.Event)
@@ -56,3 +103,148 @@ def list_events(db: Session, tenant_id: int, limit: int = 100):
         .limit(limit)
         .all()
     )
+
+
+def list_dead_letters(
+    db: Session,
+    tenant_id: int,
+    target_id: int | None = None,
+    since=None,
+    until=None,
+    redriven: bool = False,
+    limit: int = 100,
+):
+    """Newest dead letters first; only those not yet redriven unless asked."""
+    query = db.query(models.DeadLetter).filter_by(tenant_id=tenant_id)
+    if target_id is not None:
+        query = query.filter_by(target_id=target_id)
+    if since is not None:
+        query = query.filter(models.DeadLetter.created_at >= since)
+    if until is not None:
+        query = query.filter(models.DeadLetter.created_at < until)
+    if not redriven:
+        query = query.filter(models.DeadLetter.redriven_at.is_(None))
+    return query.order_by(models.DeadLetter.id.desc()).limit(limit).all()
+
+
+def iter_events(
+    db: Session, tenant_id: int, since=None, batch_size: int = 1000
+) -> Iterator[models.Event]:
+    """Yield a tenant's events in id order, one keyset page at a time."""
+    last_id = 0
+    while True:
+        query = db.query(models.Event).filter(
+            models.Event.tenant_id == tenant_id, models.Event.id > last_id
+        )
+        if since is not None:
+            query = query.filter(models.Event.created_at >= since)
+        page = query.order_by(models.Event.id).limit(batch_size).all()
+        if not page:
+            return
+        yield from page
+        last_id = page[-1].id
+        db.expunge_all()
+
+
+def enqueue_task(
+    db: Session,
+    task: str,
+    args: list,
+    queue: str | None = None,
+    eta: datetime | None = None,
+    trace_context: dict | None = None,
+) -> models.OutboxMessage:
+    """Stage a Celery task in the outbox; it is published once the caller commits.
+
+    The current trace context travels with the task unless ``trace_context``
+    names another one (work persisted on behalf of an earlier request).
+    """
+    carrier: dict[str, str] = dict(trace_context or {})
+    if trace_context is None:
+        propagate.inject(carrier)
+    message = models.OutboxMessage(
+        task=task, args=args, queue=queue, trace_context=carrier or None, eta=eta
+    )
+    db.add(message)
+    return message
+
+
+def enqueue_deliveries(
+    db: Session,
+    deliveries: list[tuple[int, int, datetime | None]],
+    trace_contexts: dict[int, dict] | None = None,
+    lane: str = lanes.LIVE,
+    tenant_id: int | None = None,
+) -> None:
+    """Queue ``(event_id, target_id, eta)`` deliveries through the outbox.
+
+    Each delivery gets its own task, so retries and slow endpoints never hold
+    up the other targets. Nothing goes in ``deliveries`` until an attempt is
+    made; the outbox row is the record of a queued delivery. ``trace_contexts``
+    maps event ids to the trace each event's tasks should continue. Tasks go
+    to the tenant's shards of ``lane``. Deliveries to ordered targets wait in
+    their lane (``app.services.ordering``).
+    """
+    if not deliveries:
+        return
+    ordered = _ordering(db, tenant_id)
+    waiting = []
+    drains = set()
+    for event_id, target_id, eta in deliveries:
+        trace_context = trace_contexts.get(event_id) if trace_contexts else None
+        path = ordered.get(target_id)
+        if path is None:
+            enqueue_task(
+                db,
+                "app.tasks.forward_event",
+                [str(event_id), 1, target_id, tenant_id],
+                queue=lanes.queue_for(lane, tenant_id, event_id),
+                eta=eta,
+                trace_context=trace_context,
+            )
+            continue
+        payload = db.get(models.Event, event_id).payload if path else {}
+        key = routing.lane_key(path, payload)
+        waiting.append(
+            {
+                "tenant_id": tenant_id,
+                "target_id": target_id,
+                "lane": key,
+                "event_id": event_id,
+                "due_at": eta,
+            }
+        )
+        if (target_id, key, eta) not in drains:
+            drains.add((target_id, key, eta))
+            enqueue_task(
+                db,
+                "app.tasks.drain_lane",
+                [target_id, key, tenant_id],
+                queue=lanes.queue_for(lane, tenant_id, event_id),
+                eta=eta,
+                trace_context=trace_context,
+            )
+    if waiting:
+        db.execute(insert(models.OrderedDelivery), waiting)
+
+
+def _ordering(db: Session, tenant_id: int | None) -> dict:
+    """The tenant's ordered targets, from the routing cache."""
+    tenant = db.get(models.Tenant, tenant_id) if tenant_id is not None else None
+    return routing.ordering(db, tenant) if tenant is not None else {}
+
+
+def fan_out(
+    db: Session,
+    event_id: int,
+    target_ids: list[int],
+    lane: str = lanes.LIVE,
+    tenant_id: int | None = None,
+) -> None:
+    """Queue an independent delivery of the event to each target."""
+    enqueue_deliveries(
+        db,
+        [(event_id, target_id, None) for target_id in target_ids],
+        lane=lane,
+        tenant_id=tenant_id,
+    )
@@ -1,4 +1,5 @@
 import enum
+import json
 from datetime import UTC, datetime
 from datetime import timezone as tz
 
@@ -8,14 +9,18 @@ from sqlalchemy import (
     Column,
     DateTime,
     Enum,
+    Float,
     ForeignKey,
     Index,
     Integer,
+    LargeBinary,
     String,
     Text,
     UniqueConstraint,
+    false,
+    text,
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.orm import declarative_base, object_session, relationship
 
 Base = declarative_base()
 
@@ -30,6 +35,11 @@ class Tenant(Base):
     name = Column(String, nullable=False)
     token = Column(String, unique=True, nullable=False)
     stripe_signing_secret = Column(String, nullable=True)
+    # Bumped whenever targets change so cached routes are rebuilt.
+    routing_version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Where the tenant's data lives (see app.db.shards); only read in the directory.
+    shard = Column(String, nullable=False, default="default", server_default="default")
+    moving = Column(Boolean, nullable=False, default=False, server_default=false())
 
     api_keys = relationship("ApiKey", back_populates="tenant")
     targets = relationship("Target", back_populates="tenant")
@@ -50,24 +60,75 @@ class Target(Base):
     __tablename__ = "targets"
     id = Column(Integer, primary_key=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"))
+    name = Column(String, nullable=True)
     url = Column(String, nullable=False)
     provider = Column(String, default="stripe")
     headers = Column(JSON, nullable=True)
+    filters = Column(JSON, nullable=True)
+    # Deliver one event at a time, in order, per tenant or per value of order_key.
+    ordered = Column(Boolean, nullable=False, default=False, server_default=false())
+    order_key = Column(String, nullable=True)  # payload path, e.g. data.object.id
 
     tenant = relationship("Tenant", back_populates="targets")
 
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "url", name="uq_target_tenant_url"),
+    )
+
+
+class CompressionDictionary(Base):
+    """A trained zstd dictionary; retraining adds a row, rows never change."""
+
+    __tablename__ = "compression_dictionaries"
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"))
+    event_type = Column(String, nullable=True)  # None: any event of the tenant
+    zstd_dict_id = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=utc_now)
+
+    __table_args__ = (
+        Index("ix_compression_dictionary_scope", "tenant_id", "event_type"),
+    )
+
 
 class Event(Base):
     __tablename__ = "events"
     id = Column(Integer, primary_key=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"))
     sha256 = Column(String, nullable=False)
-    payload = Column(JSON, nullable=False)
+    # Exactly one of raw_payload and payload_zstd is set; use ``payload``.
+    raw_payload = Column("payload", JSON, nullable=True)
+    payload_zstd = Column(LargeBinary, nullable=True)
+    dictionary_id = Column(Integer, ForeignKey("compression_dictionaries.id"))
     duplicate = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), default=utc_now)
 
     tenant = relationship("Tenant", back_populates="events")
 
+    @property
+    def payload(self) -> dict:
+        if self.payload_zstd is None:
+            return self.raw_payload
+        from app.storage import compression
+
+        raw = compression.decompress(
+            self.payload_zstd, self.dictionary_id, self.tenant_id, object_session(self)
+        )
+        return json.loads(raw)
+
+    @payload.setter
+    def payload(self, value: dict) -> None:
+        self.raw_payload = value
+        self.payload_zstd = None
+        self.dictionary_id = None
+
+    def store_compressed(self, blob: bytes, dictionary_id: int | None) -> None:
+        self.raw_payload = None
+        self.payload_zstd = blob
+        self.dictionary_id = dictionary_id
+
     __table_args__ = (Index("ix_event_unique", "tenant_id", "sha256"),)
 
 
@@ -75,10 +136,130 @@ class Delivery(Base):
     __tablename__ = "deliveries"
     id = Column(Integer, primary_key=True)
     event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"))
+    target_id = Column(Integer, ForeignKey("targets.id", ondelete="CASCADE"))
     status = Column(Integer, nullable=False)
     response = Column(Text)
     attempts = Column(Integer, nullable=False, default=0)
     next_run = Column(DateTime(timezone=True), nullable=True)
+    latency_ms = Column(Float, nullable=True)
+    error = Column(String, nullable=True)  # connect_timeout, read_timeout, ...
     created_at = Column(DateTime(timezone=True), default=utc_now)
 
     event = relationship("Event")
+    target = relationship("Target")
+
+    __table_args__ = (Index("ix_delivery_event_target", "event_id", "target_id"),)
+
+
+class OrderedDelivery(Base):
+    """A delivery waiting for its turn in an ordered target's lane."""
+
+    __tablename__ = "ordered_deliveries"
+    id = Column(Integer, primary_key=True)  # the order within the lane
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"))
+    target_id = Column(Integer, ForeignKey("targets.id", ondelete="CASCADE"))
+    lane = Column(String, nullable=False)
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"))
+    attempts = Column(Integer, nullable=False, default=0)
+    due_at = Column(DateTime(timezone=True), nullable=True)  # paced replays
+    created_at = Column(DateTime(timezone=True), default=utc_now)
+
+    __table_args__ = (Index("ix_ordered_delivery_lane", "target_id", "lane", "id"),)
+
+
+class OutboxMessage(Base):
+    """A task to publish, written in the same transaction as the rows it refers to."""
+
+    __tablename__ = "outbox"
+    id = Column(Integer, primary_key=True)
+    task = Column(String, nullable=False)
+    args = Column(JSON, nullable=False)
+    queue = Column(String, nullable=True)
+    trace_context = Column(JSON, nullable=True)
+    eta = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=utc_now)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_outbox_pending",
+            "id",
+            postgresql_where=text("sent_at IS NULL"),
+            sqlite_where=text("sent_at IS NULL"),
+        ),
+    )
+
+
+class IngestRollup(Base):
+    """Events stored per tenant and time bucket (``resolution`` seconds wide)."""
+
+    __tablename__ = "ingest_rollups"
+    tenant_id = Column(
+        Integer, ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True
+    )
+    resolution = Column(Integer, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    events = Column(Integer, nullable=False, default=0)
+
+
+class DeliveryRollup(Base):
+    """Delivery attempts per target and time bucket, with a latency sketch."""
+
+    __tablename__ = "delivery_rollups"
+    tenant_id = Column(
+        Integer, ForeignKey("tenants.id", ondelete="CASCADE"), primary_key=True
+    )
+    target_id = Column(
+        Integer, ForeignKey("targets.id", ondelete="CASCADE"), primary_key=True
+    )
+    resolution = Column(Integer, primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    successes = Column(Integer, nullable=False, default=0)
+    latency = Column(JSON, nullable=True)  # app.services.sketch.Sketch.to_dict()
+
+
+class ReplayJob(Base):
+    """A paced replay of a tenant's events, scheduled a window at a time."""
+
+    __tablename__ = "replay_jobs"
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"))
+    target_id = Column(Integer, ForeignKey("targets.id", ondelete="CASCADE"))
+    since = Column(DateTime(timezone=True), nullable=True)
+    until = Column(DateTime(timezone=True), nullable=True)
+    mode = Column(String, nullable=False)  # rate | timing | max
+    rate = Column(Float, nullable=True)  # events per second per target
+    speed = Column(Float, nullable=True)  # timing multiplier, 1.0 = original
+    status = Column(String, nullable=False, default="pending")
+    cursor = Column(Integer, nullable=False, default=0)  # last scheduled event id
+    tick = Column(Integer, nullable=False, default=0)
+    anchor_at = Column(DateTime(timezone=True), nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    scheduled = Column(Integer, nullable=False, default=0)
+    # events: replay stored events; dead_letters: redrive exhausted deliveries
+    source = Column(String, nullable=False, default="events", server_default="events")
+    created_at = Column(DateTime(timezone=True), default=utc_now)
+
+
+class DeadLetter(Base):
+    """A delivery that failed its last attempt, kept until it is redriven."""
+
+    __tablename__ = "dead_letters"
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id", ondelete="CASCADE"))
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"))
+    target_id = Column(Integer, ForeignKey("targets.id", ondelete="CASCADE"))
+    attempts = Column(Integer, nullable=False)
+    status = Column(Integer, nullable=False)  # of the last attempt, 0 if none
+    reason = Column(String, nullable=False)  # http_503, read_timeout, ...
+    response = Column(Text)
+    created_at = Column(DateTime(timezone=True), default=utc_now)
+    redriven_at = Column(DateTime(timezone=True), nullable=True)
+    redrive_job_id = Column(Integer, ForeignKey("replay_jobs.id", ondelete="SET NULL"))
+
+    __table_args__ = (
+        Index("ix_dead_letter_tenant", "tenant_id", "created_at"),
+        Index("ix_dead_letter_target", "target_id", "created_at"),
+    )
@@ -0,0 +1,333 @@
+"""Move a tenant to another database shard while it keeps running.
+
+    poetry run python -m app.db.move_tenant prepare
+    poetry run python -m app.db.move_tenant move 42 --to eu1 [--purge]
+
+``prepare`` runs once after shards are added. It makes every shard's
+Postgres sequences hand out ids equal to the shard's index modulo
+``shard_id_stride``, starting above every id already in use, so rows keep
+their ids when they move.
+
+``move`` works in phases:
+
+1. Copy. The tenant's rows are copied while it keeps taking traffic. Events,
+   deliveries and compression dictionaries never change, so only the ids
+   missing on the destination are copied, and an interrupted move just
+   starts again.
+2. Cutover. The tenant is flagged ``moving`` in the directory. From then on,
+   ingest and API writes get a 503 with ``Retry-After``, and deliveries,
+   replays and background writers hold its work back. The mover waits out
+   the shard map cache, copies what changed, points the directory at the
+   new shard and clears the flag. This takes seconds.
+3. Sweep. A worker that looked up the shard just before the flag went up
+   may still write an attempt to the source, for up to one delivery
+   timeout. Those rows are copied once that window has passed.
+4. Purge (``--purge``). The tenant's rows are deleted from the source.
+
+Outbox rows are not moved. The source's relay publishes them, and the tasks
+find their rows on the new shard.
+"""
+
+import argparse
+import json
+import logging
+import time
+from datetime import UTC, datetime, timedelta
+
+from app.core.config import get_settings
+from app.db import models, shards
+from app.db.session import SessionLocal
+from app.services import rollups
+from sqlalchemy import delete, func, insert, select, text, true, update
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+# Rows that are only ever inserted, in foreign key order.
+APPEND_ONLY = ("compression_dictionaries", "events", "deliveries")
+# Tables whose rows change, replaced wholesale on the destination: replay jobs,
+# dead letters and ordered lanes are small, and rollups only since the move
+# started.
+REPLACED = (
+    "replay_jobs",
+    "dead_letters",
+    "ordered_deliveries",
+    "ingest_rollups",
+    "delivery_rollups",
+)
+# Columns of the tenant row that belong to the directory, not the shard.
+DIRECTORY_COLUMNS = ("shard", "moving")
+
+CACHE_MARGIN = 2.0  # seconds on top of shard_map_ttl for in-flight requests
+
+
+class MoveError(Exception):
+    pass
+
+
+def _table(name: str):
+    return models.Base.metadata.tables[name]
+
+
+def _scope(table, tenant_id: int):
+    """Rows of ``table`` that belong to the tenant."""
+    if table.name == "tenants":
+        return table.c.id == tenant_id
+    if table.name == "deliveries":
+        events = _table("events")
+        return table.c.event_id.in_(
+            select(events.c.id).where(events.c.tenant_id == tenant_id)
+        )
+    return table.c.tenant_id == tenant_id
+
+
+def _recent(table, since: datetime | None):
+    """Rollup buckets that may have changed since ``since``; all when None."""
+    if since is None or "bucket" not in table.c:
+        return true()
+    # A bucket takes writes for ``resolution`` seconds after it starts, and
+    # late attempt records may land in it a little after that.
+    return table.c.bucket >= since - timedelta(seconds=2 * max(rollups.RESOLUTIONS))
+
+
+def prepare() -> None:
+    """Partition id sequences across shards; a no-op on SQLite."""
+    settings = get_settings()
+    stride = settings.shard_id_stride
+    names = shards.names()
+    if len(names) > stride:
+        raise MoveError(f"{len(names)} shards need shard_id_stride >= {len(names)}")
+    engines = {name: shards.engine(name) for name in names}
+    for table in models.Base.metadata.sorted_tables:
+        if "id" not in table.c or not table.c.id.primary_key:
+            continue
+        top = 0
+        for engine in engines.values():
+            with engine.connect() as conn:
+                top = max(top, conn.scalar(select(func.max(table.c.id))) or 0)
+        for name, engine in engines.items():
+            if engine.dialect.name != "postgresql":
+                logger.warning(
+                    "Shard %s is not Postgres; ids are not partitioned", name
+                )
+                continue
+            residue = shards.index(name)
+            start = top + 1 + (residue - top - 1) % stride
+            with engine.begin() as conn:
+                sequence = conn.scalar(
+                    text("SELECT pg_get_serial_sequence(:table, 'id')"),
+                    {"table": table.name},
+                )
+                if sequence is None:
+                    continue
+                conn.execute(
+                    text(
+                        f"ALTER SEQUENCE {sequence} "
+                        f"INCREMENT BY {stride} RESTART WITH {start}"
+                    )
+                )
+            logger.info(
+                "%s on %s: ids from %d every %d", table.name, name, start, stride
+            )
+
+
+class Mover:
+    def __init__(self, tenant_id: int, source: str, destination: str, batch_size: int):
+        self.tenant_id = tenant_id
+        self.destination_name = destination
+        self.source = shards.engine(source)
+        self.destination = shards.engine(destination)
+        self.batch_size = batch_size
+        self.copied: dict[str, int] = {}
+
+    def _count(self, table: str, rows: int) -> None:
+        self.copied[table] = self.copied.get(table, 0) + rows
+
+    def sync_tenant(self) -> None:
+        """Upsert the tenant row, leaving the directory's own columns alone."""
+        table = _table("tenants")
+        with self.source.connect() as src:
+            row = dict(
+                src.execute(select(table).where(table.c.id == self.tenant_id))
+                .one()
+                ._mapping
+            )
+        values = {k: v for k, v in row.items() if k not in DIRECTORY_COLUMNS}
+        with self.destination.begin() as dst:
+            exists = dst.scalar(select(table.c.id).where(table.c.id == self.tenant_id))
+            if exists:
+                dst.execute(
+                    update(table).where(table.c.id == self.tenant_id).values(values)
+                )
+            else:
+                dst.execute(
+                    insert(table).values({**values, "shard": self.destination_name})
+                )
+
+    def sync_targets(self) -> None:
+        """Upsert targets one by one: deleting one would cascade to deliveries."""
+        table = _table("targets")
+        scope = _scope(table, self.tenant_id)
+        with self.source.connect() as src:
+            rows = {
+                row.id: dict(row._mapping)
+                for row in src.execute(select(table).where(scope))
+            }
+        with self.destination.begin() as dst:
+            existing = set(dst.scalars(select(table.c.id).where(scope)))
+            for target_id, row in rows.items():
+                if target_id in existing:
+                    dst.execute(
+                        update(table).where(table.c.id == target_id).values(row)
+                    )
+                else:
+                    dst.execute(insert(table).values(row))
+                    self._count("targets", 1)
+            gone = existing - rows.keys()
+            if gone:
+                dst.execute(delete(table).where(table.c.id.in_(gone)))
+
+    def copy_missing(self, name: str) -> None:
+        """Insert the tenant's rows whose ids the destination lacks."""
+        table = _table(name)
+        scope = _scope(table, self.tenant_id)
+        with self.destination.connect() as dst:
+            have = set(dst.scalars(select(table.c.id).where(scope)))
+        with self.source.connect() as src:
+            ids = [
+                i
+                for i in src.scalars(
+                    select(table.c.id).where(scope).order_by(table.c.id)
+                )
+                if i not in have
+            ]
+            for start in range(0, len(ids), self.batch_size):
+                chunk = ids[start : start + self.batch_size]
+                rows = [
+                    dict(row._mapping)
+                    for row in src.execute(select(table).where(table.c.id.in_(chunk)))
+                ]
+                try:
+                    with self.destination.begin() as dst:
+                        dst.execute(insert(table), rows)
+                except IntegrityError as exc:
+                    raise MoveError(
+                        f"Could not copy {name} {chunk[0]}..{chunk[-1]}; ids may "
+                        f"collide (run `prepare` first): {exc.orig}"
+                    ) from exc
+                self._count(name, len(rows))
+
+    def replace(self, name: str, since: datetime | None = None) -> None:
+        """Overwrite the tenant's rows on the destination in one transaction."""
+        table = _table(name)
+        scope = _scope(table, self.tenant_id) & _recent(table, since)
+        with self.source.connect() as src:
+            rows = [
+                dict(row._mapping) for row in src.execute(select(table).where(scope))
+            ]
+        with self.destination.begin() as dst:
+            dst.execute(delete(table).where(scope))
+            if rows:
+                dst.execute(insert(table), rows)
+
+    def copy(self, since: datetime | None = None) -> None:
+        self.sync_tenant()
+        self.sync_targets()
+        for name in APPEND_ONLY:
+            self.copy_missing(name)
+        for name in REPLACED:
+            self.replace(name, since)
+
+    def purge(self, keep_tenant_row: bool) -> None:
+        """Delete the tenant's rows from the source, children first."""
+        names = (
+            "deliveries",
+            *reversed(REPLACED),
+            "events",
+            "compression_dictionaries",
+            "targets",
+        )
+        if not keep_tenant_row:
+            names += ("tenants",)
+        with self.source.begin() as src:
+            for name in names:
+                table = _table(name)
+                src.execute(delete(table).where(_scope(table, self.tenant_id)))
+
+
+def _set_directory(tenant_id: int, **values) -> None:
+    with SessionLocal() as db:
+        db.query(models.Tenant).filter_by(id=tenant_id).update(values)
+        db.commit()
+
+
+def move(
+    tenant_id: int, destination: str, batch_size: int = 1000, purge: bool = False
+) -> dict:
+    settings = get_settings()
+    shards.url(destination)  # fail early on a typo
+    with SessionLocal() as db:
+        tenant = db.get(models.Tenant, tenant_id)
+        if tenant is None:
+            raise MoveError(f"Unknown tenant {tenant_id}")
+        source = tenant.shard
+    if source == destination:
+        raise MoveError(f"Tenant {tenant_id} is already on {destination}")
+
+    mover = Mover(tenant_id, source, destination, batch_size)
+    started = datetime.now(UTC)
+    logger.info("Copying tenant %s from %s to %s", tenant_id, source, destination)
+    mover.copy()
+
+    _set_directory(tenant_id, moving=True)
+    frozen = time.monotonic()
+    try:
+        # Every process sees the flag once its cached shard map expires.
+        time.sleep(settings.shard_map_ttl + CACHE_MARGIN)
+        mover.copy(since=started)
+        _set_directory(tenant_id, shard=destination, moving=False)
+    except BaseException:
+        _set_directory(tenant_id, moving=False)
+        raise
+    paused = time.monotonic() - frozen
+    logger.info(
+        "Tenant %s now on %s after a %.1fs pause", tenant_id, destination, paused
+    )
+
+    time.sleep(settings.shard_map_ttl + settings.delivery_timeout_max + CACHE_MARGIN)
+    for name in APPEND_ONLY:
+        mover.copy_missing(name)
+    if purge:
+        mover.purge(keep_tenant_row=source == shards.DEFAULT)
+    return {
+        "tenant_id": tenant_id,
+        "from": source,
+        "to": destination,
+        "paused_seconds": round(paused, 1),
+        "copied": mover.copied,
+        "purged": purge,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("prepare", help="partition id sequences across shards")
+    move_cmd = commands.add_parser("move", help="move one tenant")
+    move_cmd.add_argument("tenant", type=int)
+    move_cmd.add_argument("--to", required=True, help="destination shard")
+    move_cmd.add_argument("--batch-size", type=int, default=1000)
+    move_cmd.add_argument("--purge", action="store_true", help="delete the source rows")
+    args = parser.parse_args(argv)
+
+    if args.command == "prepare":
+        prepare()
+        return
+    print(json.dumps(move(args.tenant, args.to, args.batch_size, args.purge)))
+
+
+if __name__ == "__main__":
+    from app.core.logging import configure_logging
+
+    configure_logging()
+    main()
@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, Literal, Optional
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl
 
 
 class TenantCreate(BaseModel):
@@ -22,10 +22,25 @@ class TenantOut(BaseModel):
         orm_mode = True
 
 
+class FieldPredicate(BaseModel):
+    path: str
+    op: Literal["eq", "ne", "in", "gt", "gte", "lt", "lte", "exists"] = "eq"
+    value: Any = None
+
+
+class TargetFilters(BaseModel):
+    event_types: list[str] | None = None
+    fields: list[FieldPredicate] | None = None
+
+
 class TargetCreate(BaseModel):
     url: HttpUrl
+    name: str | None = None
     provider: str | None = None
     headers: dict | None = None
+    filters: TargetFilters | None = None
+    ordered: bool = False  # one delivery at a time, in order, per lane
+    order_key: str | None = None  # payload path splitting the tenant into lanes
 
 
 class TargetOut(TargetCreate):
@@ -49,3 +64,87 @@ class EventOut(BaseModel):
 class EventReplayResponse(BaseModel):
     status: str
     event_id: int
+
+
+class ReplayCreate(BaseModel):
+    target_id: int | None = None
+    since: datetime | None = None
+    until: datetime | None = None
+    mode: Literal["rate", "timing", "max"] = "max"
+    rate: float | None = Field(None, gt=0)  # events per second per target
+    speed: float = Field(1.0, gt=0)  # timing mode: 2.0 replays twice as fast
+
+
+class RedriveCreate(BaseModel):
+    target_id: int | None = None
+    since: datetime | None = None  # when the deliveries were dead-lettered
+    until: datetime | None = None
+    mode: Literal["rate", "max"] = "rate"
+    rate: float | None = Field(None, gt=0)  # per target; default redrive_rate
+
+
+class ReplayJobOut(BaseModel):
+    id: int
+    source: str
+    target_id: int | None
+    since: datetime | None
+    until: datetime | None
+    mode: str
+    rate: float | None
+    speed: float | None
+    status: str
+    scheduled: int
+    started_at: datetime | None
+    finished_at: datetime | None
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class DeadLetterOut(BaseModel):
+    id: int
+    event_id: int
+    target_id: int
+    attempts: int
+    status: int
+    reason: str
+    response: str | None
+    created_at: datetime
+    redriven_at: datetime | None
+    redrive_job_id: int | None
+
+    class Config:
+        orm_mode = True
+
+
+class LatencyPercentiles(BaseModel):
+    p50: float | None
+    p90: float | None
+    p99: float | None
+    max: float | None
+
+
+class DeliveryStats(BaseModel):
+    attempts: int
+    successes: int
+    success_rate: float | None
+    latency_ms: LatencyPercentiles
+
+
+class TargetStats(DeliveryStats):
+    target_id: int
+
+
+class TenantBacklog(BaseModel):
+    tenant_id: int
+    backlog: int
+    queues: dict[str, int]
+
+
+class StatsSummary(BaseModel):
+    since: datetime
+    until: datetime
+    events: int
+    deliveries: DeliveryStats
+    targets: list[TargetStats]
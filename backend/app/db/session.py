@@ -1,7 +1,57 @@
+import time
+
+from app.core import admission
 from app.core.config import get_settings
+from app.core.metrics import DB_POOL_CHECKOUT_SECONDS
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            with admission.POOL_WAITS.waiting():
+                return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+
+
+def engine_options(settings) -> dict:
+    """Pool configuration shared by the primary and replica engines."""
+    if settings.db_pgbouncer:
+        # PgBouncer in transaction mode multiplexes server connections itself;
+        # holding idle client connections here would pin them for nothing.
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
 
 settings = get_settings()
-engine = create_engine(settings.database_url)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_engine(settings.database_url, **engine_options(settings))
+
+# Read-only traffic goes to the replica when one is configured.
+read_engine = (
+    create_engine(settings.database_replica_url, **engine_options(settings))
+    if settings.database_replica_url
+    else engine
+)
+
+# Sessions only check a connection out of the pool on their first query, and
+# keeping attributes loaded after commit avoids a second checkout just to
+# refresh them.
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+)
+ReadSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=read_engine
+)
@@ -0,0 +1,166 @@
+"""Tenant-sharded databases.
+
+``database_url`` is the directory. It holds every tenant's ``tenants`` row,
+which names the shard the tenant lives on, and every API key. It is also
+the ``default`` shard. More shards are listed in ``database_shards`` as
+``name=url,...``, and each one carries the full schema:
+
+    alembic -x shard=eu1 upgrade head
+
+A tenant's targets, events, deliveries, dead letters, rollups and replay
+jobs live on its shard, next to a copy of its ``tenants`` row that keeps the
+foreign keys valid and carries ``routing_version``. Tenant settings are written in the
+directory and copied over with ``mirror_tenant``.
+
+Processes cache the shard map for ``shard_map_ttl`` seconds. While a tenant
+is being moved (``python -m app.db.move_tenant``) it is flagged ``moving``:
+API writes get a 503 and background writers put its work back for later.
+Without ``database_shards`` everything is on ``default`` and the map is never
+read.
+
+Ids must not collide when rows move, so ``move_tenant prepare`` makes the
+Postgres sequences of shard ``i`` (its position in ``database_shards``,
+``default`` being 0) hand out only ids equal to ``i`` modulo
+``shard_id_stride``.
+"""
+
+import threading
+import time
+from collections.abc import Callable
+from functools import lru_cache
+
+from app.core.config import get_settings
+from app.db import models
+from app.db.session import ReadSessionLocal, SessionLocal, engine_options
+from app.db.session import engine as default_engine
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+DEFAULT = "default"
+
+_map: dict[int, tuple[float, str, bool]] = {}
+_lock = threading.Lock()
+_engines: list = []  # shard engines built so far, ``default``'s excluded
+_engine_hooks: list[Callable] = []
+
+
+class TenantMoving(Exception):
+    """The tenant is being moved to another shard; try again shortly."""
+
+
+@lru_cache
+def _urls(spec: str) -> dict[str, str]:
+    urls = {DEFAULT: get_settings().database_url}
+    for item in filter(None, spec.split(",")):
+        name, url = item.split("=", 1)
+        urls[name.strip()] = url.strip()
+    return urls
+
+
+def names() -> list[str]:
+    """Every shard, ``default`` first and the others in configured order."""
+    return list(_urls(get_settings().database_shards))
+
+
+def url(name: str) -> str:
+    try:
+        return _urls(get_settings().database_shards)[name]
+    except KeyError:
+        raise ValueError(f"Unknown shard {name!r}") from None
+
+
+def index(name: str) -> int:
+    """The shard's residue for id allocation."""
+    return names().index(name)
+
+
+@lru_cache
+def engine(name: str):
+    if name == DEFAULT:
+        return default_engine
+    built = create_engine(url(name), **engine_options(get_settings()))
+    with _lock:
+        _engines.append(built)
+        hooks = list(_engine_hooks)
+    for hook in hooks:
+        hook(built)
+    return built
+
+
+def on_engine(hook: Callable) -> None:
+    """Call ``hook(engine)`` for every shard engine, built already or later.
+
+    Shard engines are built on first use; ``default``'s are not included.
+    """
+    with _lock:
+        _engine_hooks.append(hook)
+        built = list(_engines)
+    for existing in built:
+        hook(existing)
+
+
+@lru_cache
+def sessionmaker_for(name: str, read: bool = False) -> sessionmaker:
+    """Session factory for a shard; reads on ``default`` use the replica."""
+    if name == DEFAULT:
+        return ReadSessionLocal if read else SessionLocal
+    return sessionmaker(
+        autocommit=False, autoflush=False, expire_on_commit=False, bind=engine(name)
+    )
+
+
+def locate(tenant_id: int | None) -> tuple[str, bool]:
+    """``(shard, moving)`` for a tenant, from the cached shard map."""
+    if tenant_id is None or not get_settings().database_shards:
+        return DEFAULT, False
+    now = time.monotonic()
+    cached = _map.get(tenant_id)
+    if cached is not None and cached[0] > now:
+        return cached[1], cached[2]
+    with SessionLocal() as db:
+        row = (
+            db.query(models.Tenant.shard, models.Tenant.moving)
+            .filter_by(id=tenant_id)
+            .first()
+        )
+    shard, moving = row if row else (DEFAULT, False)
+    with _lock:
+        _map[tenant_id] = (now + get_settings().shard_map_ttl, shard, moving)
+    return shard, moving
+
+
+def session_for(tenant_id: int | None, read: bool = False) -> Session:
+    """A session on the tenant's shard."""
+    return sessionmaker_for(locate(tenant_id)[0], read)()
+
+
+def writable_session(tenant_id: int | None) -> Session:
+    """Like ``session_for``, but raises ``TenantMoving`` during a move."""
+    shard, moving = locate(tenant_id)
+    if moving:
+        raise TenantMoving(tenant_id)
+    return sessionmaker_for(shard)()
+
+
+def group(tenant_ids) -> dict[str, list[int]]:
+    """Tenants by shard, leaving out those being moved."""
+    groups: dict[str, list[int]] = {}
+    for tenant_id in set(tenant_ids):
+        shard, moving = locate(tenant_id)
+        if not moving:
+            groups.setdefault(shard, []).append(tenant_id)
+    return groups
+
+
+def mirror_tenant(tenant: models.Tenant) -> None:
+    """Copy a directory ``tenants`` row to the tenant's shard."""
+    if tenant.shard == DEFAULT:
+        return
+    with sessionmaker_for(tenant.shard)() as db:
+        copy = db.get(models.Tenant, tenant.id) or models.Tenant(id=tenant.id)
+        copy.name = tenant.name
+        copy.token = tenant.token
+        copy.stripe_signing_secret = tenant.stripe_signing_secret
+        copy.shard = tenant.shard
+        db.add(copy)
+        db.commit()
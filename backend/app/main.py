@@ -1,22 +1,32 @@
+import asyncio
 import hashlib
 import json
-from datetime import UTC, datetime
+import secrets
+from datetime import UTC, datetime, timedelta
 
-import boto3
 import redis.asyncio as redis
-import stripe
+from app.core import admission, lanes, metrics, profiling, tracing, warmup
 from app.core.config import get_settings
-from app.db import crud, models, schemas
-from app.db.session import SessionLocal
-from app.services import stripe_verify
-from app.tasks import forward_event
-from app.storage.boot_s3 import ensure_secure_bucket
-from fastapi import Depends, FastAPI, HTTPException, Request, Response, status
+from app.core.logging import configure_logging, payload_logging_enabled
+from app.db import crud, models, schemas, shards
+from app.db.session import ReadSessionLocal, SessionLocal, engine, read_engine
+from app.services import (
+    live,
+    replay,
+    rollups,
+    routing,
+    stream_ingest,
+    stripe_verify,
+)
+from app.storage import compression
+from app.storage.s3_client import get_s3_client
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
+from opentelemetry import trace
 from sqlalchemy.orm import Session
-from stripe.error import SignatureVerificationError
 from fastapi.middleware.cors import CORSMiddleware
 from app.middleware.body_size import BodySizeLimitMiddleware
 from app.middleware.security_headers import SecurityHeadersMiddleware
@@ -32,6 +42,7 @@ app = FastAPI(
     dependencies=[Depends(RateLimiter(times=100, seconds=60))],  # Global rate limit
 )
 bearer_scheme = HTTPBearer()
+admin_scheme = HTTPBearer(auto_error=False)
 
 # Maximum payload size (1MB)
 MAX_PAYLOAD_SIZE = 1024 * 1024
@@ -39,6 +50,17 @@ MAX_PAYLOAD_SIZE = 1024 * 1024
 # CORS lockdown: allow * in dev, restrict in prod
 settings = get_settings()
 
+configure_logging()
+
+# Traces start here and follow each event through Celery to the target
+tracing.configure_tracing("webhook-api")
+tracing.instrument_app(app)
+
+# Broker queue depth and lag are reported alongside the API's own metrics
+metrics.register_queue_collector(
+    settings.redis_url, [queue for lane in lanes.ALL for queue in lanes.queues(lane)]
+)
+
 # Add body size middleware
 app.add_middleware(BodySizeLimitMiddleware)
 
@@ -57,35 +79,42 @@ app.add_middleware(
 
 @app.on_event("startup")
 async def startup():
-    """Initialize services on startup."""
+    """Initialize services on startup.
+
+    Bucket provisioning is a deployment step (``python -m app.storage.boot_s3``),
+    not part of process start. Pools are warmed in the background and
+    ``/ready`` reports 503 until they are.
+    """
+    redis_conn = redis.from_url(settings.redis_url, decode_responses=True)
+    app.state.redis = redis_conn
+    app.state.live = live.LiveHub(redis_conn, settings.live_queue_size)
     try:
         # Initialize rate limiter
-        redis_conn = redis.from_url(settings.redis_url, decode_responses=True)
         await FastAPILimiter.init(redis_conn)
-
-        # Initialize S3 bucket with security settings
-        ensure_secure_bucket()
     except Exception as e:
-        print(f"Warning: Failed to initialize services: {e}")
+        logger.warning("Failed to initialize services: %s", e)
         # Continue without rate limiting
+    if settings.ingest_mode == "stream":
+        await stream_ingest.check_durability(redis_conn)
+    app.state.warmup = asyncio.create_task(warmup.warm_up_api(redis_conn))
+    if settings.admission_enabled:
+        app.state.admission = asyncio.create_task(admission.run_sampler(redis_conn))
 
 
 logger = logging.getLogger(__name__)
 
 
 # ---------- dependency ----------
-def db_session():
+def _session_scope(factory):
     try:
-        db: Session = SessionLocal()
-        logger.info("Database session created successfully")
+        db: Session = factory()
         try:
             yield db
         finally:
             db.close()
-            logger.info("Database session closed")
     except Exception as e:
         if isinstance(e, (sqlalchemy.exc.SQLAlchemyError, sqlalchemy.exc.DBAPIError)):
-            logger.error(f"Database error: {e}")
+            logger.error("Database error: %s", e)
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Database connection failed",
@@ -93,16 +122,13 @@ def db_session():
         raise  # Re-raise non-database exceptions
 
 
-def get_s3_client():
-    settings = get_settings()
-    s3 = boto3.client(
-        "s3",
-        region_name=settings.aws_region,
-        aws_access_key_id=settings.aws_access_key_id,
-        aws_secret_access_key=settings.aws_secret_access_key,
-        endpoint_url=settings.aws_endpoint_url,
-    )
-    return s3
+def db_session():
+    yield from _session_scope(SessionLocal)
+
+
+def db_read_session():
+    """Session on the read replica (the primary when none is configured)."""
+    yield from _session_scope(ReadSessionLocal)
 
 
 def current_tenant(
@@ -118,6 +144,79 @@ def current_tenant(
     return tenant
 
 
+def current_tenant_read(
+    creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    db: Session = Depends(db_read_session),
+) -> models.Tenant:
+    tenant = crud.verify_api_key(db, creds.credentials)
+    if not tenant and read_engine is not engine:
+        # A key issued moments ago may not have replicated yet.
+        with SessionLocal() as primary:
+            tenant = crud.verify_api_key(primary, creds.credentials)
+    if not tenant:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or missing API key",
+        )
+    return tenant
+
+
+def tenant_session(
+    tenant: models.Tenant = Depends(current_tenant),
+    db: Session = Depends(db_session),
+):
+    """Session on the tenant's shard (see ``app.db.shards``)."""
+    if tenant.moving:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Tenant is being moved, retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    if tenant.shard == shards.DEFAULT:
+        yield db
+    else:
+        yield from _session_scope(shards.sessionmaker_for(tenant.shard))
+
+
+def tenant_read_session(
+    tenant: models.Tenant = Depends(current_tenant_read),
+    db: Session = Depends(db_read_session),
+):
+    if tenant.shard == shards.DEFAULT:
+        yield db
+    else:
+        yield from _session_scope(shards.sessionmaker_for(tenant.shard, read=True))
+
+
+def require_admin(
+    creds: HTTPAuthorizationCredentials | None = Depends(admin_scheme),
+) -> None:
+    """Operators only; the endpoints do not exist unless ADMIN_TOKEN is set."""
+    token = get_settings().admin_token
+    if not token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if creds is None or not secrets.compare_digest(
+        creds.credentials.encode(), token.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token"
+        )
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/ready", include_in_schema=False)
+async def ready(response: Response):
+    if not warmup.is_ready():
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "warming_up"}
+    return {"status": "ready"}
+
+
 @app.get("/health", include_in_schema=False)
 async def health():
     settings = get_settings()
@@ -135,8 +234,10 @@ async def health():
 # ---------- signup ----------
 @app.post("/signup")
 def signup(data: schemas.TenantCreate, db: Session = Depends(db_session)):
-    tenant = crud.create_tenant(db, data)
+    tenant = crud.create_tenant(db, data, shard=get_settings().new_tenant_shard)
     api_key = crud.issue_api_key(db, tenant.id)
+    # The shard's copy goes first: an orphaned copy is harmless, a missing one isn't.
+    shards.mirror_tenant(tenant)
     db.commit()
     return {
         "tenant": {"id": tenant.id, "name": tenant.name, "token": tenant.token},
@@ -147,7 +248,7 @@ def signup(data: schemas.TenantCreate, db: Session = Depends(db_session)):
 
 # ---------- whoami ----------
 @app.get("/me")
-def who_am_i(tenant: models.Tenant = Depends(current_tenant)):
+def who_am_i(tenant: models.Tenant = Depends(current_tenant_read)):
     return {"id": tenant.id, "name": tenant.name, "token": tenant.token}
 
 
@@ -158,13 +259,38 @@ def who_am_i(tenant: models.Tenant = Depends(current_tenant)):
 def create_target(
     data: schemas.TargetCreate,
     tenant: models.Tenant = Depends(current_tenant),
-    db: Session = Depends(db_session),
+    db: Session = Depends(tenant_session),
 ):
+    if data.filters:
+        try:
+            routing.compile_filters(data.filters.model_dump(exclude_none=True))
+        except routing.FilterError as exc:
+            raise HTTPException(status_code=422, detail=str(exc))
     target = crud.upsert_target(db, tenant.id, data)
     db.commit()
     return target
 
 
+@app.get("/targets", response_model=list[schemas.TargetOut])
+def list_targets(
+    tenant: models.Tenant = Depends(current_tenant_read),
+    db: Session = Depends(tenant_read_session),
+):
+    return crud.list_targets(db, tenant.id)
+
+
+@app.delete("/targets/{target_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_target(
+    target_id: int,
+    tenant: models.Tenant = Depends(current_tenant),
+    db: Session = Depends(tenant_session),
+):
+    if not crud.delete_target(db, tenant.id, target_id):
+        raise HTTPException(status_code=404, detail="Target not found")
+    db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
 # ---------- stripe ----------
 @app.put("/tenants/{token}/stripe")
 def set_stripe_secret(
@@ -174,11 +300,132 @@ def set_stripe_secret(
     if not tenant:
         raise HTTPException(status_code=404, detail="Not Found")
     tenant.stripe_signing_secret = data.signing_secret
+    # The shard's copy goes first, as at signup: ingest verifies against it.
+    shards.mirror_tenant(tenant)
     db.commit()
     return {"status": "ok"}
 
 
+# ---------- stats ----------
+@app.get("/stats/summary", response_model=schemas.StatsSummary)
+def stats_summary(
+    since: datetime | None = None,
+    until: datetime | None = None,
+    target_id: int | None = None,
+    tenant: models.Tenant = Depends(current_tenant_read),
+    db: Session = Depends(tenant_read_session),
+):
+    """Event counts, delivery success rate and latency percentiles for a window.
+
+    Defaults to the last 24 hours; served from rollups, never from raw rows.
+    """
+    until = until or datetime.now(UTC)
+    since = since or until - timedelta(days=1)
+    if since >= until:
+        raise HTTPException(status_code=422, detail="since must be before until")
+    return rollups.summary(db, tenant.id, since, until, target_id)
+
+
+@app.get("/stats/backlog", response_model=schemas.TenantBacklog)
+async def stats_backlog(
+    request: Request, tenant: models.Tenant = Depends(current_tenant_read)
+):
+    """Deliveries waiting for a worker, and the depth of the tenant's shards.
+
+    Shards are shared with other tenants, so their depth is an upper bound on
+    what sits in front of the tenant's next delivery.
+    """
+    redis_conn = request.app.state.redis
+    queues = [
+        f"{lane}.{shard}"
+        for lane in lanes.ALL
+        for shard in lanes.tenant_shards(tenant.id)
+    ]
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        pipe.hget(lanes.BACKLOG_KEY, tenant.id)
+        for queue in queues:
+            pipe.llen(queue)
+        backlog, *depths = await pipe.execute()
+    return {
+        "tenant_id": tenant.id,
+        "backlog": max(0, int(backlog or 0)),
+        "queues": dict(zip(queues, depths)),
+    }
+
+
 # ---------- events ----------
+def _event_out(event: models.Event) -> dict:
+    return {
+        "id": event.id,
+        "provider": "stripe",
+        "event_type": event.payload.get("event", ""),
+        "duplicate": bool(event.duplicate),
+        "created_at": event.created_at,
+    }
+
+
+@app.get("/events", response_model=list[schemas.EventOut])
+def list_events(
+    limit: int = Query(100, ge=1, le=1000),
+    tenant: models.Tenant = Depends(current_tenant_read),
+    db: Session = Depends(tenant_read_session),
+):
+    return [_event_out(ev) for ev in crud.list_events(db, tenant.id, limit=limit)]
+
+
+@app.get("/events/export", description="Stream every stored event as NDJSON.")
+def export_events(
+    since: datetime | None = None,
+    tenant: models.Tenant = Depends(current_tenant_read),
+):
+    tenant_id, factory = tenant.id, shards.sessionmaker_for(tenant.shard, read=True)
+
+    def rows():
+        # The export outlives the request's dependencies, so it owns its session.
+        with factory() as db:
+            for ev in crud.iter_events(db, tenant_id, since=since):
+                line = {**_event_out(ev), "payload": ev.payload}
+                yield json.dumps(line, default=str) + "\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+def stream_tenant_id(
+    creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+) -> int:
+    """Authenticate without holding a DB session for the life of a stream."""
+    with ReadSessionLocal() as db:
+        return current_tenant_read(creds, db).id
+
+
+@app.get(
+    "/events/stream",
+    description="Server-sent events for new events and delivery results.",
+)
+async def stream_events(request: Request, tenant_id: int = Depends(stream_tenant_id)):
+    hub: live.LiveHub | None = getattr(request.app.state, "live", None)
+    if hub is None:
+        raise HTTPException(status_code=503, detail="Live tail unavailable")
+    heartbeat = get_settings().live_heartbeat_seconds
+
+    async def messages():
+        async with hub.subscribe(tenant_id) as queue:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    data = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {data}\n\n"
+
+    return StreamingResponse(
+        messages(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post(
     "/events/{event_id}/replay",
     status_code=status.HTTP_202_ACCEPTED,
@@ -187,28 +434,260 @@ def set_stripe_secret(
 )
 def replay_event(
     event_id: int,
+    target_id: int | None = None,
     tenant: models.Tenant = Depends(current_tenant),
-    db: Session = Depends(db_session),
+    db: Session = Depends(tenant_session),
 ):
     # Fetch the event
     event = db.query(models.Event).filter_by(id=event_id).first()
     if not event or event.tenant_id != tenant.id:
         raise HTTPException(status_code=404, detail="Event not found")
 
-    # Create a new delivery record
-    delivery = models.Delivery(
-        event_id=event.id, attempts=0, status=0, response="manual replay"  # queued
+    # Replay to one target, or to every target whose filters match the event
+    if target_id is not None:
+        target = (
+            db.query(models.Target).filter_by(id=target_id, tenant_id=tenant.id).first()
+        )
+        if not target:
+            raise HTTPException(status_code=404, detail="Target not found")
+        target_ids = [target_id]
+    else:
+        # The shard's copy of the tenant carries the current routing version.
+        target_ids = routing.route(db, db.get(models.Tenant, tenant.id), event.payload)
+
+    # Queue the deliveries in the same transaction as the request
+    crud.fan_out(
+        db,
+        event.id,
+        target_ids,
+        lane=lanes.REPLAY,
+        tenant_id=tenant.id,
     )
-    db.add(delivery)
     db.commit()
 
-    # Queue the event for delivery
-    forward_event.delay(str(event.id), attempt=1)
-
     return {"status": "queued", "event_id": event.id}
 
 
+@app.post(
+    "/replays",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=schemas.ReplayJobOut,
+    description="Replay a range of events with rate or original-timing pacing.",
+)
+def create_replay(
+    data: schemas.ReplayCreate,
+    tenant: models.Tenant = Depends(current_tenant),
+    db: Session = Depends(tenant_session),
+):
+    if data.mode == "rate" and data.rate is None:
+        raise HTTPException(status_code=422, detail="Rate mode needs a rate")
+    if data.target_id is not None:
+        target = (
+            db.query(models.Target)
+            .filter_by(id=data.target_id, tenant_id=tenant.id)
+            .first()
+        )
+        if not target:
+            raise HTTPException(status_code=404, detail="Target not found")
+    job = replay.start(db, tenant.id, **data.model_dump())
+    db.commit()
+    return job
+
+
+def _replay_job(db: Session, tenant: models.Tenant, job_id: int) -> models.ReplayJob:
+    job = db.query(models.ReplayJob).filter_by(id=job_id, tenant_id=tenant.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Replay not found")
+    return job
+
+
+@app.get("/replays/{job_id}", response_model=schemas.ReplayJobOut)
+def get_replay(
+    job_id: int,
+    tenant: models.Tenant = Depends(current_tenant),
+    db: Session = Depends(tenant_session),
+):
+    return _replay_job(db, tenant, job_id)
+
+
+@app.delete("/replays/{job_id}", response_model=schemas.ReplayJobOut)
+def cancel_replay(
+    job_id: int,
+    tenant: models.Tenant = Depends(current_tenant),
+    db: Session = Depends(tenant_session),
+):
+    job = _replay_job(db, tenant, job_id)
+    if job.status not in replay.FINISHED:
+        job.status = "cancelled"
+        job.finished_at = datetime.now(UTC)
+        db.commit()
+    return job
+
+
+# ---------- dead letters ----------
+@app.get("/dead-letters", response_model=list[schemas.DeadLetterOut])
+def list_dead_letters(
+    target_id: int | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    redriven: bool = False,
+    limit: int = Query(100, ge=1, le=1000),
+    tenant: models.Tenant = Depends(current_tenant_read),
+    db: Session = Depends(tenant_read_session),
+):
+    """Deliveries that failed every attempt, newest first."""
+    return crud.list_dead_letters(
+        db, tenant.id, target_id, since, until, redriven=redriven, limit=limit
+    )
+
+
+@app.post(
+    "/dead-letters/redrive",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=schemas.ReplayJobOut,
+    description="Redeliver dead letters at a steady pace; follow it at /replays/{id}.",
+)
+def redrive_dead_letters(
+    data: schemas.RedriveCreate,
+    tenant: models.Tenant = Depends(current_tenant),
+    db: Session = Depends(tenant_session),
+):
+    if data.target_id is not None:
+        target = (
+            db.query(models.Target)
+            .filter_by(id=data.target_id, tenant_id=tenant.id)
+            .first()
+        )
+        if not target:
+            raise HTTPException(status_code=404, detail="Target not found")
+    options = data.model_dump()
+    if data.mode == "rate" and data.rate is None:
+        options["rate"] = get_settings().redrive_rate
+    job = replay.start(db, tenant.id, source="dead_letters", **options)
+    db.commit()
+    return job
+
+
+# ---------- admin ----------
+@app.get(
+    "/admin/profile",
+    include_in_schema=False,
+    dependencies=[Depends(require_admin)],
+    response_class=PlainTextResponse,
+)
+async def profile_process(
+    kind: str = Query("cpu", pattern="^(cpu|memory|tasks)$"),
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(5.0, ge=1),
+    top: int = Query(50, ge=1, le=1000),
+):
+    """Profile this API process; the body is folded stacks for a flamegraph.
+
+    Workers are profiled with ``python -m app.core.profiling`` instead.
+    """
+    max_seconds = get_settings().profile_max_seconds
+    if seconds > max_seconds:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"seconds must be at most {max_seconds:g}",
+        )
+    options = {"seconds": seconds, "interval": interval_ms / 1000, "top": top}
+    try:
+        if kind == "tasks":
+            # Needs the event loop's own thread.
+            output = profiling.capture(kind)
+        else:
+            output = await asyncio.to_thread(profiling.capture, kind, **options)
+    except profiling.ProfilerBusy:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already running in this process",
+        )
+    return PlainTextResponse(output)
+
+
 # ---------- ingress ----------
+def _verify_signature(
+    request: Request, raw: bytes, tenant_id: int, secret: str | None
+) -> None:
+    """Reject the webhook unless it carries a valid Stripe signature."""
+    stripe_sig = request.headers.get("Stripe-Signature") or request.headers.get(
+        "stripe-signature"
+    )
+
+    if not stripe_sig:
+        raise HTTPException(status_code=400, detail="Missing Stripe signature")
+
+    if not secret:
+        logger.warning(
+            "Tenant has no Stripe signing secret configured",
+            extra={"tenant_id": tenant_id},
+        )
+        raise HTTPException(status_code=400, detail="Stripe webhooks not configured")
+
+    try:
+        with metrics.ingest_stage("signature_verify"):
+            stripe_verify.verify(
+                raw_body=raw, header=stripe_sig, secret=secret, tolerance=300
+            )
+    except stripe_verify.StripeSignatureError as exc:
+        logger.info("Rejected webhook: %s", exc, extra={"tenant_id": tenant_id})
+        raise HTTPException(status_code=400, detail="Invalid Stripe signature")
+
+
+def _check_admission(rejection: admission.Rejection | None) -> None:
+    if rejection is not None:
+        raise HTTPException(
+            status_code=rejection.status_code,
+            detail=(
+                "Too many webhooks, retry later"
+                if rejection.status_code == 429
+                else "Ingest overloaded, retry later"
+            ),
+            headers={"Retry-After": str(rejection.retry_after)},
+        )
+
+
+async def _ingest_to_stream(token: str, request: Request, db: Session) -> dict:
+    """Stream mode: verify, append durably to Redis and answer straight away."""
+    with metrics.ingest_stage("tenant_lookup"):
+        tenant = stream_ingest.lookup_tenant(db, token)
+    if tenant is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    _check_admission(admission.controller.admit(tenant.id))
+
+    with metrics.ingest_stage("body_read"):
+        raw = await request.body()
+    if not raw:
+        raise HTTPException(status_code=400, detail="Empty JSON body")
+    try:
+        with metrics.ingest_stage("parse"):
+            payload = WebhookPayload.model_validate_json(raw)
+    except ValidationError as ve:
+        raise HTTPException(status_code=400, detail=ve.errors())
+    raw = payload.model_dump_json().encode()
+
+    _verify_signature(request, raw, tenant.id, tenant.stripe_signing_secret)
+
+    try:
+        with metrics.ingest_stage("stream_append"):
+            await stream_ingest.append(request.app.state.redis, tenant.id, raw)
+    except Exception as exc:
+        # Nothing was acknowledged, so the provider's retry is the safety net.
+        logger.error(
+            "Failed to append webhook to the ingest stream: %s",
+            exc,
+            extra={"tenant_id": tenant.id},
+        )
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Ingest temporarily unavailable",
+            headers={"Retry-After": "1"},
+        )
+    trace.get_current_span().set_attribute("webhook.tenant_id", tenant.id)
+    return {"status": "received"}
+
+
 @app.post(
     "/in/{token}",
     dependencies=[Depends(RateLimiter(times=30, seconds=60))],  # Per-tenant rate limit
@@ -217,124 +696,170 @@ async def ingest_webhook(
     token: str,
     request: Request,
     db: Session = Depends(db_session),
-    s3_client: boto3.client = Depends(get_s3_client),
+    s3_client=Depends(get_s3_client),
 ):
-    logger.info(f"Received webhook for token: {token}")
-
     # Check for empty payload
     content_length = request.headers.get("content-length", "0")
     if content_length == "0":
         raise HTTPException(status_code=400, detail="Empty JSON body")
 
+    # Shed load before touching the DB pool, which may be what is saturated.
+    _check_admission(admission.controller.overloaded())
+
+    if get_settings().ingest_mode == "stream":
+        return await _ingest_to_stream(token, request, db)
+
     # Look up tenant by token
-    logger.info(f"Looking up tenant with token {token} using session {id(db)}")
-    tenant: models.Tenant | None = (
-        db.query(models.Tenant).filter_by(token=token).first()
-    )
-    logger.info(f"Found tenant: {tenant is not None}")
+    with metrics.ingest_stage("tenant_lookup"):
+        tenant: models.Tenant | None = (
+            db.query(models.Tenant).filter_by(token=token).first()
+        )
     if not tenant:
         # Commit any pending changes to make sure we have the latest data
         db.commit()
         tenant = db.query(models.Tenant).filter_by(token=token).first()
         if not tenant:
             raise HTTPException(status_code=404, detail="Not Found")
+    _check_admission(admission.controller.admit(tenant.id))
+    if tenant.moving:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Ingest temporarily unavailable",
+            headers={"Retry-After": "5"},
+        )
+
+    directory = db
+    if tenant.shard != shards.DEFAULT:
+        # Everything below works on the tenant's shard and its copy of the row.
+        db = shards.sessionmaker_for(tenant.shard)()
+        tenant_id, tenant = tenant.id, db.get(models.Tenant, tenant.id)
+        if tenant is None:
+            # Only the directory has the row; a move or mirror did not finish.
+            db.close()
+            logger.error(
+                "Tenant has no row on its shard", extra={"tenant_id": tenant_id}
+            )
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Ingest temporarily unavailable",
+                headers={"Retry-After": "5"},
+            )
 
     try:
         # Read and parse request body
-        raw = await request.body()
+        with metrics.ingest_stage("body_read"):
+            raw = await request.body()
         if not raw:
             raise HTTPException(status_code=400, detail="Empty JSON body")
 
         # Parse and validate payload
         try:
-            payload = WebhookPayload.model_validate_json(raw)
+            with metrics.ingest_stage("parse"):
+                payload = WebhookPayload.model_validate_json(raw)
         except ValidationError as ve:
             raise HTTPException(status_code=400, detail=ve.errors())
 
         # Convert payload to JSON string for storage
         raw = payload.model_dump_json().encode()
-        raw_str = raw.decode()
-        logger.info(f"Raw body str: {raw_str}")
-        logger.info(f"Raw body bytes: {raw}")
-        logger.info(f"Raw body repr: {repr(raw_str)}")
-
-        # Verify Stripe signature before parsing JSON
-        logger.info("Checking for Stripe signature...")
-        stripe_sig = request.headers.get("Stripe-Signature") or request.headers.get(
-            "stripe-signature"
-        )
-        logger.info(f"Stripe signature present: {stripe_sig is not None}")
-
-        if not stripe_sig:
-            raise HTTPException(status_code=400, detail="Missing Stripe signature")
-
-        if not tenant.stripe_signing_secret:
-            logger.warning(
-                f"Tenant {tenant.id} has no Stripe signing secret configured"
-            )
-            raise HTTPException(
-                status_code=400, detail="Stripe webhooks not configured"
+        if payload_logging_enabled(tenant.id):
+            logger.info(
+                "Webhook payload",
+                extra={"tenant_id": tenant.id, "payload": raw.decode()},
             )
 
-        # Verify event signature
-        try:
-            logger.info(f"Tenant stripe_signing_secret: {tenant.stripe_signing_secret}")
-            # Verify the event
-            stripe_verify.verify(
-                raw_body=raw,
-                header=stripe_sig,
-                secret=tenant.stripe_signing_secret,
-                tolerance=300,
-            )
-            logger.info("Stripe signature verification successful")
-        except stripe_verify.StripeSignatureError:
-            raise HTTPException(status_code=400, detail="Invalid Stripe signature")
+        _verify_signature(request, raw, tenant.id, tenant.stripe_signing_secret)
 
         # Compute SHA-256 hash
-        sha256 = hashlib.sha256(raw).hexdigest()
+        with metrics.ingest_stage("hash"):
+            sha256 = hashlib.sha256(raw).hexdigest()
 
         # Check if event already exists
-        existing_event = (
-            db.query(models.Event).filter_by(tenant_id=tenant.id, sha256=sha256).first()
-        )
+        with metrics.ingest_stage("dedup_query"):
+            existing_event = (
+                db.query(models.Event)
+                .filter_by(tenant_id=tenant.id, sha256=sha256)
+                .first()
+            )
         if not existing_event:
+            data = payload.model_dump()
             event = models.Event(
                 tenant_id=tenant.id,
                 sha256=sha256,
-                payload=payload.model_dump(),
+                payload=data,
                 duplicate=False,
             )
+            # Compress once; the DB row and the S3 object share the result
+            compressed = None
+            if get_settings().payload_compression:
+                with metrics.ingest_stage("compress"):
+                    compressed = compression.compress(db, tenant.id, payload.event, raw)
+                if compressed is not None:
+                    event.store_compressed(*compressed)
             db.add(event)
-            db.commit()
 
-            # Queue event for delivery
-            logger.info(f"Queuing event {event.id} for delivery")
+            # Pick the targets whose filters match; the others get no work at all
+            with metrics.ingest_stage("route"):
+                target_ids = routing.route(db, tenant, data)
+
+            # Stage one delivery per target so it commits atomically with the event
+            with metrics.ingest_stage("enqueue"):
+                db.flush()
+                crud.fan_out(db, event.id, target_ids, tenant_id=tenant.id)
+            with metrics.ingest_stage("db_commit"):
+                db.commit()
+            try:
+                await rollups.count_ingest(
+                    request.app.state.redis, tenant.id, datetime.now(UTC)
+                )
+            except Exception as exc:
+                # The event is stored; only the stats miss it.
+                logger.warning("Could not count ingested event: %s", exc)
+            span = trace.get_current_span()
+            span.set_attribute("webhook.tenant_id", tenant.id)
+            span.set_attribute("webhook.event_id", event.id)
             logger.info(
-                f"Event data: tenant_id={event.tenant_id}, sha256={event.sha256}"
+                "Stored event",
+                extra={"tenant_id": tenant.id, "event_id": event.id},
             )
-            try:
-                result = forward_event.delay(str(event.id), 1)
-                logger.info(f"Task queued with ID {result.id}")
-                logger.info(f"Task result type: {type(result)}")
-                logger.info(f"Task result details: {result.__dict__}")
-            except Exception as e:
-                logger.error(f"Failed to queue task: {e}", exc_info=True)
+            hub = getattr(request.app.state, "live", None)
+            if hub is not None:
+                await hub.publish(
+                    tenant.id,
+                    {
+                        "type": "event",
+                        "event_id": event.id,
+                        "event_type": payload.event,
+                        "created_at": event.created_at,
+                        "targets": target_ids,
+                        "payload": data,
+                    },
+                )
 
             # Upload payload to S3
             settings = get_settings()
             s3_key = f"{tenant.id}/{sha256}.json"
 
             try:
-                s3_client.put_object(
-                    Bucket=settings.events_bucket,
-                    Key=s3_key,
-                    Body=raw,
-                    ContentType="application/json",
-                )
+                # Off the event loop, so a slow upload does not stall every
+                # request and concurrent uploads show up in S3_UPLOADS.
+                with metrics.ingest_stage("s3_put"), admission.S3_UPLOADS.tracking():
+                    await asyncio.to_thread(
+                        s3_client.put_object,
+                        Bucket=settings.events_bucket,
+                        Key=s3_key,
+                        **compression.s3_object_args(raw, compressed),
+                    )
             except Exception as e:
-                logger.error(f"Failed to upload payload to S3: {e}")
+                logger.error(
+                    "Failed to upload payload to S3: %s",
+                    e,
+                    extra={"tenant_id": tenant.id, "event_id": event.id},
+                )
                 # Continue despite S3 error
 
         return {"status": "received"}
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    finally:
+        if db is not directory:
+            db.close()
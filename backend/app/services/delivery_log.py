@@ -0,0 +1,194 @@
+"""Group-commit of delivery attempt records.
+
+``forward_event`` doesn't write its ``deliveries`` row itself. It appends the
+outcome to the ``deliveries:outcomes`` Redis Stream and returns, and the task
+message is acknowledged only then (``acks_late``), so an outcome is always
+either in the stream or still in the broker. A flusher thread in every
+worker's main process drains the stream as a consumer group and writes a
+batch with one multi-row INSERT, folds it into the rollups and commits. A
+batch closes at ``delivery_log_batch_size`` outcomes or after
+``delivery_log_flush_interval`` seconds. Entries are acknowledged only after
+the commit, so a crash or DB outage leaves them pending for the next flush.
+
+If the stream can't be written, the task falls back to writing its row
+directly.
+
+Either way, an attempt that failed without scheduling a retry was the last
+one, and ``write`` files it in ``dead_letters`` in the same transaction.
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+
+from app.core.config import get_settings
+from app.db import models, shards
+from app.services import rollups
+from app.services.streams import StreamConsumer
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+STREAM = "deliveries:outcomes"
+GROUP = "writers"
+
+
+@lru_cache
+def _redis():
+    import redis
+
+    return redis.Redis.from_url(
+        get_settings().redis_url, socket_timeout=2, socket_connect_timeout=1
+    )
+
+
+def _encode(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def record(tenant_id: int, row: dict) -> None:
+    """Append one attempt's ``deliveries`` row; raises if Redis is unreachable."""
+    _redis().xadd(
+        STREAM, {"tenant_id": tenant_id, "row": json.dumps(row, default=_encode)}
+    )
+
+
+def _dead_letter(tenant_id: int, row: dict) -> dict:
+    """The ``dead_letters`` row for an exhausted delivery's last attempt."""
+    return {
+        "tenant_id": tenant_id,
+        "event_id": row["event_id"],
+        "target_id": row["target_id"],
+        "attempts": row["attempts"],
+        "status": row["status"],
+        "reason": row.get("error") or f"http_{row['status']}",
+        "response": row["response"],
+        "created_at": row["created_at"],
+    }
+
+
+def write(db: Session, outcomes: list[tuple[int, dict]]) -> None:
+    """Insert ``(tenant_id, row)`` outcomes and fold them into the rollups."""
+    rows = []
+    dead = []
+    per_tenant: dict[int, list] = {}
+    for tenant_id, row in outcomes:
+        for field in ("created_at", "next_run"):
+            if isinstance(row.get(field), str):
+                row[field] = datetime.fromisoformat(row[field])
+        rows.append(row)
+        success = 200 <= row["status"] < 300
+        if not success and row["next_run"] is None:
+            dead.append(_dead_letter(tenant_id, row))
+        per_tenant.setdefault(tenant_id, []).append(
+            (row["target_id"], row["created_at"], success, row["latency_ms"])
+        )
+    db.execute(insert(models.Delivery), rows)
+    if dead:
+        db.execute(insert(models.DeadLetter), dead)
+    for tenant_id, results in sorted(per_tenant.items()):
+        rollups.record_deliveries(db, tenant_id, results)
+
+
+class Flusher(StreamConsumer):
+    def __init__(self, redis_client=None):
+        settings = get_settings()
+        super().__init__(
+            redis_client or _redis(), STREAM, GROUP, settings.delivery_log_batch_size
+        )
+        self.interval = settings.delivery_log_flush_interval
+
+    def _collect(self) -> list[tuple]:
+        """One batch: full, or whatever arrived within the flush interval."""
+        messages = self.read(int(self.interval * 1000))
+        if self._backlog:
+            # Re-reading our pending entries; topping up would repeat them.
+            return messages
+        deadline = time.monotonic() + self.interval
+        while messages and len(messages) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            more = self.read(
+                max(1, int(remaining * 1000)), self.batch_size - len(messages)
+            )
+            if not more:
+                break
+            messages += more
+        return messages
+
+    def step(self) -> int:
+        messages = self._collect()
+        if not messages:
+            return 0
+        tenants = [int(fields[b"tenant_id"]) for _, fields in messages]
+        placement = shards.group(tenants)
+        try:
+            for shard, tenant_ids in placement.items():
+                batch = [
+                    (message, tenant_id)
+                    for message, tenant_id in zip(messages, tenants)
+                    if tenant_id in tenant_ids
+                ]
+                with shards.sessionmaker_for(shard)() as db:
+                    write(
+                        db,
+                        [
+                            (tenant_id, json.loads(fields[b"row"]))
+                            for (_, fields), tenant_id in batch
+                        ],
+                    )
+                    db.commit()
+                self.ack([entry_id for (entry_id, _), _ in batch])
+        except Exception:
+            self.retry_pending()
+            raise
+        placed = {
+            tenant_id for tenant_ids in placement.values() for tenant_id in tenant_ids
+        }
+        moving = [
+            message
+            for message, tenant_id in zip(messages, tenants)
+            if tenant_id not in placed
+        ]
+        if moving:
+            # Written once the tenant has landed on its new shard.
+            self.requeue(moving)
+            if len(moving) == len(messages):
+                time.sleep(self.interval)
+        return len(messages)
+
+    def run_forever(self) -> None:
+        last_claim = 0.0
+        delay = 1.0
+        while True:
+            try:
+                if time.monotonic() - last_claim > 30:
+                    self.claim_abandoned()
+                    last_claim = time.monotonic()
+                self.step()
+                delay = 1.0
+            except Exception:
+                logger.exception("Delivery flush failed, retrying in %.0fs", delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+
+def start_flusher() -> threading.Thread:
+    """Run a flusher in a daemon thread of the current process."""
+    thread = threading.Thread(
+        target=lambda: Flusher().run_forever(), name="delivery-flusher", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    from app.core.logging import configure_logging
+
+    configure_logging()
+    Flusher().run_forever()
@@ -0,0 +1,129 @@
+"""Live tail of a tenant's events and delivery results over Redis pub/sub.
+
+Ingest and the delivery task publish each update once to ``events:{tenant}``.
+Every API process keeps a single pub/sub connection, subscribed only to the
+tenants that have an open tail on that process, and copies each message into
+a bounded queue per connection. A consumer that falls behind loses messages
+rather than buffering without limit, and an open tail never touches the DB.
+"""
+
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from app.core import metrics
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "events:"
+
+
+def channel(tenant_id: int) -> str:
+    return f"{CHANNEL_PREFIX}{tenant_id}"
+
+
+def encode(message: dict) -> str:
+    return json.dumps(message, separators=(",", ":"), default=str)
+
+
+@lru_cache
+def _sync_redis():
+    import redis
+
+    return redis.Redis.from_url(
+        get_settings().redis_url, socket_timeout=1, socket_connect_timeout=1
+    )
+
+
+def publish_sync(tenant_id: int, message: dict) -> None:
+    """Publish from synchronous code (the Celery workers); never raises."""
+    try:
+        _sync_redis().publish(channel(tenant_id), encode(message))
+    except Exception as exc:
+        logger.warning("Live publish failed: %s", exc, extra={"tenant_id": tenant_id})
+
+
+class LiveHub:
+    """Fan one pub/sub connection out to the tails open in this process."""
+
+    def __init__(self, redis_conn, queue_size: int):
+        self._redis = redis_conn
+        self._queue_size = queue_size
+        self._pubsub = None
+        self._reader: asyncio.Task | None = None
+        self._subscribers: dict[int, set[asyncio.Queue]] = {}
+
+    async def publish(self, tenant_id: int, message: dict) -> None:
+        """Publish from the API; a Redis hiccup must not fail the request."""
+        try:
+            await self._redis.publish(channel(tenant_id), encode(message))
+        except Exception as exc:
+            logger.warning(
+                "Live publish failed: %s", exc, extra={"tenant_id": tenant_id}
+            )
+
+    @asynccontextmanager
+    async def subscribe(self, tenant_id: int):
+        """Yield a queue receiving the tenant's messages as JSON strings."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self._queue_size)
+        queues = self._subscribers.setdefault(tenant_id, set())
+        queues.add(queue)
+        try:
+            if len(queues) == 1:
+                await self._ensure_pubsub().subscribe(channel(tenant_id))
+            if self._reader is None or self._reader.done():
+                self._reader = asyncio.create_task(self._read())
+            yield queue
+        finally:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[tenant_id]
+                if self._pubsub is not None:
+                    try:
+                        await self._pubsub.unsubscribe(channel(tenant_id))
+                    except Exception:
+                        pass
+
+    def _ensure_pubsub(self):
+        if self._pubsub is None:
+            self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        return self._pubsub
+
+    def _dispatch(self, message: dict) -> None:
+        tenant_id = int(message["channel"].removeprefix(CHANNEL_PREFIX))
+        for queue in self._subscribers.get(tenant_id, ()):
+            try:
+                queue.put_nowait(message["data"])
+            except asyncio.QueueFull:
+                metrics.LIVE_DROPPED_TOTAL.inc()
+
+    async def _read(self) -> None:
+        # Runs while any tail is open in this process.
+        while self._subscribers:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is not None and message["type"] == "message":
+                    self._dispatch(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Live tail subscription failed, reconnecting: %s", exc)
+                await self._reconnect()
+
+    async def _reconnect(self) -> None:
+        await asyncio.sleep(1)
+        try:
+            await self._pubsub.aclose()
+        except Exception:
+            pass
+        self._pubsub = None
+        if self._subscribers:
+            try:
+                await self._ensure_pubsub().subscribe(
+                    *(channel(tenant_id) for tenant_id in self._subscribers)
+                )
+            except Exception as exc:
+                logger.warning("Live tail resubscribe failed: %s", exc)
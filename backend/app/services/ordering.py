@@ -0,0 +1,90 @@
+"""Ordered delivery lanes.
+
+Deliveries to a target race each other: parallel workers and retries with an
+ETA can deliver ``invoice.paid`` before ``invoice.created``. A target with
+``ordered`` set gets sequential lanes instead: one for the whole tenant, or
+one per value of the payload path in ``order_key`` (``data.object.customer``
+gives every customer their own lane). Within a lane, events are delivered one
+at a time, in the order they were enqueued. Different lanes run in parallel.
+
+Each lane is a set of ``ordered_deliveries`` rows, written in the same
+transaction as the event, and every row gets a ``drain_lane`` task. A task
+takes the lane's Redis lock, or returns if another worker holds it, because
+the holder will deliver its row anyway. The holder delivers the lane's
+rows oldest first until none is left. It then releases the lock and looks
+again, so a row that arrived just before the release is not stranded.
+
+When a delivery fails, the lane stops behind it: the row stays at the head,
+the lane is *held* for the backoff, and a ``drain_lane`` task is scheduled
+to resume it. A row that runs out of attempts is dead-lettered and
+removed, and the lane moves on.
+"""
+
+import logging
+from contextlib import contextmanager
+from functools import lru_cache
+
+from app.core.config import get_settings
+from app.db import models
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+LOCK_MARGIN = 10.0  # seconds the lock outlives the slowest delivery
+
+
+@lru_cache
+def _redis():
+    import redis
+
+    return redis.Redis.from_url(get_settings().redis_url)
+
+
+def _key(target_id: int, lane: str) -> str:
+    return f"ordered:{target_id}:{lane}"
+
+
+@contextmanager
+def locked(target_id: int, lane: str):
+    """Hold the lane's lock for the block, or yield None if another worker has it.
+
+    Only the holder delivers; it calls ``reacquire`` on the lock before each
+    delivery to keep it.
+    """
+    from redis.exceptions import LockError
+
+    timeout = get_settings().delivery_timeout_max + LOCK_MARGIN
+    lock = _redis().lock(f"{_key(target_id, lane)}:lock", timeout=timeout)
+    if not lock.acquire(blocking=False):
+        yield None
+        return
+    try:
+        yield lock
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning("Lost the lock of lane %s:%s", target_id, lane)
+
+
+def hold(target_id: int, lane: str, seconds: float) -> None:
+    """Keep new arrivals from draining the lane while its head backs off."""
+    _redis().set(f"{_key(target_id, lane)}:hold", 1, px=max(1, int(seconds * 1000)))
+
+
+def held(target_id: int, lane: str) -> bool:
+    return bool(_redis().exists(f"{_key(target_id, lane)}:hold"))
+
+
+def release_hold(target_id: int, lane: str) -> None:
+    _redis().delete(f"{_key(target_id, lane)}:hold")
+
+
+def head(db: Session, target_id: int, lane: str) -> models.OrderedDelivery | None:
+    """The lane's oldest delivery."""
+    return (
+        db.query(models.OrderedDelivery)
+        .filter_by(target_id=target_id, lane=lane)
+        .order_by(models.OrderedDelivery.id)
+        .first()
+    )
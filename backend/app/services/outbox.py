@@ -0,0 +1,169 @@
+"""Relay pending outbox rows to the Celery broker.
+
+Request handlers stage tasks with ``crud.enqueue_task`` in the same
+transaction as the rows they refer to, so a broker outage can delay a
+delivery but never lose it. This relay claims pending rows in id order,
+publishes each batch with a single pipelined round-trip and marks the rows
+sent. A crash between publishing and committing republishes that batch; the
+task id is derived from the outbox id, so duplicates are easy to spot. The
+relay also writes the ingest counts waiting in Redis into the rollups.
+
+Run it next to the workers:
+
+    poetry run python -m app.services.outbox
+"""
+
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import UTC, datetime, timedelta
+
+from app.celery_app import celery
+from app.core import lanes, metrics
+from app.core.config import get_settings
+from app.db import models, shards
+from app.services import rollups
+from opentelemetry import context, propagate
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+FORWARD_TASK = "app.tasks.forward_event"
+
+
+@contextmanager
+def pipelined(producer):
+    """Buffer the producer's Redis commands in one pipeline sent on exit.
+
+    Kombu's Redis channel issues one LPUSH per message through
+    ``conn_or_acquire``; pointing that at a pipeline turns a batch into a
+    single round-trip. Other transports publish message by message.
+    """
+    channel = producer.channel
+    if producer.connection.transport.driver_type != "redis":
+        yield
+        return
+    pipe = channel.client.pipeline(transaction=False)
+    channel.conn_or_acquire = lambda client=None: nullcontext(pipe)
+    try:
+        yield
+        pipe.execute()
+    finally:
+        del channel.conn_or_acquire
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes; everything is stored in UTC.
+    return value if value.tzinfo is not None else value.replace(tzinfo=UTC)
+
+
+def _publish(producer, row: models.OutboxMessage) -> None:
+    token = context.attach(propagate.extract(row.trace_context or {}))
+    try:
+        options = {"queue": row.queue} if row.queue else {}
+        if row.eta is not None:
+            options["eta"] = _aware(row.eta)
+        celery.send_task(
+            row.task,
+            args=row.args,
+            task_id=f"outbox-{row.id}",
+            producer=producer,
+            **options,
+        )
+    finally:
+        context.detach(token)
+
+
+def _delivery_counts(rows: list[models.OutboxMessage]) -> dict[int, int]:
+    """Deliveries per tenant in a batch, for the backlog counters."""
+    counts: dict[int, int] = {}
+    for row in rows:
+        if row.task == FORWARD_TASK and len(row.args) > 3 and row.args[3]:
+            counts[row.args[3]] = counts.get(row.args[3], 0) + 1
+    return counts
+
+
+def relay_batch(db: Session, batch_size: int) -> int:
+    """Publish up to ``batch_size`` pending rows; return how many were sent."""
+    rows = (
+        db.query(models.OutboxMessage)
+        .filter(models.OutboxMessage.sent_at.is_(None))
+        .order_by(models.OutboxMessage.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not rows:
+        db.rollback()
+        return 0
+
+    start = time.perf_counter()
+    with celery.producer_or_acquire() as producer, pipelined(producer):
+        for row in rows:
+            _publish(producer, row)
+    metrics.OUTBOX_PUBLISH_SECONDS.observe(time.perf_counter() - start)
+    lanes.record_published(_delivery_counts(rows))
+
+    now = datetime.now(UTC)
+    for row in rows:
+        row.sent_at = now
+        if row.created_at is not None:
+            lag = now - _aware(row.created_at)
+            metrics.OUTBOX_LAG_SECONDS.observe(lag.total_seconds())
+    db.commit()
+    metrics.OUTBOX_PUBLISHED_TOTAL.inc(len(rows))
+    return len(rows)
+
+
+def purge_sent(db: Session, older_than: timedelta) -> int:
+    """Delete rows that were published more than ``older_than`` ago."""
+    cutoff = datetime.now(UTC) - older_than
+    deleted = (
+        db.query(models.OutboxMessage)
+        .filter(models.OutboxMessage.sent_at < cutoff)
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
+
+
+def run() -> None:
+    settings = get_settings()
+    retention = timedelta(seconds=settings.outbox_retention_seconds)
+    last_purge = 0.0
+    last_rollup = 0.0
+    logger.info("Outbox relay started (batch size %d)", settings.outbox_batch_size)
+    while True:
+        # Every tenant shard has its own outbox; a full batch from any of them
+        # means there is probably more waiting.
+        busy = False
+        purge = time.monotonic() - last_purge > 60
+        for shard in shards.names():
+            try:
+                with shards.sessionmaker_for(shard)() as db:
+                    sent = relay_batch(db, settings.outbox_batch_size)
+                    if purge:
+                        purge_sent(db, retention)
+            except Exception:
+                logger.exception("Outbox relay iteration failed on shard %s", shard)
+                sent = 0
+                time.sleep(1)
+            busy = busy or sent >= settings.outbox_batch_size
+        if purge:
+            last_purge = time.monotonic()
+        if time.monotonic() - last_rollup > settings.ingest_rollup_flush_interval:
+            # Ingest counts wait in Redis (see app.services.rollups).
+            try:
+                rollups.flush_ingest()
+            except Exception:
+                logger.exception("Ingest rollup flush failed")
+            last_rollup = time.monotonic()
+        if not busy:
+            time.sleep(settings.outbox_poll_interval)
+
+
+if __name__ == "__main__":
+    from app.core.logging import configure_logging
+
+    configure_logging()
+    run()
@@ -0,0 +1,248 @@
+"""Paced replay jobs.
+
+A job is advanced by the ``schedule_replay`` task, one tick at a time. Each
+tick reads the next page of events by keyset, enqueues the deliveries that
+are due within ``replay_window_seconds`` (with an ETA) and stages the next
+tick in the outbox, in the same transaction as the cursor update. Only about
+one window of deliveries per job is ever in the broker, so a replay of
+millions of events uses constant broker memory.
+
+Pacing modes:
+
+- ``rate``: at most ``rate`` deliveries per second to each target. Send slots
+  come from a token bucket in Redis shared by every job, so two replays to
+  the same endpoint share its cap.
+- ``timing``: the original inter-arrival times from ``Event.created_at``,
+  divided by ``speed``.
+- ``max``: as fast as the workers go, but only while the tenant's shards of
+  the replay lane hold fewer than ``replay_max_queue_depth`` tasks.
+
+A job with ``source="dead_letters"`` redrives exhausted deliveries instead:
+it walks the tenant's ``dead_letters`` rows that haven't been redriven, in
+the same ticks and with the same pacing, sends each one to the target it
+failed on, and stamps it with ``redriven_at`` in the tick's transaction. A
+redriven delivery gets a fresh set of attempts, and a new dead letter if it
+runs out again.
+"""
+
+import logging
+from datetime import UTC, datetime, timedelta
+from functools import lru_cache
+
+from app.core import lanes
+from app.core.config import get_settings
+from app.db import crud, models, shards
+from app.services import routing
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_QUEUE = lanes.REPLAY
+FINISHED = frozenset({"done", "cancelled"})
+
+# Reserve ARGV[1] send slots spaced ARGV[2] seconds apart on the bucket in
+# KEYS[1]. The key holds the time the next slot frees up (Redis clock); the
+# reply is the delay until the first reserved slot.
+RESERVE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local n = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local start = math.max(tonumber(redis.call('GET', KEYS[1]) or '0'), now)
+local free_at = start + n * interval
+redis.call('SET', KEYS[1], tostring(free_at), 'PX', math.ceil((free_at - now) * 1000) + 60000)
+return tostring(start - now)
+"""
+
+
+@lru_cache
+def _redis():
+    import redis
+
+    return redis.Redis.from_url(get_settings().redis_url)
+
+
+@lru_cache
+def _reserve_script():
+    return _redis().register_script(RESERVE_SCRIPT)
+
+
+def reserve(target_id: int, slots: int, rate: float) -> float:
+    """Take ``slots`` send slots for a target; return seconds until the first."""
+    return float(
+        _reserve_script()(keys=[f"replay:bucket:{target_id}"], args=[slots, 1.0 / rate])
+    )
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=UTC)
+
+
+def start(db: Session, tenant_id: int, **options) -> models.ReplayJob:
+    """Create a job and stage its first tick; both land when the caller commits."""
+    job = models.ReplayJob(
+        tenant_id=tenant_id, status="pending", cursor=0, tick=0, scheduled=0, **options
+    )
+    db.add(job)
+    db.flush()
+    crud.enqueue_task(db, "app.tasks.schedule_replay", [job.id, 0, job.tenant_id])
+    return job
+
+
+def _deliveries(db: Session, job: models.ReplayJob, tenant, item) -> list[tuple]:
+    """``(event_id, target_id)`` pairs for one event or dead letter."""
+    if job.source == "dead_letters":
+        return [(item.event_id, item.target_id)]
+    if job.target_id is not None:
+        return [(item.id, job.target_id)]
+    return [
+        (item.id, target_id) for target_id in routing.route(db, tenant, item.payload)
+    ]
+
+
+def _next_items(db: Session, job: models.ReplayJob, limit: int):
+    """The next page of events, or of dead letters still to redrive."""
+    model = models.DeadLetter if job.source == "dead_letters" else models.Event
+    query = db.query(model).filter(
+        model.tenant_id == job.tenant_id, model.id > job.cursor
+    )
+    if model is models.DeadLetter:
+        query = query.filter(model.redriven_at.is_(None))
+        if job.target_id is not None:
+            query = query.filter(model.target_id == job.target_id)
+    if job.since is not None:
+        query = query.filter(model.created_at >= job.since)
+    if job.until is not None:
+        query = query.filter(model.created_at < job.until)
+    return query.order_by(model.id).limit(limit).all()
+
+
+def _plan_rate(db, job, tenant, events, now, window):
+    per_target: dict[int, list[int]] = {}
+    for event in events:
+        for event_id, target_id in _deliveries(db, job, tenant, event):
+            per_target.setdefault(target_id, []).append(event_id)
+
+    deliveries = []
+    tail = 0.0
+    interval = 1.0 / job.rate
+    for target_id, event_ids in per_target.items():
+        delay = reserve(target_id, len(event_ids), job.rate)
+        for i, event_id in enumerate(event_ids):
+            offset = delay + i * interval
+            eta = now + timedelta(seconds=offset) if offset > 0 else None
+            deliveries.append((event_id, target_id, eta))
+        tail = max(tail, delay + len(event_ids) * interval)
+
+    # Come back when the reserved slots are about to run out.
+    next_at = now + timedelta(seconds=tail - window) if tail > window else None
+    return deliveries, events[-1].id, next_at
+
+
+def _plan_timing(db, job, tenant, events, now, window):
+    if job.anchor_at is None:
+        job.anchor_at = events[0].created_at
+    anchor = _aware(job.anchor_at)
+    started = _aware(job.started_at)
+    horizon = now + timedelta(seconds=window)
+
+    deliveries = []
+    last_id = None
+    for event in events:
+        due = started + (_aware(event.created_at) - anchor) / job.speed
+        if due > horizon:
+            return deliveries, last_id, due - timedelta(seconds=window)
+        eta = due if due > now else None
+        for event_id, target_id in _deliveries(db, job, tenant, event):
+            deliveries.append((event_id, target_id, eta))
+        last_id = event.id
+    return deliveries, last_id, None
+
+
+def _plan_max(db, job, tenant, events, now, window):
+    settings = get_settings()
+    pipe = _redis().pipeline(transaction=False)
+    for shard in lanes.tenant_shards(job.tenant_id):
+        pipe.llen(f"{DELIVERY_QUEUE}.{shard}")
+    room = settings.replay_max_queue_depth - sum(pipe.execute())
+    if room <= 0:
+        return [], None, now + timedelta(seconds=1)
+
+    deliveries = []
+    last_id = None
+    for event in events:
+        if len(deliveries) >= room:
+            break
+        for event_id, target_id in _deliveries(db, job, tenant, event):
+            deliveries.append((event_id, target_id, None))
+        last_id = event.id
+    return deliveries, last_id, None
+
+
+PLANNERS = {"rate": _plan_rate, "timing": _plan_timing, "max": _plan_max}
+
+
+def tick(job_id: int, tick: int, tenant_id: int | None = None) -> None:
+    """Schedule the next window of a job and stage the following tick."""
+    settings = get_settings()
+    window = settings.replay_window_seconds
+    with shards.session_for(tenant_id) as db:
+        job = db.query(models.ReplayJob).filter_by(id=job_id).with_for_update().first()
+        # A redelivered or superseded tick must not fork the schedule.
+        if job is None or job.tick != tick or job.status in FINISHED:
+            db.rollback()
+            return
+
+        now = datetime.now(UTC)
+        if job.status == "pending":
+            job.status = "running"
+            job.started_at = now
+
+        limit = settings.replay_batch_size
+        if job.mode == "rate":
+            limit = min(limit, max(1, int(job.rate * window)))
+        events = _next_items(db, job, limit)
+        if not events:
+            job.status = "done"
+            job.finished_at = now
+            db.commit()
+            logger.info(
+                "Replay finished",
+                extra={
+                    "tenant_id": job.tenant_id,
+                    "replay_id": job.id,
+                    "scheduled": job.scheduled,
+                },
+            )
+            return
+
+        tenant = db.get(models.Tenant, job.tenant_id)
+        deliveries, last_id, next_at = PLANNERS[job.mode](
+            db, job, tenant, events, now, window
+        )
+        crud.enqueue_deliveries(
+            db,
+            deliveries,
+            lane=DELIVERY_QUEUE,
+            tenant_id=job.tenant_id,
+        )
+        if last_id is not None:
+            if job.source == "dead_letters":
+                db.query(models.DeadLetter).filter(
+                    models.DeadLetter.id.in_(
+                        [event.id for event in events if event.id <= last_id]
+                    )
+                ).update(
+                    {"redriven_at": now, "redrive_job_id": job.id},
+                    synchronize_session=False,
+                )
+            job.cursor = last_id
+        job.scheduled += len(deliveries)
+        job.tick += 1
+        crud.enqueue_task(
+            db,
+            "app.tasks.schedule_replay",
+            [job.id, job.tick, job.tenant_id],
+            eta=next_at,
+        )
+        db.commit()
@@ -0,0 +1,255 @@
+"""Per-minute and per-hour rollups of ingest and delivery activity.
+
+Rows are kept at two resolutions. A summary for any window reads hour rows
+for the whole hours inside it and minute rows for the edges, so a 30-day
+query merges about 840 rows per target instead of scanning ``deliveries``.
+
+Delivery rollups are updated in the same transaction as the attempts they
+count, which the flushers already write in batches. Ingest is counted
+outside the request transaction, because every webhook of a tenant would
+otherwise queue on the same two row locks until its commit: ingest adds
+to a Redis hash (``count_ingest``), and the outbox relay moves the counts
+into the rows every ``ingest_rollup_flush_interval`` seconds
+(``flush_ingest``). Counts taken from Redis by a relay that dies before
+its commit are lost.
+"""
+
+import logging
+from datetime import UTC, datetime, timedelta
+from functools import lru_cache
+
+from app.core.config import get_settings
+from app.db import models, shards
+from app.services.sketch import Sketch
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+MINUTE = 60
+HOUR = 3600
+RESOLUTIONS = (MINUTE, HOUR)
+PENDING_INGEST = "rollups:ingest"  # "tenant_id:minute" -> events not yet written
+
+# Empty the hash in one step, so no increment lands between the read and the delete.
+_TAKE = "local v = redis.call('HGETALL', KEYS[1]) redis.call('DEL', KEYS[1]) return v"
+
+
+@lru_cache
+def _redis():
+    import redis
+
+    return redis.Redis.from_url(get_settings().redis_url)
+
+
+def _utc(at: datetime) -> datetime:
+    return at.astimezone(UTC) if at.tzinfo else at.replace(tzinfo=UTC)
+
+
+def _floor(at: datetime, resolution: int) -> datetime:
+    epoch = int(_utc(at).timestamp())
+    return datetime.fromtimestamp(epoch - epoch % resolution, UTC)
+
+
+def _ceil(at: datetime, resolution: int) -> datetime:
+    floor = _floor(at, resolution)
+    return floor if floor == _utc(at) else floor + timedelta(seconds=resolution)
+
+
+def _insert_missing(db: Session, table, rows: list[dict]) -> None:
+    """INSERT ... ON CONFLICT DO NOTHING on PostgreSQL and SQLite alike."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    db.execute(insert(table).on_conflict_do_nothing(), rows)
+
+
+def record_ingest(db: Session, tenant_id: int, at: datetime, count: int = 1) -> None:
+    table = models.IngestRollup
+    buckets = [(resolution, _floor(at, resolution)) for resolution in RESOLUTIONS]
+    _insert_missing(
+        db,
+        table,
+        [
+            {"tenant_id": tenant_id, "resolution": r, "bucket": b, "events": 0}
+            for r, b in buckets
+        ],
+    )
+    for resolution, bucket in buckets:
+        db.query(table).filter_by(
+            tenant_id=tenant_id, resolution=resolution, bucket=bucket
+        ).update({table.events: table.events + count}, synchronize_session=False)
+
+
+def count_ingest(redis_client, tenant_id: int, at: datetime, count: int = 1):
+    """Count ingested events for ``flush_ingest``; await it on an asyncio client."""
+    minute = int(_floor(at, MINUTE).timestamp())
+    return redis_client.hincrby(PENDING_INGEST, f"{tenant_id}:{minute}", count)
+
+
+def flush_ingest(redis_client=None) -> int:
+    """Fold the counted ingests into the rollups; returns how many were written.
+
+    One transaction per shard. Counts for tenants being moved, or for a
+    shard whose commit failed, go back to Redis for the next flush.
+    """
+    redis_client = redis_client or _redis()
+    flat = redis_client.eval(_TAKE, 1, PENDING_INGEST)
+    counts: dict[tuple[int, int], int] = {}
+    for field, value in zip(flat[::2], flat[1::2]):
+        tenant_id, minute = (int(part) for part in field.decode().split(":"))
+        counts[(tenant_id, minute)] = int(value)
+    written: set[int] = set()
+    try:
+        placement = shards.group({tenant_id for tenant_id, _ in counts})
+        for shard, tenant_ids in placement.items():
+            try:
+                with shards.sessionmaker_for(shard)() as db:
+                    for (tenant_id, minute), count in sorted(counts.items()):
+                        if tenant_id in tenant_ids:
+                            at = datetime.fromtimestamp(minute, UTC)
+                            record_ingest(db, tenant_id, at, count)
+                    db.commit()
+                written.update(tenant_ids)
+            except Exception:
+                logger.exception("Ingest rollup flush failed on shard %s", shard)
+    finally:
+        unwritten = {key: n for key, n in counts.items() if key[0] not in written}
+        if unwritten:
+            pipe = redis_client.pipeline(transaction=False)
+            for (tenant_id, minute), count in unwritten.items():
+                pipe.hincrby(PENDING_INGEST, f"{tenant_id}:{minute}", count)
+            pipe.execute()
+    return sum(n for key, n in counts.items() if key[0] in written)
+
+
+def record_deliveries(db: Session, tenant_id: int, results: list[tuple]) -> None:
+    """Fold ``(target_id, at, success, latency_ms)`` results into the rollups."""
+    table = models.DeliveryRollup
+    grouped: dict[tuple, list] = {}
+    for target_id, at, success, latency_ms in results:
+        for resolution in RESOLUTIONS:
+            key = (target_id, resolution, _floor(at, resolution))
+            grouped.setdefault(key, []).append((success, latency_ms))
+
+    _insert_missing(
+        db,
+        table,
+        [
+            {
+                "tenant_id": tenant_id,
+                "target_id": target_id,
+                "resolution": resolution,
+                "bucket": bucket,
+                "attempts": 0,
+                "successes": 0,
+            }
+            for target_id, resolution, bucket in grouped
+        ],
+    )
+    # Sketches merge in Python, so the rows are locked for the read-modify-write.
+    for (target_id, resolution, bucket), outcomes in sorted(grouped.items()):
+        row = (
+            db.query(table)
+            .filter_by(
+                tenant_id=tenant_id,
+                target_id=target_id,
+                resolution=resolution,
+                bucket=bucket,
+            )
+            .with_for_update()
+            .one()
+        )
+        sketch = Sketch.from_dict(row.latency)
+        for success, latency_ms in outcomes:
+            if latency_ms is not None:
+                sketch.add(latency_ms)
+        row.attempts += len(outcomes)
+        row.successes += sum(1 for success, _ in outcomes if success)
+        row.latency = sketch.to_dict()
+
+
+def _window_filter(table, since: datetime, until: datetime):
+    """Hour rows for the whole hours in the window, minute rows for the edges."""
+    first_hour, last_hour = _ceil(since, HOUR), _floor(until, HOUR)
+    since, until = _floor(since, MINUTE), _ceil(until, MINUTE)
+    if first_hour >= last_hour:
+        return and_(
+            table.resolution == MINUTE, table.bucket >= since, table.bucket < until
+        )
+    return or_(
+        and_(
+            table.resolution == HOUR,
+            table.bucket >= first_hour,
+            table.bucket < last_hour,
+        ),
+        and_(
+            table.resolution == MINUTE, table.bucket >= since, table.bucket < first_hour
+        ),
+        and_(
+            table.resolution == MINUTE, table.bucket >= last_hour, table.bucket < until
+        ),
+    )
+
+
+def _stats(attempts: int, successes: int, sketch: Sketch) -> dict:
+    return {
+        "attempts": attempts,
+        "successes": successes,
+        "success_rate": successes / attempts if attempts else None,
+        "latency_ms": {
+            "p50": sketch.quantile(0.5),
+            "p90": sketch.quantile(0.9),
+            "p99": sketch.quantile(0.99),
+            "max": sketch.max if sketch.count else None,
+        },
+    }
+
+
+def summary(
+    db: Session,
+    tenant_id: int,
+    since: datetime,
+    until: datetime,
+    target_id: int | None = None,
+) -> dict:
+    events = (
+        db.query(func.coalesce(func.sum(models.IngestRollup.events), 0))
+        .filter(
+            models.IngestRollup.tenant_id == tenant_id,
+            _window_filter(models.IngestRollup, since, until),
+        )
+        .scalar()
+    )
+
+    table = models.DeliveryRollup
+    query = db.query(
+        table.target_id, table.attempts, table.successes, table.latency
+    ).filter(table.tenant_id == tenant_id, _window_filter(table, since, until))
+    if target_id is not None:
+        query = query.filter(table.target_id == target_id)
+
+    per_target: dict[int, list] = {}
+    for row_target, attempts, successes, latency in query:
+        totals = per_target.setdefault(row_target, [0, 0, Sketch()])
+        totals[0] += attempts
+        totals[1] += successes
+        totals[2].merge(Sketch.from_dict(latency))
+
+    overall = [0, 0, Sketch()]
+    for attempts, successes, sketch in per_target.values():
+        overall[0] += attempts
+        overall[1] += successes
+        overall[2].merge(sketch)
+
+    return {
+        "since": since,
+        "until": until,
+        "events": events,
+        "deliveries": _stats(*overall),
+        "targets": [
+            {"target_id": tid, **_stats(*totals)}
+            for tid, totals in sorted(per_target.items())
+        ],
+    }
@@ -0,0 +1,179 @@
+"""Per-target routing filters, compiled once and evaluated before enqueue.
+
+A target's ``filters`` look like::
+
+    {
+        "event_types": ["invoice.*", "customer.created"],
+        "fields": [{"path": "data.object.currency", "op": "eq", "value": "usd"}],
+    }
+
+An event is routed to a target when its type matches any glob (or no globs
+are set) and every field predicate holds. Targets without filters get every
+event.
+
+Compiled routes, and which targets are ordered, are cached per tenant and
+keyed by ``Tenant.routing_version``, which ``crud`` bumps whenever the
+tenant's targets change. The tenant row is loaded on every ingest anyway, so
+each process notices a change on its next request without any cross-process
+invalidation.
+"""
+
+import fnmatch
+import re
+import threading
+from typing import Any, Callable
+
+from app.db import models
+from sqlalchemy.orm import Session
+
+Matcher = Callable[[dict], bool]
+
+_MISSING = object()
+
+OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "eq": lambda actual, expected: actual == expected,
+    "ne": lambda actual, expected: actual != expected,
+    "in": lambda actual, expected: actual in expected,
+    "gt": lambda actual, expected: actual > expected,
+    "gte": lambda actual, expected: actual >= expected,
+    "lt": lambda actual, expected: actual < expected,
+    "lte": lambda actual, expected: actual <= expected,
+}
+
+
+class FilterError(ValueError):
+    """Raised when a target's filters cannot be compiled."""
+
+
+def _lookup(payload: dict, path: tuple[str, ...]) -> Any:
+    value: Any = payload
+    for part in path:
+        if not isinstance(value, dict):
+            return _MISSING
+        value = value.get(part, _MISSING)
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _compile_predicate(spec: dict) -> Matcher:
+    try:
+        path = tuple(spec["path"].split("."))
+        op = spec.get("op", "eq")
+    except (KeyError, AttributeError, TypeError):
+        raise FilterError(f"Invalid field predicate: {spec!r}")
+    expected = spec.get("value")
+
+    if op == "exists":
+        want = True if expected is None else bool(expected)
+        return lambda payload: (_lookup(payload, path) is not _MISSING) == want
+    compare = OPERATORS.get(op)
+    if compare is None:
+        raise FilterError(f"Unknown operator: {op}")
+    if op == "in" and not isinstance(expected, (list, tuple)):
+        raise FilterError("The 'in' operator needs a list value")
+    if op == "in":
+        expected = tuple(expected)
+
+    def predicate(payload: dict) -> bool:
+        actual = _lookup(payload, path)
+        if actual is _MISSING:
+            return False
+        try:
+            return compare(actual, expected)
+        except TypeError:
+            # e.g. comparing a string field against a number
+            return False
+
+    return predicate
+
+
+def compile_filters(filters: dict | None) -> Matcher | None:
+    """Compile filters into a single callable; ``None`` means match everything."""
+    if not filters:
+        return None
+    globs = filters.get("event_types") or []
+    predicates = [_compile_predicate(spec) for spec in filters.get("fields") or []]
+    type_pattern = (
+        re.compile("|".join(fnmatch.translate(glob) for glob in globs))
+        if globs
+        else None
+    )
+    if type_pattern is None and not predicates:
+        return None
+
+    def matcher(payload: dict) -> bool:
+        if type_pattern is not None and not type_pattern.match(
+            str(payload.get("event", ""))
+        ):
+            return False
+        return all(predicate(payload) for predicate in predicates)
+
+    return matcher
+
+
+Routes = list[tuple[int, Matcher | None]]
+Ordering = dict[int, tuple[str, ...]]
+
+_routes: dict[int, tuple[int, Routes, Ordering]] = {}
+_lock = threading.Lock()
+
+
+def _load_routes(db: Session, tenant: models.Tenant) -> tuple[Routes, Ordering]:
+    rows = (
+        db.query(
+            models.Target.id,
+            models.Target.filters,
+            models.Target.ordered,
+            models.Target.order_key,
+        )
+        .filter_by(tenant_id=tenant.id)
+        .order_by(models.Target.id)
+        .all()
+    )
+    routes = [(row.id, compile_filters(row.filters)) for row in rows]
+    ordering = {
+        row.id: tuple(row.order_key.split(".")) if row.order_key else ()
+        for row in rows
+        if row.ordered
+    }
+    return routes, ordering
+
+
+def _cached(db: Session, tenant: models.Tenant) -> tuple[Routes, Ordering]:
+    version = tenant.routing_version or 0
+    cached = _routes.get(tenant.id)
+    if cached is not None and cached[0] == version:
+        return cached[1], cached[2]
+    routes, ordering = _load_routes(db, tenant)
+    with _lock:
+        _routes[tenant.id] = (version, routes, ordering)
+    return routes, ordering
+
+
+def ordering(db: Session, tenant: models.Tenant) -> Ordering:
+    """The tenant's ordered targets, each with the payload path of its lane key."""
+    return _cached(db, tenant)[1]
+
+
+def lane_key(path: tuple[str, ...], payload: dict) -> str:
+    """The ordered lane an event belongs to; ``""`` is the tenant-wide lane."""
+    if not path:
+        return ""
+    value = _lookup(payload, path)
+    return "" if value is _MISSING or value is None else str(value)
+
+
+def route(db: Session, tenant: models.Tenant, payload: dict) -> list[int]:
+    """Return the ids of the tenant's targets that should receive ``payload``."""
+    routes, _ = _cached(db, tenant)
+    return [
+        target_id
+        for target_id, matcher in routes
+        if matcher is None or matcher(payload)
+    ]
+
+
+def clear_cache() -> None:
+    with _lock:
+        _routes.clear()
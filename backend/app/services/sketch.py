@@ -0,0 +1,93 @@
+"""A small mergeable quantile sketch for latencies.
+
+Values land in logarithmic buckets whose width grows with the value (as in
+DDSketch), so every quantile is within ``RELATIVE_ACCURACY`` of the true value
+and merging two sketches is adding their bucket counts. A latency sketch has
+a few dozen buckets and serializes to a small JSON object.
+"""
+
+import math
+
+RELATIVE_ACCURACY = 0.02
+_GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+
+def bucket_index(value: float) -> int:
+    """The bucket a positive value falls in."""
+    return math.ceil(math.log(value) / _LOG_GAMMA)
+
+
+def bucket_value(index: int) -> float:
+    """A bucket's representative value: its midpoint, in the relative sense."""
+    return 2 * _GAMMA**index / (_GAMMA + 1)
+
+
+class Sketch:
+    __slots__ = ("buckets", "count", "total", "min", "max", "zeros")
+
+    def __init__(self):
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.zeros = 0
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value <= 0:
+            self.zeros += count
+            value = 0.0
+        else:
+            index = bucket_index(value)
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "Sketch") -> None:
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.zeros += other.zeros
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float | None:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return min(max(bucket_value(index), self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "n": self.count,
+            "sum": self.total,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "zeros": self.zeros,
+            "b": {str(index): count for index, count in self.buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict | None) -> "Sketch":
+        sketch = cls()
+        if not data:
+            return sketch
+        sketch.buckets = {int(index): count for index, count in data["b"].items()}
+        sketch.count = data["n"]
+        sketch.total = data["sum"]
+        sketch.zeros = data.get("zeros", 0)
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
@@ -0,0 +1,370 @@
+"""Buffered ingest through a Redis Stream (``INGEST_MODE=stream``).
+
+``POST /in/{token}`` verifies the signature, appends the canonical body to
+the ``ingest_stream`` stream, waits for Redis to fsync it to the AOF and
+answers 200. Tenant credentials come from a short-lived in-process cache that
+keeps serving its last known value while the DB is unreachable, so the
+request path does not touch Postgres or S3 at all.
+
+Persisters read the stream as a consumer group and write whole batches:
+dedup in one query, insert events, fan out deliveries through the outbox and
+commit once per tenant shard, then count the events for the rollups. Entries
+are acknowledged only after the commit, so a DB outage just leaves them
+pending until it is over. An entry that cannot be decoded is moved to the
+``<ingest_stream>:dead`` stream instead, with the error, so it does not hold
+up the rest. Run one or more next to the API:
+
+    poetry run python -m app.services.stream_ingest
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import UTC, datetime
+
+from app.core import metrics
+from app.core.config import get_settings
+from app.db import crud, models, shards
+from app.services import live, rollups, routing
+from app.services.streams import StreamConsumer
+from app.storage import compression
+from opentelemetry import propagate
+from sqlalchemy import tuple_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+GROUP = "persisters"
+DEAD_SUFFIX = ":dead"  # unreadable entries go to ``<ingest_stream>:dead``
+
+
+class StreamAppendError(Exception):
+    """The entry could not be confirmed durable; the sender should retry."""
+
+
+# ---------- API side ----------
+@dataclass(frozen=True)
+class TenantAuth:
+    id: int
+    stripe_signing_secret: str | None
+
+
+_tenants: dict[str, tuple[float, TenantAuth | None]] = {}
+_tenants_lock = threading.Lock()
+
+
+def lookup_tenant(db: Session, token: str) -> TenantAuth | None:
+    """Tenant id and signing secret for a token, cached for ``tenant_cache_ttl``.
+
+    A stale entry is served when the DB cannot be reached, so a short outage
+    doesn't turn into rejected webhooks.
+    """
+    now = time.monotonic()
+    cached = _tenants.get(token)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    try:
+        row = (
+            db.query(models.Tenant.id, models.Tenant.stripe_signing_secret)
+            .filter_by(token=token)
+            .first()
+        )
+        db.rollback()
+    except SQLAlchemyError:
+        if cached is None:
+            raise
+        logger.warning("Tenant lookup failed, serving cached credentials")
+        return cached[1]
+    tenant = TenantAuth(*row) if row else None
+    with _tenants_lock:
+        _tenants[token] = (now + get_settings().tenant_cache_ttl, tenant)
+    return tenant
+
+
+async def check_durability(redis_conn) -> None:
+    """Refuse to start stream ingest on a Redis that cannot confirm an fsync.
+
+    ``WAITAOF`` needs Redis 7.2+ with ``appendonly yes``; without it a 200
+    would only mean the entry reached memory.
+    """
+    from redis.exceptions import ResponseError
+
+    try:
+        await redis_conn.execute_command("WAITAOF", 1, 0, 1000)
+    except ResponseError as exc:
+        raise RuntimeError(
+            f"INGEST_MODE=stream needs Redis 7.2+ with appendonly yes: {exc}"
+        ) from exc
+
+
+async def append(redis_conn, tenant_id: int, raw: bytes) -> str:
+    """Append an accepted webhook and wait until Redis has fsynced it.
+
+    Raises ``StreamAppendError`` unless the fsync is confirmed, including
+    when ``WAITAOF`` itself fails, so nothing is acknowledged on weaker
+    durability than promised.
+    """
+    settings = get_settings()
+    carrier: dict[str, str] = {}
+    propagate.inject(carrier)
+    fields = {
+        "tenant_id": tenant_id,
+        "body": raw,
+        "received_at": f"{time.time():.6f}",
+        "trace": json.dumps(carrier),
+    }
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        pipe.xadd(settings.ingest_stream, fields)
+        pipe.execute_command("WAITAOF", 1, 0, int(settings.ingest_fsync_timeout * 1000))
+        entry_id, ack = await pipe.execute(raise_on_error=False)
+    if isinstance(entry_id, Exception):
+        raise StreamAppendError(str(entry_id))
+    if isinstance(ack, Exception):
+        # AOF switched off, or a server without WAITAOF, behind our back.
+        raise StreamAppendError(f"WAITAOF failed: {ack}")
+    if not ack[0]:
+        raise StreamAppendError("Append not fsynced in time")
+    return entry_id
+
+
+# ---------- persister ----------
+@dataclass
+class Entry:
+    id: str
+    tenant_id: int
+    raw: bytes
+    data: dict
+    sha256: str
+    received_at: datetime
+    trace: dict
+
+
+def _decode(entry_id, fields: dict) -> Entry:
+    """Raises ``KeyError`` or ``ValueError`` for a malformed entry."""
+    raw = fields[b"body"]
+    data = json.loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError("body is not a JSON object")
+    return Entry(
+        id=entry_id.decode() if isinstance(entry_id, bytes) else entry_id,
+        tenant_id=int(fields[b"tenant_id"]),
+        raw=raw,
+        data=data,
+        sha256=hashlib.sha256(raw).hexdigest(),
+        received_at=datetime.fromtimestamp(float(fields[b"received_at"]), UTC),
+        trace=json.loads(fields.get(b"trace") or "{}"),
+    )
+
+
+def persist_batch(db: Session, entries: list[Entry]) -> list[tuple]:
+    """Store new events and their deliveries in one transaction.
+
+    Returns ``(entry, event, compressed, target_ids)`` for every stored event;
+    duplicates, inside the batch or already in the DB, are skipped.
+    """
+    keys = {(entry.tenant_id, entry.sha256) for entry in entries}
+    existing = set(
+        db.query(models.Event.tenant_id, models.Event.sha256).filter(
+            tuple_(models.Event.tenant_id, models.Event.sha256).in_(keys)
+        )
+    )
+    tenants = {
+        tenant.id: tenant
+        for tenant in db.query(models.Tenant).filter(
+            models.Tenant.id.in_({tenant_id for tenant_id, _ in keys})
+        )
+    }
+
+    compress = get_settings().payload_compression
+    stored = []
+    for entry in entries:
+        key = (entry.tenant_id, entry.sha256)
+        tenant = tenants.get(entry.tenant_id)
+        if key in existing or tenant is None:
+            continue
+        existing.add(key)
+        data = entry.data
+        event = models.Event(
+            tenant_id=entry.tenant_id,
+            sha256=entry.sha256,
+            payload=data,
+            duplicate=False,
+            created_at=entry.received_at,
+        )
+        compressed = None
+        if compress:
+            compressed = compression.compress(
+                db, entry.tenant_id, data.get("event"), entry.raw
+            )
+            if compressed is not None:
+                event.store_compressed(*compressed)
+        db.add(event)
+        stored.append((entry, event, compressed, routing.route(db, tenant, data)))
+    if not stored:
+        return []
+
+    db.flush()
+    per_tenant: dict[int, list] = {}
+    for item in stored:
+        per_tenant.setdefault(item[0].tenant_id, []).append(item)
+    for tenant_id, items in per_tenant.items():
+        crud.enqueue_deliveries(
+            db,
+            [
+                (event.id, target_id, None)
+                for _, event, _, target_ids in items
+                for target_id in target_ids
+            ],
+            trace_contexts={event.id: entry.trace for entry, event, _, _ in items},
+            tenant_id=tenant_id,
+        )
+    return stored
+
+
+def _after_commit(stored: list[tuple], pool: ThreadPoolExecutor) -> None:
+    """Upload payloads and announce events once they are committed."""
+    from app.storage.s3_client import get_s3_client
+
+    bucket = get_settings().events_bucket
+    s3 = get_s3_client()
+
+    def upload(item):
+        entry, event, compressed, target_ids = item
+        try:
+            s3.put_object(
+                Bucket=bucket,
+                Key=f"{entry.tenant_id}/{entry.sha256}.json",
+                **compression.s3_object_args(entry.raw, compressed),
+            )
+        except Exception as exc:
+            logger.error(
+                "Failed to upload payload to S3: %s",
+                exc,
+                extra={"tenant_id": entry.tenant_id, "event_id": event.id},
+            )
+        data = entry.data
+        live.publish_sync(
+            entry.tenant_id,
+            {
+                "type": "event",
+                "event_id": event.id,
+                "event_type": data.get("event"),
+                "created_at": event.created_at,
+                "targets": target_ids,
+                "payload": data,
+            },
+        )
+
+    list(pool.map(upload, stored))
+
+
+class Persister(StreamConsumer):
+    def __init__(self, redis_client):
+        settings = get_settings()
+        super().__init__(
+            redis_client,
+            settings.ingest_stream,
+            GROUP,
+            settings.ingest_stream_batch_size,
+        )
+        self.pool = ThreadPoolExecutor(max_workers=16)
+        self.dead_stream = settings.ingest_stream + DEAD_SUFFIX
+
+    def _count(self, stored: list[tuple]) -> None:
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for entry, _, _, _ in stored:
+                rollups.count_ingest(pipe, entry.tenant_id, entry.received_at)
+            pipe.execute()
+        except Exception as exc:
+            # The events are stored; only the stats miss them.
+            logger.warning("Could not count %d ingested events: %s", len(stored), exc)
+
+    def _decode_all(self, messages: list[tuple]) -> list[tuple]:
+        """``(message, entry)`` pairs; unreadable entries are set aside."""
+        decoded, unreadable = [], []
+        for entry_id, fields in messages:
+            try:
+                decoded.append(((entry_id, fields), _decode(entry_id, fields)))
+            except (KeyError, ValueError) as exc:
+                logger.error(
+                    "Moving unreadable ingest entry %s aside: %r", entry_id, exc
+                )
+                unreadable.append((entry_id, {**fields, b"error": repr(exc)}))
+        if unreadable:
+            # Redelivering them would fail the same way, forever.
+            self.set_aside(unreadable, self.dead_stream)
+        return decoded
+
+    def step(self, block_ms: int = 1000) -> int:
+        messages = self.read(block_ms)
+        if not messages:
+            return 0
+        decoded = self._decode_all(messages)
+        entries = [entry for _, entry in decoded]
+        if not entries:
+            return len(messages)
+        start = time.perf_counter()
+        placement = shards.group(entry.tenant_id for entry in entries)
+        try:
+            # One transaction per shard; each batch is acknowledged once stored.
+            for shard, tenant_ids in placement.items():
+                batch = [entry for entry in entries if entry.tenant_id in tenant_ids]
+                with shards.sessionmaker_for(shard)() as db:
+                    stored = persist_batch(db, batch)
+                    db.commit()
+                self._count(stored)
+                _after_commit(stored, self.pool)
+                self.ack([entry.id for entry in batch])
+        except SQLAlchemyError:
+            # Leave the entries pending; they are retried from the backlog.
+            self.retry_pending()
+            raise
+        placed = {
+            tenant_id for tenant_ids in placement.values() for tenant_id in tenant_ids
+        }
+        moving = [
+            message for message, entry in decoded if entry.tenant_id not in placed
+        ]
+        if moving:
+            # Tenants being moved between shards are stored once they have landed.
+            self.requeue(moving)
+            if len(moving) == len(entries):
+                time.sleep(0.5)
+        metrics.STREAM_PERSIST_SECONDS.observe(time.perf_counter() - start)
+        oldest = min(entry.received_at for entry in entries)
+        metrics.STREAM_LAG_SECONDS.observe((datetime.now(UTC) - oldest).total_seconds())
+        return len(messages)
+
+
+def run() -> None:
+    import redis
+
+    settings = get_settings()
+    persister = Persister(redis.Redis.from_url(settings.redis_url))
+    logger.info("Stream persister %s reading %s", persister.consumer, persister.stream)
+    last_claim = 0.0
+    delay = 1.0
+    while True:
+        try:
+            if time.monotonic() - last_claim > 30:
+                persister.claim_abandoned()
+                last_claim = time.monotonic()
+            persister.step()
+            delay = 1.0
+        except Exception:
+            logger.exception("Stream persister step failed, retrying in %.0fs", delay)
+            time.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+
+if __name__ == "__main__":
+    from app.core.logging import configure_logging
+
+    configure_logging()
+    run()
@@ -0,0 +1,80 @@
+"""Consumer-group plumbing shared by the Redis Stream consumers.
+
+A consumer first re-reads entries already delivered to it (left pending by a
+crash or a failed write), then new ones. Entries are acknowledged and deleted
+only once the caller has stored them, and entries held by a consumer that
+died are claimed by the others after ``min_idle_ms``.
+"""
+
+import os
+import socket
+
+
+class StreamConsumer:
+    def __init__(self, redis_client, stream: str, group: str, batch_size: int):
+        self.redis = redis_client
+        self.stream = stream
+        self.group = group
+        self.batch_size = batch_size
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._backlog = True  # our own pending entries come first
+        try:
+            self.redis.xgroup_create(stream, group, id="0", mkstream=True)
+        except Exception as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    def read(self, block_ms: int, count: int | None = None) -> list[tuple]:
+        """Up to ``count`` ``(entry_id, fields)``, waiting ``block_ms`` for new ones."""
+        count = count or self.batch_size
+        if self._backlog:
+            # Entries delivered to us before a crash or a failed write.
+            reply = self.redis.xreadgroup(
+                self.group, self.consumer, {self.stream: "0"}, count=count
+            )
+            messages = reply[0][1] if reply else []
+            if messages:
+                return messages
+            self._backlog = False
+        reply = self.redis.xreadgroup(
+            self.group, self.consumer, {self.stream: ">"}, count=count, block=block_ms
+        )
+        return reply[0][1] if reply else []
+
+    def retry_pending(self) -> None:
+        """Read our pending entries again on the next ``read``."""
+        self._backlog = True
+
+    def ack(self, entry_ids: list) -> None:
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xack(self.stream, self.group, *entry_ids)
+        pipe.xdel(self.stream, *entry_ids)
+        pipe.execute()
+
+    def requeue(self, messages: list[tuple]) -> None:
+        """Move entries to the end of the stream, to be read again later."""
+        pipe = self.redis.pipeline()
+        for _, fields in messages:
+            pipe.xadd(self.stream, fields)
+        entry_ids = [entry_id for entry_id, _ in messages]
+        pipe.xack(self.stream, self.group, *entry_ids)
+        pipe.xdel(self.stream, *entry_ids)
+        pipe.execute()
+
+    def set_aside(self, messages: list[tuple], stream: str) -> None:
+        """Move entries that can never be processed to ``stream``."""
+        pipe = self.redis.pipeline()
+        for _, fields in messages:
+            pipe.xadd(stream, fields)
+        entry_ids = [entry_id for entry_id, _ in messages]
+        pipe.xack(self.stream, self.group, *entry_ids)
+        pipe.xdel(self.stream, *entry_ids)
+        pipe.execute()
+
+    def claim_abandoned(self, min_idle_ms: int = 60000) -> None:
+        """Take over entries left pending by consumers that died."""
+        _, claimed, *_ = self.redis.xautoclaim(
+            self.stream, self.group, self.consumer, min_idle_ms, count=self.batch_size
+        )
+        if claimed:
+            self._backlog = True
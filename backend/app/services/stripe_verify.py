@@ -1,8 +1,10 @@
 import hashlib
 import hmac
-import time
-from typing import Optional
+import logging
 import os
+import time
+
+logger = logging.getLogger(__name__)
 
 
 class StripeSignatureError(Exception):
@@ -13,48 +15,21 @@ def verify(raw_body: bytes, header: str, secret: str, tolerance: int = 300) -> N
     """
     Raise StripeSignatureError if signature invalid.
     """
-    import logging
-
-    logger = logging.getLogger(__name__)
-    logger.info(f"Verifying Stripe signature with header: {header}")
-    logger.info(f"Raw body: {raw_body.decode()}")
     try:
         parts = dict(kv.split("=", 1) for kv in header.split(","))
         timestamp = int(parts["t"])
         signature = parts["v1"]
-        logger.info(f"Received signature: {signature}")
-        logger.info(f"Using secret: {secret}")
     except Exception:
         raise StripeSignatureError("Malformed Stripe-Signature header")
 
-    if abs(time.time() - timestamp) > tolerance:
-        logger.warning(
-            f"Timestamp outside tolerance: {abs(time.time() - timestamp)} > {tolerance}"
-        )
+    skew = abs(time.time() - timestamp)
+    if skew > tolerance:
+        logger.warning("Timestamp outside tolerance: %.0fs > %ss", skew, tolerance)
         # For testing, we'll be more lenient with the timestamp
         if not os.environ.get("TESTING"):
             raise StripeSignatureError("Timestamp outside tolerance")
 
-    raw_body_str = raw_body.decode()
-    logger.info(f"Raw body string: {raw_body_str}")
-    logger.info(f"Raw body repr: {repr(raw_body_str)}")
-    logger.info(f"Raw body bytes: {raw_body}")
-    payload = f"{timestamp}.{raw_body_str}".encode("utf-8")
-    logger.info(f"Payload to sign: {payload}")
-    logger.info(f"Payload repr: {repr(payload)}")
-    logger.info(f"Secret before encode: {secret}")
-    secret_bytes = secret.encode("utf-8")
-    logger.info(f"Secret after encode: {secret_bytes}")
-    expected = hmac.new(secret_bytes, payload, hashlib.sha256).hexdigest()
-    logger.info(f"Expected signature: {expected}")
-    logger.info(f"Received signature: {signature}")
-    logger.info(f"Secret used: {secret}")
-    logger.info(f"Secret bytes: {secret_bytes}")
-    logger.info(f"Payload bytes: {payload}")
-    logger.info(f"HMAC key: {secret_bytes}")
-    logger.info(f"HMAC message: {payload}")
+    payload = b"%d.%s" % (timestamp, raw_body)
+    expected = hmac.new(secret.encode("utf-8"), payload, hashlib.sha256).hexdigest()
     if not hmac.compare_digest(expected, signature):
-        logger.error(f"Signature mismatch: expected={expected}, received={signature}")
-        logger.error(f"Secret bytes: {secret_bytes}")
-        logger.error(f"Payload bytes: {payload}")
         raise StripeSignatureError("Invalid signature")
@@ -0,0 +1,161 @@
+"""Per-target delivery timeouts derived from observed latency.
+
+Every attempt adds its latency to a per-minute sketch of the target in Redis
+(one ``HINCRBY`` on the sketch bucket), shared by all workers. Attempts that
+open a new connection also add the time the TCP and TLS handshakes took to a
+second sketch; kept-alive connections skip it. Timeouts come from the last
+``adaptive_timeout_window`` seconds of those sketches: the read timeout is a
+multiple of p99 of the total latency, the connect timeout a multiple of p50
+of the connect time, each clamped to its configured bounds. A timeout without
+enough samples behind it gets its default. Workers cache the result per
+target for ``adaptive_timeout_refresh`` seconds, so a delivery usually costs
+one pipelined write and no read.
+
+Attempts that time out are recorded at the timeout they hit, so a target that
+really got slower pushes its own quantile, and with it the timeout, back up.
+"""
+
+import logging
+import threading
+import time
+from functools import lru_cache
+
+import httpx
+from app.core.config import get_settings
+from app.services.sketch import Sketch, bucket_index, bucket_value
+
+logger = logging.getLogger(__name__)
+
+MIN_SAMPLES = 20
+KEY_PREFIX = "latency:"
+CONNECT_KEY_PREFIX = "connect:"
+
+_cache: dict[int, tuple[float, httpx.Timeout]] = {}
+_lock = threading.Lock()
+
+
+@lru_cache
+def _redis():
+    import redis
+
+    return redis.Redis.from_url(
+        get_settings().redis_url, socket_timeout=1, socket_connect_timeout=1
+    )
+
+
+def _key(target_id: int, minute: int, prefix: str = KEY_PREFIX) -> str:
+    return f"{prefix}{target_id}:{minute}"
+
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return min(max(value, low), high)
+
+
+def default() -> httpx.Timeout:
+    settings = get_settings()
+    return httpx.Timeout(
+        settings.delivery_timeout, connect=settings.delivery_connect_timeout_max
+    )
+
+
+def derive(sketch: Sketch, connects: Sketch) -> httpx.Timeout:
+    """Timeouts from a target's latency and connect time sketches (ms)."""
+    settings = get_settings()
+    read = settings.delivery_timeout
+    if sketch.count >= MIN_SAMPLES:
+        read = _clamp(
+            sketch.quantile(0.99) / 1000 * settings.delivery_timeout_p99_multiple,
+            settings.delivery_timeout_min,
+            settings.delivery_timeout_max,
+        )
+    connect = settings.delivery_connect_timeout_max
+    if connects.count >= MIN_SAMPLES:
+        p50 = connects.quantile(0.5) / 1000
+        connect = _clamp(
+            p50 * settings.delivery_connect_timeout_p50_multiple,
+            settings.delivery_connect_timeout_min,
+            settings.delivery_connect_timeout_max,
+        )
+    # httpx applies ``read`` per socket read, ``write`` and ``pool`` likewise.
+    return httpx.Timeout(read, connect=connect)
+
+
+def load(target_id: int) -> tuple[Sketch, Sketch]:
+    """The target's latency and connect time sketches over the rolling window."""
+    minutes = max(1, int(get_settings().adaptive_timeout_window // 60))
+    now = int(time.time() // 60)
+    prefixes = (KEY_PREFIX, CONNECT_KEY_PREFIX)
+    pipe = _redis().pipeline(transaction=False)
+    for prefix in prefixes:
+        for minute in range(now - minutes + 1, now + 1):
+            pipe.hgetall(_key(target_id, minute, prefix))
+    replies = pipe.execute()
+    sketches = []
+    for i in range(len(prefixes)):
+        sketch = Sketch()
+        for counts in replies[i * minutes : (i + 1) * minutes]:
+            for index, count in counts.items():
+                sketch.add(bucket_value(int(index)), int(count))
+        sketches.append(sketch)
+    return sketches[0], sketches[1]
+
+
+def for_target(target_id: int) -> httpx.Timeout:
+    """Timeouts for the next attempt; the default if Redis is unavailable."""
+    now = time.monotonic()
+    cached = _cache.get(target_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    try:
+        timeout = derive(*load(target_id))
+    except Exception as exc:
+        logger.warning("Could not load latency for target %s: %s", target_id, exc)
+        timeout = cached[1] if cached is not None else default()
+    with _lock:
+        _cache[target_id] = (now + get_settings().adaptive_timeout_refresh, timeout)
+    return timeout
+
+
+def observe(
+    target_id: int, latency_ms: float | None, connect_ms: float | None = None
+) -> None:
+    """Add an attempt's latency and connect time to the shared sketches.
+
+    Either may be ``None`` when the attempt says nothing about it. Never raises.
+    """
+    minute = int(time.time() // 60)
+    ttl = int(get_settings().adaptive_timeout_window) + 120
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for prefix, value in (
+            (KEY_PREFIX, latency_ms),
+            (CONNECT_KEY_PREFIX, connect_ms),
+        ):
+            if value is not None:
+                key = _key(target_id, minute, prefix)
+                pipe.hincrby(key, bucket_index(max(value, 0.001)), 1)
+                pipe.expire(key, ttl)
+        pipe.execute()
+    except Exception as exc:
+        logger.warning("Could not record latency for target %s: %s", target_id, exc)
+
+
+class ConnectTimer:
+    """An httpx ``trace`` extension that times opening a new connection.
+
+    ``ms`` covers the TCP connect and, for https, the TLS handshake: what the
+    connect timeout applies to. It stays ``None`` when a kept-alive connection
+    was reused or the connect did not finish.
+    """
+
+    def __init__(self):
+        self.ms: float | None = None
+        self._started: float | None = None
+
+    def __call__(self, name: str, info: dict) -> None:
+        if name.endswith("connect_tcp.started"):
+            self._started = time.perf_counter()
+        elif self._started is not None and name.endswith(
+            ("connect_tcp.complete", "start_tls.complete")
+        ):
+            self.ms = (time.perf_counter() - self._started) * 1000
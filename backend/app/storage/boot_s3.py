@@ -1,32 +1,32 @@
-import boto3
-import json
-from botocore.exceptions import ClientError
-from app.core.settings import Settings
-import os
+"""Provision the events bucket.
+
+This runs as a one-off deployment step rather than on every process start:
 
-settings = Settings()
+    poetry run python -m app.storage.boot_s3
+"""
+
+from app.core.config import get_settings
+from app.storage.s3_client import get_s3_client
+from botocore.exceptions import ClientError
 
 
 def ensure_secure_bucket():
     """Ensure the S3 bucket exists and is configured with security best practices."""
-    s3 = boto3.client(
-        "s3",
-        region_name=settings.AWS_REGION,
-        endpoint_url=os.getenv("AWS_ENDPOINT_URL"),
-    )
+    settings = get_settings()
+    s3 = get_s3_client()
     try:
-        s3.head_bucket(Bucket=settings.EVENTS_BUCKET)
+        s3.head_bucket(Bucket=settings.events_bucket)
     except ClientError:
-        create_kwargs = {"Bucket": settings.EVENTS_BUCKET}
-        if settings.AWS_REGION != "us-east-1":
+        create_kwargs = {"Bucket": settings.events_bucket}
+        if settings.aws_region != "us-east-1":
             create_kwargs["CreateBucketConfiguration"] = {
-                "LocationConstraint": settings.AWS_REGION
+                "LocationConstraint": settings.aws_region
             }
         s3.create_bucket(**create_kwargs)
 
     # Block Public Access
     s3.put_public_access_block(
-        Bucket=settings.EVENTS_BUCKET,
+        Bucket=settings.events_bucket,
         PublicAccessBlockConfiguration={
             "BlockPublicAcls": True,
             "IgnorePublicAcls": True,
@@ -41,11 +41,11 @@ def ensure_secure_bucket():
             {
                 "ApplyServerSideEncryptionByDefault": {
                     "SSEAlgorithm": (
-                        "aws:kms" if settings.AWS_SSE_KMS_KEY_ID else "AES256"
+                        "aws:kms" if settings.aws_sse_kms_key_id else "AES256"
                     ),
                     **(
-                        {"KMSMasterKeyID": settings.AWS_SSE_KMS_KEY_ID}
-                        if settings.AWS_SSE_KMS_KEY_ID
+                        {"KMSMasterKeyID": settings.aws_sse_kms_key_id}
+                        if settings.aws_sse_kms_key_id
                         else {}
                     ),
                 },
@@ -54,5 +54,10 @@ def ensure_secure_bucket():
         ]
     }
     s3.put_bucket_encryption(
-        Bucket=settings.EVENTS_BUCKET, ServerSideEncryptionConfiguration=enc_cfg
+        Bucket=settings.events_bucket, ServerSideEncryptionConfiguration=enc_cfg
     )
+
+
+if __name__ == "__main__":
+    ensure_secure_bucket()
+    print(f"Bucket {get_settings().events_bucket} is provisioned")
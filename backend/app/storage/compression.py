@@ -0,0 +1,221 @@
+"""zstd compression of stored payloads with trained dictionaries.
+
+Webhook payloads are small and repetitive, which is where plain zstd does
+worst and a dictionary does best. Dictionaries are trained per tenant,
+optionally narrowed to one event type, and stored in
+``compression_dictionaries``. A row is never changed once written: retraining
+adds a new version, and every compressed payload keeps the id of the
+dictionary it needs, in the DB and in the S3 object metadata. Dictionary ids
+are only unique within a shard, so a dictionary is always read from, and
+cached for, the shard of the tenant it belongs to.
+
+Train a dictionary from a tenant's recent events:
+
+    poetry run python -m app.storage.compression train --tenant 1 [--event-type invoice.paid]
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from app.core.config import get_settings
+from app.db import models, shards
+from sqlalchemy.orm import Session
+
+CONTENT_TYPE = "application/zstd"
+META_ENCODING = "payload-encoding"
+META_DICTIONARY = "zstd-dictionary"
+
+# Which dictionary a tenant/event type compresses with is re-read this often,
+# so a newly trained version is picked up without a restart.
+SELECTION_TTL = 60.0
+
+_dictionaries: dict[tuple[str, int], object] = {}
+_selection: dict[tuple[int, str | None], tuple[float, int | None]] = {}
+_lock = threading.Lock()
+
+
+def _zstd():
+    import zstandard
+
+    return zstandard
+
+
+def encode_payload(data: dict) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+def _dictionary(tenant_id: int, dictionary_id: int, db: Session | None = None):
+    """The dictionary ``dictionary_id`` on the tenant's shard.
+
+    ``db`` must be a session on that shard; without one, a session is opened.
+    """
+    shard = shards.locate(tenant_id)[0]
+    key = (shard, dictionary_id)
+    cached = _dictionaries.get(key)
+    if cached is not None:
+        return cached
+    if db is None:
+        with shards.sessionmaker_for(shard, read=True)() as session:
+            return _dictionary(tenant_id, dictionary_id, session)
+    row = db.get(models.CompressionDictionary, dictionary_id)
+    if row is None or row.tenant_id != tenant_id:
+        raise LookupError(
+            f"Compression dictionary {dictionary_id} of tenant {tenant_id} not found"
+        )
+    zstd = _zstd()
+    dictionary = zstd.ZstdCompressionDict(row.data)
+    dictionary.precompute_compress(level=get_settings().payload_compression_level)
+    with _lock:
+        _dictionaries[key] = dictionary
+    return dictionary
+
+
+def _select(db: Session, tenant_id: int, event_type: str | None) -> int | None:
+    """Newest dictionary for the event type, else for the tenant, else none."""
+    key = (tenant_id, event_type)
+    cached = _selection.get(key)
+    if cached is not None and time.monotonic() - cached[0] < SELECTION_TTL:
+        return cached[1]
+    table = models.CompressionDictionary
+    row = (
+        db.query(table.id)
+        .filter(
+            table.tenant_id == tenant_id,
+            (table.event_type == event_type) | table.event_type.is_(None),
+        )
+        .order_by(table.event_type.is_(None), table.id.desc())
+        .first()
+    )
+    dictionary_id = row[0] if row else None
+    with _lock:
+        _selection[key] = (time.monotonic(), dictionary_id)
+    return dictionary_id
+
+
+def compress(
+    db: Session, tenant_id: int, event_type: str | None, raw: bytes
+) -> tuple[bytes, int | None] | None:
+    """Compress ``raw`` with the best dictionary available.
+
+    Returns the frame and the dictionary id, or ``None`` when the frame would
+    not be smaller than ``raw`` (tiny payloads without a dictionary).
+    """
+    zstd = _zstd()
+    level = get_settings().payload_compression_level
+    dictionary_id = _select(db, tenant_id, event_type)
+    # The dictionary id is kept next to the frame, so skip its 4 header bytes.
+    if dictionary_id is None:
+        compressor = zstd.ZstdCompressor(level=level, write_dict_id=False)
+    else:
+        compressor = zstd.ZstdCompressor(
+            level=level,
+            dict_data=_dictionary(tenant_id, dictionary_id, db),
+            write_dict_id=False,
+        )
+    blob = compressor.compress(raw)
+    if len(blob) >= len(raw):
+        return None
+    return blob, dictionary_id
+
+
+def decompress(
+    blob: bytes,
+    dictionary_id: int | None,
+    tenant_id: int,
+    db: Session | None = None,
+):
+    """Inverse of ``compress``; loads and caches the dictionary if needed."""
+    zstd = _zstd()
+    if dictionary_id is None:
+        return zstd.ZstdDecompressor().decompress(blob)
+    dictionary = _dictionary(tenant_id, dictionary_id, db)
+    return zstd.ZstdDecompressor(dict_data=dictionary).decompress(blob)
+
+
+def s3_object_args(
+    raw: bytes, compressed: tuple[bytes, int | None] | None = None
+) -> dict:
+    """``put_object`` arguments for a payload, as JSON or as a ``compress`` result."""
+    if compressed is None:
+        return {"Body": raw, "ContentType": "application/json"}
+    blob, dictionary_id = compressed
+    metadata = {META_ENCODING: "zstd"}
+    if dictionary_id is not None:
+        metadata[META_DICTIONARY] = str(dictionary_id)
+    return {"Body": blob, "ContentType": CONTENT_TYPE, "Metadata": metadata}
+
+
+def decode_s3_object(
+    body: bytes, metadata: dict, tenant_id: int, db: Session | None = None
+) -> bytes:
+    """Return the JSON bytes of an S3 payload object, however it was stored."""
+    if metadata.get(META_ENCODING) != "zstd":
+        return body
+    dictionary_id = metadata.get(META_DICTIONARY)
+    return decompress(
+        body, int(dictionary_id) if dictionary_id else None, tenant_id, db
+    )
+
+
+def train(
+    db: Session,
+    tenant_id: int,
+    event_type: str | None = None,
+    samples: int = 2000,
+    size: int = 16384,
+) -> models.CompressionDictionary:
+    """Train and store a new dictionary version from the tenant's latest events."""
+    events = (
+        db.query(models.Event)
+        .filter_by(tenant_id=tenant_id)
+        .order_by(models.Event.id.desc())
+        .limit(samples * 4 if event_type else samples)
+    )
+    corpus = []
+    for event in events:
+        payload = event.payload
+        if event_type and payload.get("event") != event_type:
+            continue
+        corpus.append(encode_payload(payload))
+        if len(corpus) >= samples:
+            break
+    if len(corpus) < 8:
+        raise ValueError(f"Need at least 8 sample events, found {len(corpus)}")
+
+    trained = _zstd().train_dictionary(size, corpus)
+    row = models.CompressionDictionary(
+        tenant_id=tenant_id,
+        event_type=event_type,
+        zstd_dict_id=trained.dict_id(),
+        data=trained.as_bytes(),
+        sample_count=len(corpus),
+    )
+    db.add(row)
+    db.commit()
+    with _lock:
+        _selection.clear()
+    return row
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_cmd = commands.add_parser("train", help="train a new dictionary version")
+    train_cmd.add_argument("--tenant", type=int, required=True)
+    train_cmd.add_argument("--event-type")
+    train_cmd.add_argument("--samples", type=int, default=2000)
+    train_cmd.add_argument("--size", type=int, default=16384, help="bytes")
+    args = parser.parse_args(argv)
+
+    with shards.session_for(args.tenant) as db:
+        row = train(db, args.tenant, args.event_type, args.samples, args.size)
+    print(
+        f"Stored dictionary {row.id} ({len(row.data)} bytes, "
+        f"{row.sample_count} samples)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Rebuild or reconcile the events table from the payload objects in S3.
+
+Every event is stored as ``{tenant_id}/{sha256}.json``. The key space is cut
+into shards, one per tenant and leading hex digit of the hash, and shards are
+listed in parallel. Each shard is compared with the DB through a single range
+query on ``ix_event_unique``, so no key is ever looked up on its own.
+
+    poetry run python -m app.storage.rehydrate restore [--tenant 1] [--checkpoint FILE]
+    poetry run python -m app.storage.rehydrate verify [--tenant 1] [--report FILE]
+
+``restore`` fetches the objects missing from the DB concurrently and inserts
+them in batches. Finished shards are recorded in the checkpoint file, so an
+interrupted run picks up where it stopped; a shard cut off halfway is simply
+diffed again. ``verify`` changes nothing and reports objects missing from the
+DB and rows missing from S3.
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from app.core.config import get_settings
+from app.db import models
+from app.storage import compression
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+HEX_DIGITS = "0123456789abcdef"
+
+
+@dataclass
+class Stats:
+    listed: int = 0
+    restored: int = 0
+    failed: int = 0
+    missing_in_db: int = 0
+    missing_in_s3: int = 0
+    shards: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **counts: int) -> None:
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+    def as_dict(self) -> dict:
+        names = ("shards", "listed", "restored", "failed")
+        names += ("missing_in_db", "missing_in_s3")
+        return {name: getattr(self, name) for name in names}
+
+
+class Checkpoint:
+    """Shards already finished, persisted after each one."""
+
+    def __init__(self, path: str | None, mode: str):
+        self.path = path
+        self.done: set[str] = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get("mode") == mode:
+                self.done = set(state["done"])
+        self.mode = mode
+
+    def mark(self, shard: str) -> None:
+        with self._lock:
+            self.done.add(shard)
+            if not self.path:
+                return
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"mode": self.mode, "done": sorted(self.done)}, f)
+            os.replace(tmp, self.path)
+
+
+def tenant_prefixes(s3, bucket: str) -> list[int]:
+    """Tenant ids that have at least one object in the bucket."""
+    tenants = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Delimiter="/"):
+        for prefix in page.get("CommonPrefixes", ()):
+            name = prefix["Prefix"].rstrip("/")
+            if name.isdigit():
+                tenants.append(int(name))
+    return sorted(tenants)
+
+
+def list_shard(s3, bucket: str, tenant_id: int, digit: str) -> dict:
+    """``{sha256: last_modified}`` for the shard's objects."""
+    objects = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{tenant_id}/{digit}"):
+        for obj in page.get("Contents", ()):
+            name = obj["Key"].split("/", 1)[1]
+            if name.endswith(".json"):
+                objects[name.removesuffix(".json")] = obj["LastModified"]
+    return objects
+
+
+def db_shard(db: Session, tenant_id: int, digit: str) -> set[str]:
+    """Hashes stored for the shard, as one index range scan."""
+    upper = HEX_DIGITS[HEX_DIGITS.index(digit) + 1] if digit != "f" else "g"
+    rows = db.query(models.Event.sha256).filter(
+        models.Event.tenant_id == tenant_id,
+        models.Event.sha256 >= digit,
+        models.Event.sha256 < upper,
+    )
+    return {sha256 for (sha256,) in rows}
+
+
+class Rehydrator:
+    def __init__(self, s3, bucket: str, workers: int, fetchers: int, batch_size: int):
+        self.s3 = s3
+        self.bucket = bucket
+        self.workers = workers
+        self.batch_size = batch_size
+        self.fetch_pool = ThreadPoolExecutor(max_workers=fetchers)
+        self.stats = Stats()
+        self.report_lines: list[str] = []
+        self._report_lock = threading.Lock()
+
+    def _fetch(self, db_factory, tenant_id: int, sha256: str) -> bytes | None:
+        key = f"{tenant_id}/{sha256}.json"
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=key)
+            body, metadata = obj["Body"].read(), obj.get("Metadata", {})
+            if metadata.get(compression.META_ENCODING) != "zstd":
+                return body
+            # The dictionary may need loading from the DB.
+            with db_factory() as db:
+                return compression.decode_s3_object(body, metadata, tenant_id, db)
+        except Exception as exc:
+            logger.warning("Could not restore %s: %s", key, exc)
+            return None
+
+    def _restore(self, db, tenant_id: int, missing: dict) -> None:
+        from app.db import shards
+
+        factory = shards.sessionmaker_for(shards.locate(tenant_id)[0])
+        settings = get_settings()
+        hashes = sorted(missing)
+        for start in range(0, len(hashes), self.batch_size):
+            chunk = hashes[start : start + self.batch_size]
+            bodies = self.fetch_pool.map(
+                lambda sha256: self._fetch(factory, tenant_id, sha256), chunk
+            )
+            rows = []
+            for sha256, raw in zip(chunk, bodies):
+                if raw is None:
+                    continue
+                row = {
+                    "tenant_id": tenant_id,
+                    "sha256": sha256,
+                    "raw_payload": json.loads(raw),
+                    "payload_zstd": None,
+                    "dictionary_id": None,
+                    "duplicate": False,
+                    "created_at": missing[sha256],
+                }
+                if settings.payload_compression:
+                    compressed = compression.compress(
+                        db, tenant_id, row["raw_payload"].get("event"), raw
+                    )
+                    if compressed is not None:
+                        row["raw_payload"] = None
+                        row["payload_zstd"], row["dictionary_id"] = compressed
+                rows.append(row)
+            if rows:
+                db.execute(insert(models.Event), rows)
+                db.commit()
+            self.stats.add(restored=len(rows), failed=len(chunk) - len(rows))
+
+    def _report(self, kind: str, tenant_id: int, hashes) -> None:
+        with self._report_lock:
+            self.report_lines.extend(
+                f"{kind} {tenant_id}/{sha256}.json" for sha256 in sorted(hashes)
+            )
+
+    def run_shard(self, mode: str, tenant_id: int, digit: str) -> None:
+        from app.db import shards
+
+        objects = list_shard(self.s3, self.bucket, tenant_id, digit)
+        with shards.session_for(tenant_id) as db:
+            stored = db_shard(db, tenant_id, digit)
+            missing = {h: at for h, at in objects.items() if h not in stored}
+            self.stats.add(shards=1, listed=len(objects), missing_in_db=len(missing))
+            if mode == "verify":
+                orphans = stored - objects.keys()
+                self.stats.add(missing_in_s3=len(orphans))
+                self._report("missing_in_db", tenant_id, missing)
+                self._report("missing_in_s3", tenant_id, orphans)
+            elif missing:
+                self._restore(db, tenant_id, missing)
+
+    def run(self, mode: str, tenants: list[int], checkpoint: Checkpoint) -> Stats:
+        from app.db.session import SessionLocal
+
+        with SessionLocal() as db:
+            known = {
+                tenant_id
+                for (tenant_id,) in db.query(models.Tenant.id).filter(
+                    models.Tenant.id.in_(tenants)
+                )
+            }
+        for tenant_id in sorted(set(tenants) - known):
+            logger.warning("Skipping objects of unknown tenant %s", tenant_id)
+
+        shards = [
+            (tenant_id, digit)
+            for tenant_id in sorted(known)
+            for digit in HEX_DIGITS
+            if f"{tenant_id}/{digit}" not in checkpoint.done
+        ]
+        logger.info("%s: %s shards to process", mode, len(shards))
+
+        def work(shard):
+            tenant_id, digit = shard
+            self.run_shard(mode, tenant_id, digit)
+            checkpoint.mark(f"{tenant_id}/{digit}")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for _ in pool.map(work, shards):
+                pass
+        self.fetch_pool.shutdown()
+        return self.stats
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("mode", choices=["restore", "verify"])
+    parser.add_argument("--tenant", type=int, action="append", help="repeatable")
+    parser.add_argument("--checkpoint", help="JSON file recording finished shards")
+    parser.add_argument("--report", help="write the discrepancies found here")
+    parser.add_argument("--workers", type=int, default=8, help="shards in parallel")
+    parser.add_argument("--fetchers", type=int, default=32, help="concurrent GETs")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    from app.storage.s3_client import get_s3_client
+
+    s3 = get_s3_client()
+    bucket = get_settings().events_bucket
+    tenants = args.tenant or tenant_prefixes(s3, bucket)
+    start = time.monotonic()
+    rehydrator = Rehydrator(s3, bucket, args.workers, args.fetchers, args.batch_size)
+    stats = rehydrator.run(args.mode, tenants, Checkpoint(args.checkpoint, args.mode))
+    if args.report:
+        with open(args.report, "w") as f:
+            f.writelines(line + "\n" for line in rehydrator.report_lines)
+    print(
+        json.dumps(
+            {
+                "mode": args.mode,
+                "seconds": round(time.monotonic() - start, 1),
+                **stats.as_dict(),
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    from app.core.logging import configure_logging
+
+    configure_logging()
+    main()
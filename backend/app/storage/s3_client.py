@@ -1,32 +1,49 @@
-import boto3
-from app.core.settings import Settings
+from functools import lru_cache
 
-settings = Settings()
+from app.core.config import get_settings
+from app.storage import compression
 
 
+@lru_cache
 def get_s3_client():
-    """Get a configured S3 client."""
-    return boto3.client("s3", region_name=settings.AWS_REGION)
+    """Get a configured S3 client.
+
+    Building a boto3 client loads the service model, which is slow, so one
+    client is created per process and shared (boto3 clients are thread-safe).
+    """
+    import boto3
+
+    settings = get_settings()
+    return boto3.client(
+        "s3",
+        region_name=settings.aws_region,
+        aws_access_key_id=settings.aws_access_key_id,
+        aws_secret_access_key=settings.aws_secret_access_key,
+        endpoint_url=settings.aws_endpoint_url,
+    )
 
 
-def store_event_payload(key: str, raw_body: bytes) -> None:
+def store_event_payload(
+    key: str, raw_body: bytes, compressed: tuple[bytes, int | None] | None = None
+) -> None:
     """
     Store an event payload in S3 with server-side encryption.
 
     Args:
         key: The S3 object key
         raw_body: The raw event payload bytes
+        compressed: ``compression.compress`` output to store instead of raw_body
     """
+    settings = get_settings()
     s3 = get_s3_client()
     s3.put_object(
-        Bucket=settings.EVENTS_BUCKET,
+        Bucket=settings.events_bucket,
         Key=key,
-        Body=raw_body,
-        ContentType="application/json",
-        ServerSideEncryption="aws:kms" if settings.AWS_SSE_KMS_KEY_ID else "AES256",
+        **compression.s3_object_args(raw_body, compressed),
+        ServerSideEncryption="aws:kms" if settings.aws_sse_kms_key_id else "AES256",
         **(
-            {"SSEKMSKeyId": settings.AWS_SSE_KMS_KEY_ID}
-            if settings.AWS_SSE_KMS_KEY_ID
+            {"SSEKMSKeyId": settings.aws_sse_kms_key_id}
+            if settings.aws_sse_kms_key_id
             else {}
         )
     )
@@ -0,0 +1,25 @@
+"""API key verification as the number of stored keys grows."""
+
+import pytest
+from app.db import crud, models
+from passlib.hash import bcrypt
+
+# Cheap hashes keep setup tolerable; a real cost factor scales every number.
+HASHER = bcrypt.using(rounds=4)
+
+
+@pytest.mark.parametrize("keys, rounds", [(10, 50), (1_000, 5), (10_000, 2)])
+def bench_verify_api_key(benchmark, db, tenant, keys, rounds):
+    db.query(models.ApiKey).delete()
+    last = f"bench-key-{keys - 1}"
+    db.bulk_insert_mappings(
+        models.ApiKey,
+        [
+            {"tenant_id": tenant.id, "hashed_key": HASHER.hash(f"bench-key-{i}")}
+            for i in range(keys)
+        ],
+    )
+    db.commit()
+    # The newest key is checked last: the worst case for a valid key.
+    result = benchmark.pedantic(crud.verify_api_key, (db, last), rounds=rounds)
+    assert result is not None
@@ -0,0 +1,21 @@
+"""One ``forward_event`` attempt against a local receiver."""
+
+from app.db import models
+from app.tasks import forward_event
+
+
+def bench_forward_event(benchmark, db, tenant, stub_url):
+    target = models.Target(tenant_id=tenant.id, url=stub_url, provider="stripe")
+    event = models.Event(
+        tenant_id=tenant.id,
+        sha256="bench",
+        payload={"id": "evt_1", "event": "invoice.paid", "data": {"amount": 100}},
+    )
+    db.add_all([target, event])
+    db.commit()
+
+    # With a session passed in, the attempt's row is written directly.
+    result = benchmark(
+        forward_event.run, str(event.id), 1, target.id, tenant.id, session=db
+    )
+    assert result == {"status": 200}
@@ -0,0 +1,71 @@
+"""The per-request work of ``POST /in/{token}`` before anything is stored."""
+
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+from app.db import models
+from app.schemas.ingest import WebhookPayload
+from app.services import stripe_verify
+
+SECRET = "whsec_bench"
+
+
+def _body(size: int) -> bytes:
+    data = {"object": {"id": "in_1", "lines": ["x" * 64] * (size // 72)}}
+    return json.dumps({"id": "evt_1", "event": "invoice.paid", "data": data}).encode()
+
+
+def _header(raw: bytes) -> str:
+    ts = int(time.time())
+    sig = hmac.new(SECRET.encode(), b"%d.%s" % (ts, raw), hashlib.sha256).hexdigest()
+    return f"t={ts},v1={sig}"
+
+
+@pytest.mark.parametrize("size", [1024, 65536])
+def bench_stripe_verify(benchmark, size):
+    raw = _body(size)
+    benchmark(stripe_verify.verify, raw, _header(raw), SECRET)
+
+
+@pytest.mark.parametrize("size", [1024, 65536])
+def bench_payload_parse(benchmark, size):
+    benchmark(WebhookPayload.model_validate_json, _body(size))
+
+
+@pytest.mark.parametrize("size", [1024, 65536])
+def bench_payload_dump(benchmark, size):
+    payload = WebhookPayload.model_validate_json(_body(size))
+    benchmark(payload.model_dump_json)
+
+
+@pytest.mark.parametrize("size", [1024, 65536])
+def bench_sha256(benchmark, size):
+    raw = _body(size)
+    benchmark(lambda: hashlib.sha256(raw).hexdigest())
+
+
+def bench_dedup_query(benchmark, db, tenant):
+    """Lookup of a new event's hash against 10k stored ones."""
+    db.bulk_insert_mappings(
+        models.Event,
+        [
+            {
+                "tenant_id": tenant.id,
+                "sha256": hashlib.sha256(b"%d" % i).hexdigest(),
+                "raw_payload": {"id": f"evt_{i}"},
+            }
+            for i in range(10_000)
+        ],
+    )
+    db.commit()
+    sha256 = hashlib.sha256(b"new").hexdigest()
+
+    def lookup():
+        return (
+            db.query(models.Event).filter_by(tenant_id=tenant.id, sha256=sha256).first()
+        )
+
+    assert benchmark(lookup) is None
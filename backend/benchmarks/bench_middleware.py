@@ -0,0 +1,45 @@
+"""What the middleware stack adds to every request."""
+
+import pytest
+from app.main import app as main_app
+from app.middleware.body_size import BodySizeLimitMiddleware
+from app.middleware.security_headers import SecurityHeadersMiddleware
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.testclient import TestClient
+
+
+def _app(middleware: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    if middleware:
+        # Same order as app.main.
+        app.add_middleware(BodySizeLimitMiddleware)
+        app.add_middleware(SecurityHeadersMiddleware)
+        app.add_middleware(
+            CORSMiddleware,
+            allow_origins=["http://localhost"],
+            allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+            allow_headers=["*"],
+            allow_credentials=True,
+        )
+    return app
+
+
+@pytest.mark.parametrize("middleware", [False, True], ids=["bare", "stack"])
+def bench_request(benchmark, middleware):
+    with TestClient(_app(middleware)) as client:
+        response = benchmark(
+            client.get, "/ping", headers={"Origin": "http://localhost"}
+        )
+    assert response.status_code == 200
+
+
+def bench_main_app_health(benchmark):
+    """The full app: every middleware plus tracing instrumentation."""
+    client = TestClient(main_app)
+    assert benchmark(client.get, "/health").status_code == 200
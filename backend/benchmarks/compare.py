@@ -0,0 +1,67 @@
+"""Compare two benchmark runs and fail on regressions.
+
+Both files are ``pytest --benchmark-json`` output. A benchmark regresses when
+its median is more than ``--threshold`` slower in the new run; benchmarks
+present in only one run are listed but never fail the check::
+
+    python compare.py baseline.json current.json --threshold 0.15
+"""
+
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict[str, float]:
+    with open(path) as fh:
+        data = json.load(fh)
+    return {b["fullname"]: b["stats"]["median"] for b in data["benchmarks"]}
+
+
+def compare(
+    baseline: dict[str, float], current: dict[str, float], threshold: float
+) -> list[str]:
+    """Print a table of changes and return the names that regressed."""
+    regressed = []
+    width = max(map(len, baseline.keys() | current.keys()), default=0)
+    for name in sorted(baseline.keys() | current.keys()):
+        if name not in baseline or name not in current:
+            status = "new" if name in current else "removed"
+            print(f"{name:<{width}}  {status}")
+            continue
+        change = current[name] / baseline[name] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressed.append(name)
+        print(
+            f"{name:<{width}}  {baseline[name] * 1e6:>12.1f}us"
+            f"  {current[name] * 1e6:>12.1f}us  {change:+7.1%}{flag}"
+        )
+    return regressed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="allowed slowdown of the median, as a fraction (default 0.15)",
+    )
+    args = parser.parse_args(argv)
+    regressed = compare(load(args.baseline), load(args.current), args.threshold)
+    if regressed:
+        print(
+            f"\n{len(regressed)} benchmark(s) regressed by more than "
+            f"{args.threshold:.0%}",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
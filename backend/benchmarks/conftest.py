@@ -0,0 +1,97 @@
+"""Offline fixtures for the microbenchmarks.
+
+Everything runs in-process against a throwaway SQLite database. Redis is
+pointed at a closed port and the Redis-backed helpers are stubbed, so the
+numbers measure our code and not a network round trip.
+"""
+
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="webhook-bench-")
+for _name, _value in {
+    "DATABASE_URL": f"sqlite:///{_tmp}/bench.sqlite",
+    "REDIS_URL": "redis://127.0.0.1:1/0",
+    "STRIPE_SIGNING_SECRET": "whsec_bench",
+    "AWS_REGION": "us-east-1",
+    "API_KEY_SALT": "bench",
+    "FRONTEND_URL": "http://localhost",
+    "EVENTS_BUCKET": "bench",
+    "LOG_LEVEL": "WARNING",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import threading  # noqa: E402
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # noqa: E402
+
+import pytest  # noqa: E402
+from app.db import models  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from fastapi_limiter.depends import RateLimiter  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import Response  # noqa: E402
+
+models.Base.metadata.create_all(engine)
+
+
+async def _no_rate_limit(self, request: Request, response: Response):
+    return None
+
+
+RateLimiter.__call__ = _no_rate_limit
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    """Stub the calls that would otherwise go to Redis."""
+    from app.core import lanes
+    from app.services import live, timeouts
+
+    monkeypatch.setattr(timeouts, "for_target", lambda target_id: timeouts.default())
+    monkeypatch.setattr(timeouts, "observe", lambda *args: None)
+    monkeypatch.setattr(live, "publish_sync", lambda tenant_id, message: None)
+    monkeypatch.setattr(lanes, "record_started", lambda tenant_id: None)
+    monkeypatch.setattr(lanes, "record_published", lambda tenant_counts: None)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
+@pytest.fixture
+def tenant(db):
+    t = models.Tenant(name="bench", token=f"tok-{os.urandom(6).hex()}")
+    db.add(t)
+    db.commit()
+    return t
+
+
+class _Stub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="session")
+def stub_url():
+    """A local receiver that answers every POST with 200."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/hook"
+    server.shutdown()
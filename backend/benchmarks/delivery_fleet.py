@@ -0,0 +1,408 @@
+"""Delivery throughput against a simulated target fleet.
+
+    python delivery_fleet.py --events 2000 --workers 16 \\
+        --fleet count=6,p50=20,p99=150 \\
+        --fleet count=2,p50=200,p99=2000,errors=0.05,hangs=0.01,resets=0.01
+
+Each ``--fleet`` adds ``count`` targets, each a local HTTP server with its
+own port. Response times follow a lognormal distribution with the given
+``p50`` and ``p99`` in ms. A request fails with a 503 at rate ``errors``,
+never answers at rate ``hangs``, or has its connection reset at rate
+``resets``. Events are spread over the targets round-robin.
+
+The worker pool is simulated in-process: ``--workers`` threads run
+``--task`` (``app.tasks.forward_event`` by default) straight from an
+in-memory ETA queue, and ``apply_async`` is redirected there, so retries
+happen too. Backoff is scaled down with ``--base-delay``. Adaptive timeouts
+work from in-memory sketches, and attempts are written directly to a
+throwaway SQLite database. Nothing leaves the machine. The report has
+deliveries per second, worker utilization, retry volume and time to drain;
+``--json`` saves it so two branches can be compared.
+"""
+
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="webhook-fleet-")
+for _name, _value in {
+    "DATABASE_URL": f"sqlite:///{_tmp}/fleet.sqlite",
+    "REDIS_URL": "redis://127.0.0.1:1/0",
+    "STRIPE_SIGNING_SECRET": "whsec_bench",
+    "AWS_REGION": "us-east-1",
+    "API_KEY_SALT": "bench",
+    "FRONTEND_URL": "http://localhost",
+    "EVENTS_BUCKET": "bench",
+    "LOG_LEVEL": "WARNING",
+    "DELIVERY_BATCH_WRITES": "false",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+import argparse  # noqa: E402
+import heapq  # noqa: E402
+import importlib  # noqa: E402
+import itertools  # noqa: E402
+import json  # noqa: E402
+import math  # noqa: E402
+import random  # noqa: E402
+import socket  # noqa: E402
+import struct  # noqa: E402
+import sys  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+from dataclasses import asdict, dataclass  # noqa: E402
+from datetime import UTC, datetime  # noqa: E402
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+Z99 = 2.326  # standard normal quantile of p99
+
+
+@dataclass
+class Profile:
+    count: int = 1
+    p50: float = 20.0  # ms
+    p99: float = 100.0  # ms
+    errors: float = 0.0
+    hangs: float = 0.0
+    resets: float = 0.0
+
+
+def parse_profile(spec: str) -> Profile:
+    """``count=2,p50=20,...`` into a ``Profile``."""
+    profile = Profile()
+    for item in filter(None, spec.split(",")):
+        name, value = item.split("=", 1)
+        if name not in Profile.__dataclass_fields__:
+            raise argparse.ArgumentTypeError(f"Unknown fleet setting {name!r}")
+        setattr(profile, name, int(value) if name == "count" else float(value))
+    return profile
+
+
+def _handler(profile: Profile, rng: random.Random, hang_seconds: float):
+    sigma = (
+        math.log(profile.p99 / profile.p50) / Z99 if profile.p99 > profile.p50 else 0
+    )
+    mu = math.log(profile.p50 / 1000)
+
+    class Target(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("content-length", 0)))
+            roll = rng.random()
+            if roll < profile.resets:
+                # SO_LINGER 0: close() sends RST instead of FIN.
+                self.connection.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+                )
+                self.close_connection = True
+                return
+            if roll < profile.resets + profile.hangs:
+                time.sleep(hang_seconds)
+                self.close_connection = True
+                return
+            time.sleep(rng.lognormvariate(mu, sigma))
+            failed = rng.random() < profile.errors
+            body = b"unavailable" if failed else b"ok"
+            self.send_response(503 if failed else 200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Target
+
+
+class Fleet:
+    def __init__(self, profiles: list[Profile], seed: int, hang_seconds: float):
+        self.servers = []
+        rng = random.Random(seed)
+        for profile in profiles:
+            for _ in range(profile.count):
+                handler = _handler(profile, random.Random(rng.random()), hang_seconds)
+                server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+                server.daemon_threads = True
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                self.servers.append(server)
+
+    @property
+    def urls(self) -> list[str]:
+        return [f"http://127.0.0.1:{s.server_port}/hook" for s in self.servers]
+
+    def close(self) -> None:
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+class Scheduler:
+    """An in-memory broker with ETAs, drained by a pool of worker threads."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._active = 0
+        self.busy = 0.0
+        self.published = 0
+        self.failures = 0
+
+    def push(self, task, args, kwargs=None, delay: float = 0.0) -> None:
+        with self._cond:
+            heapq.heappush(
+                self._heap,
+                (time.monotonic() + delay, next(self._seq), task, args, kwargs or {}),
+            )
+            self.published += 1
+            self._cond.notify()
+
+    def _next(self):
+        with self._cond:
+            while True:
+                if not self._heap and not self._active:
+                    self._cond.notify_all()
+                    return None
+                if self._heap:
+                    wait = self._heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        self._active += 1
+                        return heapq.heappop(self._heap)[2:]
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+
+    def _work(self) -> None:
+        while (item := self._next()) is not None:
+            task, args, kwargs = item
+            start = time.perf_counter()
+            try:
+                task.run(*args, **kwargs)
+            except Exception:
+                self.failures += 1
+            finally:
+                with self._cond:
+                    self.busy += time.perf_counter() - start
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    def run(self) -> float:
+        """Work until nothing is queued or running; return the wall time."""
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._work, daemon=True)
+            for _ in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+
+def _offline(scheduler: Scheduler) -> None:
+    """Route everything that would reach Redis or the broker to memory."""
+    from app.core import lanes
+    from app.services import live, timeouts
+    from app.services.sketch import Sketch
+    from celery.app.task import Task
+
+    sketches: dict[tuple[int, str], Sketch] = {}
+    lock = threading.Lock()
+
+    def observe(target_id: int, latency_ms, connect_ms=None) -> None:
+        with lock:
+            for kind, value in (("latency", latency_ms), ("connect", connect_ms)):
+                if value is not None:
+                    sketch = sketches.setdefault((target_id, kind), Sketch())
+                    sketch.add(max(value, 0.001))
+
+    def load(target_id: int) -> tuple[Sketch, Sketch]:
+        with lock:
+            loaded = []
+            for kind in ("latency", "connect"):
+                sketch = Sketch()
+                sketch.merge(sketches.get((target_id, kind), Sketch()))
+                loaded.append(sketch)
+            return loaded[0], loaded[1]
+
+    def apply_async(self, args=None, kwargs=None, eta=None, countdown=None, **_):
+        delay = countdown or 0.0
+        if eta is not None:
+            delay = (eta - datetime.now(UTC)).total_seconds()
+        scheduler.push(self, list(args or ()), kwargs, max(0.0, delay))
+
+    timeouts.observe = observe
+    timeouts.load = load
+    live.publish_sync = lambda tenant_id, message: None
+    lanes.record_started = lambda tenant_id: None
+    lanes.record_published = lambda tenant_counts: None
+    Task.apply_async = apply_async
+
+
+def _seed(urls: list[str], events: int) -> tuple[int, list[tuple[int, int]]]:
+    """A tenant, one target per URL and ``events`` events; returns the work."""
+    from app.db import models
+    from app.db.session import SessionLocal, engine
+    from sqlalchemy import insert, select
+
+    models.Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        tenant = models.Tenant(name="fleet", token=f"fleet-{os.urandom(6).hex()}")
+        db.add(tenant)
+        db.flush()
+        tenant_id = tenant.id
+        targets = [models.Target(tenant_id=tenant_id, url=url) for url in urls]
+        db.add_all(targets)
+        db.execute(
+            insert(models.Event),
+            [
+                {
+                    "tenant_id": tenant_id,
+                    "sha256": f"fleet-{i}",
+                    "payload": {
+                        "id": f"evt_{i}",
+                        "event": "invoice.paid",
+                        "data": {"object": {"amount": i}},
+                    },
+                }
+                for i in range(events)
+            ],
+        )
+        db.commit()
+        event_ids = db.scalars(
+            select(models.Event.id).where(models.Event.tenant_id == tenant_id)
+        ).all()
+        target_ids = [t.id for t in targets]
+    work = [
+        (event_id, target_ids[i % len(target_ids)])
+        for i, event_id in enumerate(sorted(event_ids))
+    ]
+    return tenant_id, work
+
+
+def _quantile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))], 1)
+
+
+def _report(tenant_id: int, scheduler: Scheduler, wall: float) -> dict:
+    from app.db import models
+    from app.db.session import SessionLocal
+    from sqlalchemy import func
+
+    with SessionLocal() as db:
+        attempts = db.query(models.Delivery).join(models.Event)
+        attempts = attempts.filter(
+            models.Event.tenant_id == tenant_id, models.Delivery.attempts > 0
+        )
+        rows = attempts.with_entities(
+            models.Delivery.status,
+            models.Delivery.error,
+            models.Delivery.next_run,
+            models.Delivery.latency_ms,
+        ).all()
+        dead = (
+            db.query(func.count(models.DeadLetter.id))
+            .filter_by(tenant_id=tenant_id)
+            .scalar()
+        )
+    delivered = sum(1 for row in rows if 200 <= row.status < 300)
+    outcomes: dict[str, int] = {}
+    for row in rows:
+        outcome = row.error or f"http_{row.status}"
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    latencies = [row.latency_ms for row in rows if row.latency_ms is not None]
+    return {
+        "time_to_drain_s": round(wall, 3),
+        "deliveries_per_s": round(delivered / wall, 1),
+        "attempts_per_s": round(len(rows) / wall, 1),
+        "worker_utilization": round(scheduler.busy / (scheduler.workers * wall), 3),
+        "delivered": delivered,
+        "attempts": len(rows),
+        "retries": sum(1 for row in rows if row.next_run is not None),
+        "dead_letters": dead,
+        "task_failures": scheduler.failures,
+        "outcomes": dict(sorted(outcomes.items())),
+        "latency_ms": {
+            "p50": _quantile(latencies, 0.5),
+            "p99": _quantile(latencies, 0.99),
+        },
+    }
+
+
+def run(args) -> dict:
+    from app import tasks
+
+    module, _, name = args.task.rpartition(".")
+    task = getattr(importlib.import_module(module), name)
+    task.request  # binds the task to the app here, not racily in the workers
+    tasks.BASE_DELAY = args.base_delay
+    fleet = Fleet(args.fleet, args.seed, args.hang)
+    scheduler = Scheduler(args.workers)
+    _offline(scheduler)
+    try:
+        tenant_id, work = _seed(fleet.urls, args.events)
+        for event_id, target_id in work:
+            scheduler.push(task, [str(event_id), 1, target_id, tenant_id])
+        wall = scheduler.run()
+    finally:
+        fleet.close()
+    result = _report(tenant_id, scheduler, wall)
+    result["config"] = {
+        "task": args.task,
+        "events": args.events,
+        "workers": args.workers,
+        "base_delay": args.base_delay,
+        "fleet": [asdict(profile) for profile in args.fleet],
+    }
+    return result
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument(
+        "--fleet",
+        type=parse_profile,
+        action="append",
+        help="count=N,p50=MS,p99=MS,errors=RATE,hangs=RATE,resets=RATE",
+    )
+    parser.add_argument("--task", default="app.tasks.forward_event")
+    parser.add_argument(
+        "--base-delay", type=float, default=0.05, help="first retry backoff, seconds"
+    )
+    parser.add_argument(
+        "--hang", type=float, default=60.0, help="seconds a hanging target stalls"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="DELIVERY_TIMEOUT, the read timeout before a target has history",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+    args.fleet = args.fleet or [Profile(count=4)]
+    if args.timeout is not None:
+        os.environ["DELIVERY_TIMEOUT"] = str(args.timeout)
+
+    result = run(args)
+    width = max(map(len, result))
+    for name, value in result.items():
+        if name != "config":
+            print(f"{name:<{width}}  {value}")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
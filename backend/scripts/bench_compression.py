@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Compare plain and dictionary zstd on the sample payloads.
+
+Each tenant directory under ``payloads/`` gets its own dictionary, trained
+on that tenant's files the way ``app.storage.compression train`` does it, and
+a last row pools every file. Reports the compression ratio and decode
+throughput of each variant; tenants with too few files to train on only get
+the plain zstd numbers.
+
+Usage: bench_compression.py [payload_dir] [--level N] [--dict-size BYTES]
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import zstandard
+
+DEFAULT_DIR = Path(__file__).resolve().parent.parent / "payloads"
+
+
+def load(payload_dir: Path) -> dict[str, list[bytes]]:
+    tenants: dict[str, list[bytes]] = {}
+    for path in sorted(payload_dir.glob("*/*.json")):
+        tenants.setdefault(path.parent.name, []).append(path.read_bytes().strip())
+    return tenants
+
+
+def decode_rate(decompressor, blobs: list[bytes], raw_bytes: int) -> float:
+    """Decoded MB/s over enough rounds to run for about half a second."""
+    rounds = 0
+    start = time.perf_counter()
+    while True:
+        for blob in blobs:
+            decompressor.decompress(blob)
+        rounds += 1
+        elapsed = time.perf_counter() - start
+        if elapsed > 0.5:
+            return raw_bytes * rounds / elapsed / 1e6
+
+
+def bench(samples: list[bytes], level: int, dict_size: int) -> dict:
+    raw_bytes = sum(map(len, samples))
+    compressor = zstandard.ZstdCompressor(level=level, write_dict_id=False)
+    plain = [compressor.compress(s) for s in samples]
+    result = {
+        "raw": raw_bytes,
+        "plain": sum(map(len, plain)),
+        "plain_mbps": decode_rate(zstandard.ZstdDecompressor(), plain, raw_bytes),
+    }
+    try:
+        dictionary = zstandard.train_dictionary(dict_size, samples)
+    except zstandard.ZstdError:
+        return result
+    compressor = zstandard.ZstdCompressor(
+        level=level, dict_data=dictionary, write_dict_id=False
+    )
+    trained = [compressor.compress(s) for s in samples]
+    result.update(
+        dict_size=len(dictionary.as_bytes()),
+        dict=sum(map(len, trained)),
+        dict_mbps=decode_rate(
+            zstandard.ZstdDecompressor(dict_data=dictionary), trained, raw_bytes
+        ),
+    )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("payload_dir", nargs="?", type=Path, default=DEFAULT_DIR)
+    parser.add_argument("--level", type=int, default=3)
+    parser.add_argument("--dict-size", type=int, default=16384)
+    args = parser.parse_args()
+
+    print(
+        f"{'tenant':>8} {'files':>6} {'raw B':>8} {'zstd':>7} {'zstd+dict':>10} "
+        f"{'dict B':>7} {'decode MB/s (plain/dict)':>26}"
+    )
+    tenants = load(args.payload_dir)
+    tenants["all"] = [s for samples in tenants.values() for s in samples]
+    for tenant, samples in tenants.items():
+        r = bench(samples, args.level, args.dict_size)
+        dict_ratio = f"{r['raw'] / r['dict']:.1f}x" if "dict" in r else "-"
+        dict_rate = f"{r['dict_mbps']:.0f}" if "dict" in r else "-"
+        print(
+            f"{tenant:>8} {len(samples):>6} {r['raw']:>8} "
+            f"{r['raw'] / r['plain']:>6.1f}x {dict_ratio:>10} "
+            f"{r.get('dict_size', '-'):>7} {r['plain_mbps']:>15.0f} / {dict_rate}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Shared fixtures: a throwaway SQLite database and a real Redis.
+
+Redis-backed tests use ``REDIS_TEST_URL`` when it is set (CI points it at its
+service container) and otherwise start a private ``redis-server`` on a free
+port. Without either they are skipped. Calls that only feed dashboards
+(live tail, backlog counters, latency sketches) are stubbed for every test.
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+_tmp = tempfile.mkdtemp(prefix="webhook-test-")
+_REDIS_URL = os.environ.get("REDIS_TEST_URL")
+_REDIS_PORT = None
+if _REDIS_URL is None and shutil.which("redis-server"):
+    _REDIS_PORT = _free_port()
+    _REDIS_URL = f"redis://127.0.0.1:{_REDIS_PORT}/0"
+
+for _name, _value in {
+    "DATABASE_URL": f"sqlite:///{_tmp}/test.sqlite",
+    "REDIS_URL": _REDIS_URL or "redis://127.0.0.1:1/0",
+    "STRIPE_SIGNING_SECRET": "whsec_test",
+    "AWS_REGION": "us-east-1",
+    "API_KEY_SALT": "test",
+    "FRONTEND_URL": "http://localhost",
+    "EVENTS_BUCKET": "test",
+    "LOG_LEVEL": "WARNING",
+}.items():
+    os.environ[_name] = _value
+
+import pytest  # noqa: E402
+import redis as redis_lib  # noqa: E402
+from app.db import models  # noqa: E402
+from app.db.session import SessionLocal, engine  # noqa: E402
+from app.services import routing  # noqa: E402
+
+models.Base.metadata.create_all(engine)
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    """Stub the side channels that only feed dashboards."""
+    from app.core import lanes
+    from app.services import live, timeouts
+
+    monkeypatch.setattr(timeouts, "for_target", lambda target_id: timeouts.default())
+    monkeypatch.setattr(timeouts, "observe", lambda *args: None)
+    monkeypatch.setattr(live, "publish_sync", lambda tenant_id, message: None)
+    monkeypatch.setattr(lanes, "record_started", lambda tenant_id: None)
+    monkeypatch.setattr(lanes, "record_published", lambda tenant_counts: None)
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    """Every test starts from empty tables and cold caches."""
+    yield
+    routing.clear_cache()
+    with engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def redis_server():
+    if _REDIS_URL is None:
+        pytest.skip("needs redis-server on PATH or REDIS_TEST_URL")
+    process = None
+    if _REDIS_PORT is not None:
+        process = subprocess.Popen(
+            [
+                "redis-server",
+                "--port",
+                str(_REDIS_PORT),
+                "--save",
+                "",
+                "--appendonly",
+                "no",
+            ],
+            stdout=subprocess.DEVNULL,
+        )
+    client = redis_lib.Redis.from_url(_REDIS_URL)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            client.ping()
+            break
+        except redis_lib.ConnectionError:
+            if time.monotonic() > deadline:
+                pytest.skip(f"Redis at {_REDIS_URL} did not come up")
+            time.sleep(0.05)
+    yield client
+    if process is not None:
+        process.terminate()
+        process.wait()
+
+
+@pytest.fixture
+def redis(redis_server):
+    """The test Redis, emptied before each test."""
+    redis_server.flushdb()
+    return redis_server
+
+
+@pytest.fixture
+def tenant(db):
+    t = models.Tenant(name="test", token=f"tok-{os.urandom(6).hex()}")
+    db.add(t)
+    db.commit()
+    return t
+
+
+@pytest.fixture
+def make_target(db, tenant):
+    def make(**fields) -> models.Target:
+        fields.setdefault("url", f"http://target.test/{os.urandom(3).hex()}")
+        target = models.Target(tenant_id=tenant.id, provider="stripe", **fields)
+        db.add(target)
+        db.commit()
+        return target
+
+    return make
+
+
+@pytest.fixture
+def make_event(db, tenant):
+    def make(payload: dict | None = None, **fields) -> models.Event:
+        payload = payload or {"id": "evt", "event": "invoice.paid", "data": {}}
+        event = models.Event(
+            tenant_id=tenant.id,
+            sha256=os.urandom(16).hex(),
+            payload=payload,
+            duplicate=False,
+            **fields,
+        )
+        db.add(event)
+        db.commit()
+        return event
+
+    return make
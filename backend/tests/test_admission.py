@@ -0,0 +1,78 @@
+import pytest
+from app.core import admission
+from app.core.config import get_settings
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settings = get_settings()
+    for name, value in {
+        "admission_pool_wait_ms": 100.0,
+        "admission_queue_depth": 1000,
+        "admission_s3_inflight": 10,
+        "admission_loop_lag_ms": 100.0,
+        "admission_shed_load": 2.0,
+        "admission_shed_samples": 3,
+        "admission_tenant_rate": 5.0,
+        "admission_tenant_burst": 3,
+        "admission_retry_after": 5.0,
+        "tenant_weights": "",
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    return settings
+
+
+def test_load_is_the_worst_signal(settings):
+    controller = admission.Controller()
+    controller.update(pool_wait_ms=50, queue_depth=1500, s3_inflight=2, loop_lag_ms=0)
+    assert controller.load == pytest.approx(1.5)
+
+
+def test_everything_is_admitted_below_load_one(settings):
+    controller = admission.Controller()
+    controller.update(pool_wait_ms=99)
+    assert all(controller.admit(1) is None for _ in range(100))
+    assert controller.overloaded() is None
+
+
+def test_tenants_are_held_to_their_bucket_under_load(settings):
+    controller = admission.Controller()
+    controller.update(queue_depth=1000)  # load 1
+    admitted = [controller.admit(1) is None for _ in range(5)]
+    assert admitted == [True, True, True, False, False]
+    rejection = controller.admit(1)
+    assert rejection.status_code == 429
+    assert rejection.retry_after >= 1
+    # Another tenant has its own bucket.
+    assert controller.admit(2) is None
+
+
+def test_weighted_tenants_get_a_bigger_bucket(settings):
+    settings.tenant_weights = "7=2"
+    controller = admission.Controller()
+    controller.update(queue_depth=1000)
+    assert sum(controller.admit(7) is None for _ in range(10)) == 6
+
+
+def test_shedding_needs_consecutive_high_samples(settings):
+    controller = admission.Controller()
+    controller.update(loop_lag_ms=500)  # load 5
+    controller.update(loop_lag_ms=500)
+    assert controller.overloaded() is None
+    controller.update(loop_lag_ms=500)
+    rejection = controller.overloaded()
+    assert rejection.status_code == 503
+    assert rejection.retry_after == 25  # scaled by the load
+
+    # One calm sample resets the count.
+    controller.update(loop_lag_ms=0)
+    controller.update(loop_lag_ms=500)
+    assert controller.overloaded() is None
+
+
+def test_waits_report_the_longest_checkout():
+    waits = admission._Waits()
+    with waits.waiting():
+        pass
+    assert waits.read() >= 0
+    assert waits.read() == 0  # reset by the previous read
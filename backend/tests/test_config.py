@@ -0,0 +1,28 @@
+import pytest
+from app.core.config import Settings
+
+REQUIRED = {
+    "database_url": "sqlite://",
+    "stripe_signing_secret": "whsec_test",
+    "aws_region": "us-east-1",
+    "api_key_salt": "test",
+    "frontend_url": "http://localhost",
+}
+
+
+@pytest.mark.parametrize(
+    "env, bucket",
+    [
+        ({}, "events-dev"),
+        ({"S3_BUCKET": "payloads"}, "payloads"),
+        ({"S3_BUCKET": "payloads", "EVENTS_BUCKET": "events"}, "events"),
+    ],
+)
+def test_events_bucket_falls_back_to_s3_bucket_then_the_dev_bucket(
+    monkeypatch, env, bucket
+):
+    for name in ("EVENTS_BUCKET", "S3_BUCKET"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    assert Settings(_env_file=None, **REQUIRED).events_bucket == bucket
@@ -0,0 +1,121 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from app.core.config import get_settings
+from app.db import models
+from app.services import delivery_log
+
+
+@pytest.fixture(autouse=True)
+def fast_flush(monkeypatch):
+    monkeypatch.setattr(get_settings(), "delivery_log_flush_interval", 0.05)
+
+
+def _row(event, target, status=200, attempts=1, next_run=None, error=None):
+    return {
+        "event_id": event.id,
+        "target_id": target.id,
+        "attempts": attempts,
+        "status": status,
+        "response": "body",
+        "error": error,
+        "latency_ms": 12.0,
+        "next_run": next_run,
+        "created_at": datetime.now(UTC),
+    }
+
+
+def test_only_the_last_failed_attempt_is_dead_lettered(
+    db, tenant, make_target, make_event
+):
+    target, event = make_target(), make_event()
+    retry_at = datetime.now(UTC) + timedelta(seconds=30)
+    delivery_log.write(
+        db,
+        [
+            (tenant.id, _row(event, target, status=200)),
+            (tenant.id, _row(event, target, status=500, next_run=retry_at)),
+            (
+                tenant.id,
+                _row(event, target, status=0, attempts=5, error="read_timeout"),
+            ),
+            (tenant.id, _row(event, target, status=503, attempts=5)),
+        ],
+    )
+    db.commit()
+
+    assert db.query(models.Delivery).count() == 4
+    dead = db.query(models.DeadLetter).order_by(models.DeadLetter.id).all()
+    assert [(d.reason, d.attempts) for d in dead] == [
+        ("read_timeout", 5),
+        ("http_503", 5),
+    ]
+    assert {d.target_id for d in dead} == {target.id}
+
+    minute = (
+        db.query(models.DeliveryRollup)
+        .filter_by(target_id=target.id, resolution=60)
+        .one()
+    )
+    assert (minute.attempts, minute.successes) == (4, 1)
+
+
+def test_flusher_writes_and_acknowledges_a_batch(
+    redis, db, tenant, make_target, make_event
+):
+    target, event = make_target(), make_event()
+    for status in (200, 500):
+        delivery_log.record(tenant.id, _row(event, target, status=status, attempts=5))
+
+    flusher = delivery_log.Flusher(redis)
+    assert flusher.step() == 2
+
+    assert db.query(models.Delivery).count() == 2
+    assert db.query(models.DeadLetter).count() == 1
+    assert redis.xlen(delivery_log.STREAM) == 0
+    assert redis.xpending(delivery_log.STREAM, delivery_log.GROUP)["pending"] == 0
+
+
+def test_entries_stay_pending_until_their_batch_commits(
+    redis, db, tenant, make_target, make_event, monkeypatch
+):
+    target, event = make_target(), make_event()
+    delivery_log.record(tenant.id, _row(event, target))
+    delivery_log.record(tenant.id, _row(event, target, status=500, attempts=5))
+    write = delivery_log.write
+
+    def write_then_fail(session, outcomes):
+        write(session, outcomes)
+        raise RuntimeError("commit never happens")
+
+    monkeypatch.setattr(delivery_log, "write", write_then_fail)
+    flusher = delivery_log.Flusher(redis)
+    with pytest.raises(RuntimeError):
+        flusher.step()
+
+    assert db.query(models.Delivery).count() == 0
+    assert db.query(models.DeadLetter).count() == 0
+    assert redis.xpending(delivery_log.STREAM, delivery_log.GROUP)["pending"] == 2
+
+    # The next step re-reads the same entries and stores each exactly once.
+    monkeypatch.setattr(delivery_log, "write", write)
+    assert flusher.step() == 2
+    assert db.query(models.Delivery).count() == 2
+    assert db.query(models.DeadLetter).count() == 1
+    assert redis.xlen(delivery_log.STREAM) == 0
+
+
+def test_entries_of_a_dead_flusher_are_claimed(
+    redis, db, tenant, make_target, make_event
+):
+    target, event = make_target(), make_event()
+    delivery_log.record(tenant.id, _row(event, target))
+    dead = delivery_log.Flusher(redis)
+    dead.consumer = "dead-consumer"
+    assert dead.read(10)  # delivered to it, never acknowledged
+
+    survivor = delivery_log.Flusher(redis)
+    assert survivor.step() == 0  # not ours yet
+    survivor.claim_abandoned(min_idle_ms=0)
+    assert survivor.step() == 1
+    assert db.query(models.Delivery).count() == 1
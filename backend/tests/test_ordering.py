@@ -0,0 +1,141 @@
+import json
+
+import httpx
+import pytest
+from app import tasks
+from app.core.config import get_settings
+from app.db import models
+from app.services import ordering
+
+
+@pytest.fixture
+def receiver(monkeypatch):
+    """A fake target: records every body and answers from ``statuses`` first."""
+
+    class Receiver:
+        def __init__(self):
+            self.statuses: list[int] = []
+            self.received: list[str] = []
+
+        def handle(self, request):
+            self.received.append(json.loads(request.content)["id"])
+            status = self.statuses.pop(0) if self.statuses else 200
+            return httpx.Response(status, text="ok")
+
+    receiver = Receiver()
+    client = httpx.Client(transport=httpx.MockTransport(receiver.handle))
+    monkeypatch.setattr(tasks, "http_client", lambda: client)
+    return receiver
+
+
+@pytest.fixture
+def scheduled(monkeypatch):
+    """Resume tasks ``drain_lane`` schedules for itself, instead of publishing them."""
+    calls = []
+    monkeypatch.setattr(
+        tasks.drain_lane, "apply_async", lambda args, **options: calls.append(args)
+    )
+    monkeypatch.setattr(get_settings(), "delivery_batch_writes", False)
+    return calls
+
+
+@pytest.fixture
+def lane(db, tenant, make_target, make_event):
+    """An ordered target with a factory that queues events in lane ``a``."""
+    target = make_target(ordered=True, order_key="data.k")
+
+    def queue(name: str, lane_key: str = "a", attempts: int = 0):
+        event = make_event({"id": name, "event": "x", "data": {"k": lane_key}})
+        db.add(
+            models.OrderedDelivery(
+                tenant_id=tenant.id,
+                target_id=target.id,
+                lane=lane_key,
+                event_id=event.id,
+                attempts=attempts,
+            )
+        )
+        db.commit()
+
+    queue.target = target
+    return queue
+
+
+def _waiting(db, target_id, lane="a"):
+    db.expire_all()
+    return db.query(models.OrderedDelivery).filter_by(target_id=target_id, lane=lane)
+
+
+def test_only_one_worker_holds_a_lane(redis):
+    with ordering.locked(1, "a") as first:
+        assert first is not None
+        with ordering.locked(1, "a") as second:
+            assert second is None
+        with ordering.locked(1, "b") as other_lane:
+            assert other_lane is not None
+    with ordering.locked(1, "a") as again:
+        assert again is not None
+
+
+def test_lane_is_delivered_in_order(redis, db, tenant, lane, receiver, scheduled):
+    for name in ("e1", "e2", "e3"):
+        lane(name)
+    tasks.drain_lane(lane.target.id, "a", tenant.id)
+    assert receiver.received == ["e1", "e2", "e3"]
+    assert _waiting(db, lane.target.id).count() == 0
+    assert scheduled == []
+
+
+def test_failed_head_holds_the_lane_until_resumed(
+    redis, db, tenant, lane, receiver, scheduled
+):
+    lane("e1")
+    lane("e2")
+    lane("b1", lane_key="b")
+    receiver.statuses = [500]
+
+    tasks.drain_lane(lane.target.id, "a", tenant.id)
+    assert receiver.received == ["e1"]
+    assert ordering.held(lane.target.id, "a")
+    assert scheduled == [[lane.target.id, "a", tenant.id, True]]
+    head = ordering.head(db, lane.target.id, "a")
+    assert head.attempts == 1
+
+    # New arrivals wait behind the held head; other lanes carry on.
+    tasks.drain_lane(lane.target.id, "a", tenant.id)
+    tasks.drain_lane(lane.target.id, "b", tenant.id)
+    assert receiver.received == ["e1", "b1"]
+
+    tasks.drain_lane(*scheduled[0])
+    assert receiver.received == ["e1", "b1", "e1", "e2"]
+    assert not ordering.held(lane.target.id, "a")
+    assert _waiting(db, lane.target.id).count() == 0
+    attempts = (
+        db.query(models.Delivery.attempts, models.Delivery.status)
+        .order_by(models.Delivery.id)
+        .all()
+    )
+    assert attempts == [(1, 500), (1, 200), (2, 200), (1, 200)]  # e1, b1, e1, e2
+
+
+def test_exhausted_head_is_dead_lettered_and_the_lane_moves_on(
+    redis, db, tenant, lane, receiver, scheduled
+):
+    lane("e1", attempts=tasks.MAX_ATTEMPTS - 1)
+    lane("e2")
+    receiver.statuses = [500]
+
+    tasks.drain_lane(lane.target.id, "a", tenant.id)
+    assert receiver.received == ["e1", "e2"]
+    assert scheduled == []
+    dead = db.query(models.DeadLetter).one()
+    assert (dead.attempts, dead.reason) == (tasks.MAX_ATTEMPTS, "http_500")
+    assert _waiting(db, lane.target.id).count() == 0
+
+
+def test_a_busy_lane_is_left_to_its_holder(redis, db, tenant, lane, receiver):
+    lane("e1")
+    with ordering.locked(lane.target.id, "a"):
+        tasks.drain_lane(lane.target.id, "a", tenant.id)
+    assert receiver.received == []
+    assert _waiting(db, lane.target.id).count() == 1
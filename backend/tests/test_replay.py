@@ -0,0 +1,163 @@
+from datetime import UTC, datetime
+
+import pytest
+from app.core import lanes
+from app.core.config import get_settings
+from app.db import models
+from app.services import replay
+
+
+@pytest.fixture(autouse=True)
+def replay_settings(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "replay_window_seconds", 10.0)
+    monkeypatch.setattr(settings, "replay_batch_size", 500)
+    return settings
+
+
+def _start(db, tenant, **options) -> models.ReplayJob:
+    job = replay.start(db, tenant.id, **options)
+    db.commit()
+    return job
+
+
+def _run_tick(db, job: models.ReplayJob) -> models.ReplayJob:
+    replay.tick(job.id, job.tick, job.tenant_id)
+    db.expire_all()
+    return db.get(models.ReplayJob, job.id)
+
+
+def _staged(db, task="app.tasks.forward_event"):
+    db.expire_all()
+    return (
+        db.query(models.OutboxMessage)
+        .filter_by(task=task)
+        .order_by(models.OutboxMessage.id)
+        .all()
+    )
+
+
+def _aware(value):
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+
+def test_reserved_slots_are_spaced_by_the_rate(redis):
+    assert replay.reserve(1, 5, 10.0) == pytest.approx(0, abs=0.05)
+    # The next caller queues behind the five slots already taken.
+    assert replay.reserve(1, 1, 10.0) == pytest.approx(0.5, abs=0.05)
+    assert replay.reserve(2, 1, 10.0) == pytest.approx(0, abs=0.05)
+
+
+def test_rate_mode_paces_deliveries(redis, db, tenant, make_target, make_event):
+    target = make_target()
+    events = [make_event() for _ in range(30)]
+    job = _start(db, tenant, target_id=target.id, mode="rate", rate=10.0)
+
+    job = _run_tick(db, job)
+    assert (job.status, job.scheduled, job.cursor) == ("running", 30, events[-1].id)
+    staged = _staged(db)
+    assert [row.args[0] for row in staged] == [str(event.id) for event in events]
+    assert all(row.queue.startswith(f"{lanes.REPLAY}.") for row in staged)
+    etas = [_aware(row.eta) for row in staged[1:]]
+    gaps = [(b - a).total_seconds() for a, b in zip(etas, etas[1:])]
+    assert gaps == pytest.approx([0.1] * len(gaps), abs=0.01)
+
+    job = _run_tick(db, job)
+    assert job.status == "done"
+    assert len(_staged(db)) == 30
+
+
+def test_rate_mode_reads_one_window_per_tick(
+    redis, db, tenant, make_target, make_event
+):
+    target = make_target()
+    for _ in range(25):
+        make_event()
+    job = _start(db, tenant, target_id=target.id, mode="rate", rate=1.0)
+
+    job = _run_tick(db, job)
+    assert job.scheduled == 10  # rate × window
+    # The slots reach exactly one window ahead, so the next tick is due now.
+    tick = _staged(db, "app.tasks.schedule_replay")[-1]
+    assert tick.args == [job.id, 1, tenant.id]
+    assert tick.eta is None
+
+
+def test_max_mode_waits_for_room_in_the_replay_lane(
+    redis, db, tenant, make_target, make_event, replay_settings, monkeypatch
+):
+    monkeypatch.setattr(replay_settings, "replay_max_queue_depth", 5)
+    target = make_target()
+    for _ in range(8):
+        make_event()
+    queue = f"{lanes.REPLAY}.{lanes.tenant_shards(tenant.id)[0]}"
+    redis.rpush(queue, *range(3))
+    job = _start(db, tenant, target_id=target.id, mode="max")
+
+    job = _run_tick(db, job)
+    assert job.scheduled == 2
+
+    redis.rpush(queue, *range(2))
+    job = _run_tick(db, job)
+    assert job.scheduled == 2  # the lane is full
+    tick = _staged(db, "app.tasks.schedule_replay")[-1]
+    assert _aware(tick.eta) > datetime.now(UTC)
+
+    redis.delete(queue)
+    job = _run_tick(db, job)
+    assert job.scheduled == 7
+    job = _run_tick(db, job)
+    assert job.scheduled == 8
+
+
+def test_a_stale_tick_is_ignored(redis, db, tenant, make_target, make_event):
+    target = make_target()
+    make_event()
+    job = _start(db, tenant, target_id=target.id, mode="max")
+    job = _run_tick(db, job)
+    replay.tick(job.id, 0, tenant.id)  # redelivered first tick
+    assert len(_staged(db)) == 1
+
+
+def test_redrive_sends_dead_letters_back_once(
+    redis, db, tenant, make_target, make_event
+):
+    failing, other = make_target(), make_target()
+    events = [make_event() for _ in range(3)]
+    now = datetime.now(UTC)
+    letters = [
+        models.DeadLetter(
+            tenant_id=tenant.id,
+            event_id=event.id,
+            target_id=target.id,
+            attempts=5,
+            status=500,
+            reason="http_500",
+            created_at=now,
+        )
+        for event, target in zip(events, (failing, failing, other))
+    ]
+    letters[1].redriven_at = now  # already sent back by an earlier redrive
+    db.add_all(letters)
+    db.commit()
+
+    job = _start(
+        db,
+        tenant,
+        target_id=failing.id,
+        mode="rate",
+        rate=10.0,
+        source="dead_letters",
+    )
+    job = _run_tick(db, job)
+    assert job.scheduled == 1
+    assert [row.args[:3] for row in _staged(db)] == [[str(events[0].id), 1, failing.id]]
+    db.expire_all()
+    redriven = db.get(models.DeadLetter, letters[0].id)
+    assert redriven.redrive_job_id == job.id
+    assert redriven.redriven_at is not None
+    assert db.get(models.DeadLetter, letters[2].id).redriven_at is None
+
+    job = _run_tick(db, job)
+    assert job.status == "done"
+    assert len(_staged(db)) == 1
@@ -0,0 +1,38 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from app.services import rollups
+
+
+def test_ingest_counts_reach_the_rollups_on_flush(redis, db, tenant):
+    now = datetime.now(UTC)
+    for _ in range(3):
+        rollups.count_ingest(redis, tenant.id, now)
+    rollups.count_ingest(redis, tenant.id, now - timedelta(minutes=5), 2)
+    since, until = now - timedelta(hours=1), now + timedelta(minutes=1)
+    assert rollups.summary(db, tenant.id, since, until)["events"] == 0
+
+    assert rollups.flush_ingest(redis) == 5
+    assert rollups.summary(db, tenant.id, since, until)["events"] == 5
+    assert (
+        rollups.summary(db, tenant.id, now - timedelta(minutes=1), until)["events"] == 3
+    )
+    assert not redis.exists(rollups.PENDING_INGEST)
+    assert rollups.flush_ingest(redis) == 0
+
+
+def test_counts_go_back_when_a_flush_fails(redis, db, tenant, monkeypatch):
+    now = datetime.now(UTC)
+    rollups.count_ingest(redis, tenant.id, now, 4)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(rollups, "record_ingest", fail)
+    assert rollups.flush_ingest(redis) == 0
+    monkeypatch.undo()
+
+    rollups.count_ingest(redis, tenant.id, now)
+    assert rollups.flush_ingest(redis) == 5
+    window = (now - timedelta(minutes=1), now + timedelta(minutes=1))
+    assert rollups.summary(db, tenant.id, *window)["events"] == 5
@@ -0,0 +1,111 @@
+import pytest
+from app.db import crud, schemas
+from app.services import routing
+
+
+def _match(filters, payload):
+    matcher = routing.compile_filters(filters)
+    return matcher is None or matcher(payload)
+
+
+def test_no_filters_match_everything():
+    assert routing.compile_filters(None) is None
+    assert routing.compile_filters({"event_types": [], "fields": []}) is None
+
+
+@pytest.mark.parametrize(
+    "event_type, expected",
+    [
+        ("invoice.paid", True),
+        ("invoice.payment_failed", True),
+        ("customer.created", True),
+        ("customer.deleted", False),
+        ("invoices.paid", False),
+    ],
+)
+def test_event_type_globs(event_type, expected):
+    filters = {"event_types": ["invoice.*", "customer.created"]}
+    assert _match(filters, {"event": event_type}) is expected
+
+
+@pytest.mark.parametrize(
+    "op, value, expected",
+    [
+        ("eq", "usd", True),
+        ("ne", "usd", False),
+        ("in", ["eur", "usd"], True),
+        ("in", ["eur"], False),
+        ("exists", True, True),
+        ("exists", False, False),
+    ],
+)
+def test_field_predicates(op, value, expected):
+    filters = {"fields": [{"path": "data.object.currency", "op": op, "value": value}]}
+    payload = {"event": "x", "data": {"object": {"currency": "usd"}}}
+    assert _match(filters, payload) is expected
+
+
+def test_comparisons_and_missing_fields():
+    filters = {"fields": [{"path": "data.amount", "op": "gte", "value": 100}]}
+    assert _match(filters, {"data": {"amount": 100}})
+    assert not _match(filters, {"data": {"amount": 99}})
+    assert not _match(filters, {"data": {}})
+    assert not _match(filters, {"data": "not an object"})
+    # A type mismatch is a miss, not an error.
+    assert not _match(filters, {"data": {"amount": "lots"}})
+
+
+def test_types_and_fields_must_all_hold():
+    filters = {
+        "event_types": ["invoice.*"],
+        "fields": [{"path": "data.live", "op": "eq", "value": True}],
+    }
+    assert _match(filters, {"event": "invoice.paid", "data": {"live": True}})
+    assert not _match(filters, {"event": "invoice.paid", "data": {"live": False}})
+    assert not _match(filters, {"event": "charge.paid", "data": {"live": True}})
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        {"path": "data.x", "op": "like", "value": 1},
+        {"path": "data.x", "op": "in", "value": "usd"},
+        {"op": "eq", "value": 1},
+    ],
+)
+def test_invalid_filters_are_rejected(spec):
+    with pytest.raises(routing.FilterError):
+        routing.compile_filters({"fields": [spec]})
+
+
+def test_route_follows_target_changes(db, tenant):
+    everything = crud.upsert_target(
+        db, tenant.id, schemas.TargetCreate(url="http://a.test/hook")
+    )
+    invoices = crud.upsert_target(
+        db,
+        tenant.id,
+        schemas.TargetCreate(
+            url="http://b.test/hook", filters={"event_types": ["invoice.*"]}
+        ),
+    )
+    db.commit()
+    db.refresh(tenant)
+    assert routing.route(db, tenant, {"event": "invoice.paid"}) == [
+        everything.id,
+        invoices.id,
+    ]
+    assert routing.route(db, tenant, {"event": "charge.paid"}) == [everything.id]
+
+    # Deleting a target bumps the routing version, so the cache is rebuilt.
+    crud.delete_target(db, tenant.id, everything.id)
+    db.commit()
+    db.refresh(tenant)
+    assert routing.route(db, tenant, {"event": "invoice.paid"}) == [invoices.id]
+
+
+def test_lane_key():
+    path = ("data", "customer")
+    assert routing.lane_key(path, {"data": {"customer": "cus_1"}}) == "cus_1"
+    assert routing.lane_key(path, {"data": {}}) == ""
+    assert routing.lane_key((), {"data": {"customer": "cus_1"}}) == ""
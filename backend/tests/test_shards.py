@@ -0,0 +1,304 @@
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import time
+from datetime import UTC, datetime
+
+import pytest
+from app.core.config import get_settings
+from app.db import models, move_tenant, shards
+from app.db.session import engine as default_engine
+from app.main import app
+from app.storage import compression
+from app.storage.s3_client import get_s3_client
+from fastapi.testclient import TestClient
+from fastapi_limiter.depends import RateLimiter
+from starlette.requests import Request
+from starlette.responses import Response
+from sqlalchemy import func, select
+
+SHARD = "eu1"
+SHARD_URL = f"sqlite:///{tempfile.mkdtemp(prefix='webhook-shard-')}/eu1.sqlite"
+SECRET = "whsec_shard"
+
+
+@pytest.fixture(autouse=True)
+def eu1(monkeypatch):
+    """A second SQLite shard next to ``default``; the shard map is never cached."""
+    settings = get_settings()
+    monkeypatch.setattr(settings, "database_shards", f"{SHARD}={SHARD_URL}")
+    monkeypatch.setattr(settings, "shard_map_ttl", 0.0)
+    engine = shards.engine(SHARD)
+    models.Base.metadata.create_all(engine)
+    yield engine
+    shards._map.clear()
+    with engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+
+def _directory_tenant(db, shard=shards.DEFAULT, **fields) -> models.Tenant:
+    tenant = models.Tenant(
+        name="sharded",
+        token=f"tok-{os.urandom(6).hex()}",
+        stripe_signing_secret=SECRET,
+        shard=shard,
+        **fields,
+    )
+    db.add(tenant)
+    db.commit()
+    shards.mirror_tenant(tenant)
+    return tenant
+
+
+def _count(engine, model, **filters) -> int:
+    with engine.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(model).filter_by(**filters))
+
+
+def test_tenants_are_located_and_grouped_by_shard(db):
+    home = _directory_tenant(db)
+    away = _directory_tenant(db, shard=SHARD)
+    moving = _directory_tenant(db, shard=SHARD, moving=True)
+
+    assert shards.locate(home.id) == (shards.DEFAULT, False)
+    assert shards.locate(away.id) == (SHARD, False)
+    assert shards.locate(moving.id) == (SHARD, True)
+    assert shards.group([home.id, away.id, moving.id, away.id]) == {
+        shards.DEFAULT: [home.id],
+        SHARD: [away.id],
+    }
+    with pytest.raises(shards.TenantMoving):
+        shards.writable_session(moving.id)
+    with shards.session_for(away.id) as session:
+        assert session.get_bind() is shards.engine(SHARD)
+
+
+def test_mirror_tenant_copies_the_directory_row(db):
+    tenant = _directory_tenant(db, shard=SHARD)
+    tenant.stripe_signing_secret = "whsec_rotated"
+    db.commit()
+    shards.mirror_tenant(tenant)
+
+    with shards.sessionmaker_for(SHARD)() as session:
+        copy = session.get(models.Tenant, tenant.id)
+        assert (copy.token, copy.stripe_signing_secret, copy.shard) == (
+            tenant.token,
+            "whsec_rotated",
+            SHARD,
+        )
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """The API without rate limits, and with S3 uploads recorded in a list."""
+
+    class Uploads(list):
+        def put_object(self, **kwargs):
+            self.append(kwargs)
+
+    async def no_rate_limit(self, request: Request, response: Response):
+        return None
+
+    monkeypatch.setattr(RateLimiter, "__call__", no_rate_limit)
+    uploads = Uploads()
+    app.dependency_overrides[get_s3_client] = lambda: uploads
+    try:
+        client = TestClient(app)
+        client.uploads = uploads
+        yield client
+    finally:
+        app.dependency_overrides.pop(get_s3_client)
+
+
+def _signed(payload: dict) -> tuple[bytes, dict]:
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    ts = int(time.time())
+    sig = hmac.new(SECRET.encode(), b"%d.%s" % (ts, raw), hashlib.sha256).hexdigest()
+    return raw, {"Stripe-Signature": f"t={ts},v1={sig}"}
+
+
+def test_ingest_is_stored_on_the_tenant_shard(db, eu1, client):
+    tenant = _directory_tenant(db, shard=SHARD)
+    with shards.sessionmaker_for(SHARD)() as session:
+        session.add(models.Target(tenant_id=tenant.id, url="http://target.test/a"))
+        session.commit()
+
+    raw, headers = _signed({"id": "evt_1", "event": "invoice.paid", "data": {}})
+    response = client.post(f"/in/{tenant.token}", content=raw, headers=headers)
+
+    assert response.status_code == 200
+    assert _count(eu1, models.Event, tenant_id=tenant.id) == 1
+    assert _count(eu1, models.OutboxMessage) == 1
+    assert _count(default_engine, models.Event) == 0
+    assert _count(default_engine, models.OutboxMessage) == 0
+    assert [upload["Key"].split("/")[0] for upload in client.uploads] == [
+        str(tenant.id)
+    ]
+
+
+def test_ingest_is_retried_until_the_tenant_is_on_its_shard(db, eu1, client):
+    tenant = models.Tenant(
+        name="unmirrored", token="tok-unmirrored", stripe_signing_secret=SECRET
+    )
+    tenant.shard = SHARD
+    db.add(tenant)
+    db.commit()
+
+    raw, headers = _signed({"id": "evt_1", "event": "invoice.paid", "data": {}})
+    response = client.post(f"/in/{tenant.token}", content=raw, headers=headers)
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+    assert _count(eu1, models.Event) == 0
+
+
+def test_a_new_secret_is_kept_out_of_the_directory_until_mirrored(
+    db, client, monkeypatch
+):
+    tenant = _directory_tenant(db, shard=SHARD)
+    mirror_tenant = shards.mirror_tenant
+
+    def unreachable(tenant):
+        raise RuntimeError("shard down")
+
+    monkeypatch.setattr(shards, "mirror_tenant", unreachable)
+    with pytest.raises(RuntimeError):
+        client.put(
+            f"/tenants/{tenant.token}/stripe", json={"signing_secret": "whsec_new"}
+        )
+    db.expire_all()
+    assert db.get(models.Tenant, tenant.id).stripe_signing_secret == SECRET
+
+    monkeypatch.setattr(shards, "mirror_tenant", mirror_tenant)
+    response = client.put(
+        f"/tenants/{tenant.token}/stripe", json={"signing_secret": "whsec_new"}
+    )
+    assert response.status_code == 200
+    db.expire_all()
+    assert db.get(models.Tenant, tenant.id).stripe_signing_secret == "whsec_new"
+    with shards.sessionmaker_for(SHARD)() as session:
+        copy = session.get(models.Tenant, tenant.id)
+        assert copy.stripe_signing_secret == "whsec_new"
+
+
+def _event(session, tenant_id: int, name: str) -> models.Event:
+    event = models.Event(
+        tenant_id=tenant_id,
+        sha256=hashlib.sha256(name.encode()).hexdigest(),
+        payload={"id": name, "event": "invoice.paid", "data": {}},
+        duplicate=False,
+    )
+    session.add(event)
+    session.commit()
+    return event
+
+
+def _delivery(session, event_id: int, target_id: int) -> None:
+    session.add(
+        models.Delivery(event_id=event_id, target_id=target_id, status=200, attempts=1)
+    )
+    session.commit()
+
+
+def test_a_moved_tenant_is_copied_cut_over_and_purged(db, eu1, monkeypatch):
+    tenant = _directory_tenant(db)
+    target = models.Target(tenant_id=tenant.id, url="http://target.test/a")
+    db.add(target)
+    db.commit()
+    first = _event(db, tenant.id, "evt_1")
+    _delivery(db, first.id, target.id)
+    db.add(
+        models.DeadLetter(
+            tenant_id=tenant.id,
+            event_id=first.id,
+            target_id=target.id,
+            attempts=5,
+            status=500,
+            reason="http_500",
+            created_at=datetime.now(UTC),
+        )
+    )
+    db.commit()
+
+    pauses = []
+
+    def sleep(seconds):
+        # First the cutover wait, then the sweep wait; the tenant takes writes
+        # on the source right up to each of them.
+        pauses.append(shards.locate(tenant.id))
+        with shards.sessionmaker_for(shards.DEFAULT)() as source:
+            late = _event(source, tenant.id, f"evt_{len(pauses) + 1}")
+            _delivery(source, late.id, target.id)
+
+    monkeypatch.setattr(move_tenant.time, "sleep", sleep)
+    result = move_tenant.move(tenant.id, SHARD, batch_size=1, purge=True)
+
+    assert pauses == [(shards.DEFAULT, True), (SHARD, False)]
+    assert (result["from"], result["to"], result["purged"]) == (
+        shards.DEFAULT,
+        SHARD,
+        True,
+    )
+    db.expire_all()
+    moved = db.get(models.Tenant, tenant.id)
+    assert (moved.shard, moved.moving) == (SHARD, False)
+
+    assert _count(eu1, models.Target, tenant_id=tenant.id) == 1
+    assert _count(eu1, models.Event, tenant_id=tenant.id) == 3
+    assert _count(eu1, models.Delivery) == 3
+    assert _count(eu1, models.DeadLetter, tenant_id=tenant.id) == 1
+    for model in (models.Target, models.Event, models.DeadLetter):
+        assert _count(default_engine, model, tenant_id=tenant.id) == 0
+    assert _count(default_engine, models.Delivery) == 0
+    # The directory keeps its row; the source is the directory here.
+    assert _count(default_engine, models.Tenant, id=tenant.id) == 1
+
+
+def test_dictionaries_with_the_same_id_on_two_shards_are_kept_apart(db, monkeypatch):
+    monkeypatch.setattr(compression, "_dictionaries", {})
+    monkeypatch.setattr(compression, "_selection", {})
+    zstd = compression._zstd()
+    frames = {}
+    for shard, word in ((shards.DEFAULT, "invoice"), (SHARD, "customer")):
+        tenant = _directory_tenant(db, shard=shard)
+        corpus = [
+            compression.encode_payload({"id": f"evt_{i}", word: {"n": i * 7919}})
+            for i in range(200)
+        ]
+        trained = zstd.train_dictionary(4096, corpus)
+        with shards.sessionmaker_for(shard)() as session:
+            row = models.CompressionDictionary(
+                tenant_id=tenant.id,
+                zstd_dict_id=trained.dict_id(),
+                data=trained.as_bytes(),
+                sample_count=len(corpus),
+            )
+            session.add(row)
+            session.commit()
+            compression._dictionaries.clear()  # as if written by another process
+            blob, dictionary_id = compression.compress(
+                session, tenant.id, None, corpus[0]
+            )
+        frames[shard] = (tenant.id, blob, dictionary_id, corpus[0])
+
+    # Each shard hands out its own ids.
+    assert frames[shards.DEFAULT][2] == frames[SHARD][2]
+    for tenant_id, blob, dictionary_id, raw in frames.values():
+        assert compression.decompress(blob, dictionary_id, tenant_id) == raw
+
+
+def test_engine_hooks_see_every_shard_engine(eu1, monkeypatch):
+    settings = get_settings()
+    later = f"sqlite:///{tempfile.mkdtemp(prefix='webhook-shard-')}/us1.sqlite"
+    monkeypatch.setattr(settings, "database_shards", f"{SHARD}={SHARD_URL},us1={later}")
+    monkeypatch.setattr(shards, "_engine_hooks", [])
+    seen = []
+
+    shards.on_engine(seen.append)
+    assert eu1 in seen  # built before the hook was registered
+    us1 = shards.engine("us1")
+    assert seen[-1] is us1
+    assert shards.engine(shards.DEFAULT) not in seen
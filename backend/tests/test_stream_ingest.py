@@ -0,0 +1,41 @@
+import json
+import time
+
+import pytest
+from app.db import models
+from app.services import stream_ingest
+
+
+@pytest.fixture
+def persister(redis, monkeypatch):
+    monkeypatch.setattr(stream_ingest, "_after_commit", lambda stored, pool: None)
+    return stream_ingest.Persister(redis)
+
+
+def _fields(tenant_id, body: bytes) -> dict:
+    return {"tenant_id": tenant_id, "body": body, "received_at": f"{time.time():.6f}"}
+
+
+def test_unreadable_entries_are_set_aside_and_the_rest_stored(
+    redis, db, tenant, persister
+):
+    stream = persister.stream
+    good = json.dumps({"id": "evt_1", "event": "invoice.paid", "data": {}}).encode()
+    redis.xadd(stream, _fields(tenant.id, good))
+    redis.xadd(stream, {"tenant_id": tenant.id, "received_at": "1"})  # no body
+    redis.xadd(stream, _fields(tenant.id, b'{"id": "evt_2", "ev'))  # truncated
+    redis.xadd(stream, _fields("not-a-tenant", good))
+
+    assert persister.step(block_ms=10) == 4
+
+    assert db.query(models.Event).filter_by(tenant_id=tenant.id).count() == 1
+    assert redis.xlen(stream) == 0
+    assert redis.xpending(stream, stream_ingest.GROUP)["pending"] == 0
+    dead = redis.xrange(persister.dead_stream)
+    assert len(dead) == 3
+    assert all(b"error" in fields for _, fields in dead)
+    assert dead[1][1][b"body"] == b'{"id": "evt_2", "ev'
+
+    # Nothing is redelivered.
+    persister.retry_pending()
+    assert persister.step(block_ms=10) == 0
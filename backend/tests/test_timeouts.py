@@ -0,0 +1,75 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from app.core.config import get_settings
+from app.services import timeouts
+from app.services.sketch import Sketch
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    settings = get_settings()
+    for name, value in {
+        "delivery_timeout": 10.0,
+        "delivery_timeout_min": 1.0,
+        "delivery_timeout_max": 30.0,
+        "delivery_timeout_p99_multiple": 3.0,
+        "delivery_connect_timeout_min": 0.5,
+        "delivery_connect_timeout_max": 5.0,
+        "delivery_connect_timeout_p50_multiple": 4.0,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    return settings
+
+
+def _sketch(value_ms: float, count: int = timeouts.MIN_SAMPLES) -> Sketch:
+    sketch = Sketch()
+    sketch.add(value_ms, count)
+    return sketch
+
+
+def test_connect_timeout_follows_connect_time_not_total_latency(settings):
+    # A slow endpoint on a nearby host: 2s responses, 200ms handshakes.
+    timeout = timeouts.derive(_sketch(2000), _sketch(200))
+    assert timeout.read == pytest.approx(6.0, rel=0.03)
+    assert timeout.connect == pytest.approx(0.8, rel=0.03)
+
+
+def test_each_timeout_needs_its_own_samples(settings):
+    timeout = timeouts.derive(_sketch(2000), _sketch(200, count=3))
+    assert timeout.read == pytest.approx(6.0, rel=0.03)
+    assert timeout.connect == 5.0
+
+    timeout = timeouts.derive(Sketch(), _sketch(50))
+    assert (timeout.read, timeout.connect) == (10.0, 0.5)
+
+
+@pytest.fixture
+def server():
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}/"
+    httpd.shutdown()
+
+
+def test_connect_timer_only_times_new_connections(server):
+    with httpx.Client() as client:
+        first, second = timeouts.ConnectTimer(), timeouts.ConnectTimer()
+        client.get(server, extensions={"trace": first})
+        client.get(server, extensions={"trace": second})
+    assert first.ms is not None and first.ms >= 0
+    assert second.ms is None  # the kept-alive connection was reused